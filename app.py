@@ -20,28 +20,57 @@ def create_app():
     # Configuration
     app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
     app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///opai_crm.db")
-    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-        "pool_recycle": 300,
-        "pool_pre_ping": True,
-    }
+    # Backend-aware pool settings (SQLite pragmas are applied per connection below)
+    from utils.db_engine import engine_options, init_engines
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
     
     # Middleware
     app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
     
+    # Faster JSON encoding when orjson is available
+    from utils.json_provider import init_json_provider
+    init_json_provider(app)
+    
     # Initialize extensions
     db.init_app(app)
-    CORS(app)
+    init_engines(app, db)
+    # Models register the user_loader on login_manager
+    import models  # noqa: F401
+    CORS(app, expose_headers=['X-Next-Cursor', 'ETag', 'X-SQL-Diagnostics'])
     login_manager.init_app(app)
     login_manager.login_view = 'login'
     login_manager.login_message = 'Faça login para acessar esta página.'
     login_manager.login_message_category = 'info'
     
+    # Request, SQL, scheduler and transport metrics at /api/metrics
+    from utils.metrics import init_metrics
+    init_metrics(app)
+    
+    # Per-request SQL report with N+1 and slow-query detection (opt-in)
+    from utils.sql_diagnostics import init_sql_diagnostics
+    init_sql_diagnostics(app)
+    
+    register_cli_commands(app)
+    
     return app
 
-# Create app instance
-app = create_app()
+def register_cli_commands(app):
+    @app.cli.command('db-migrate')
+    def db_migrate():
+        """Create missing tables and apply pending schema migrations."""
+        from migrations import run_migrations
+        applied = run_migrations(db.engine)
+        print(f"Applied migrations: {applied}" if applied else "Database is up to date.")
 
-# Import models after app creation to avoid circular imports
-with app.app_context():
-    import models  # noqa: F401
-    db.create_all()
\ No newline at end of file
+    @app.cli.command('db-check-indexes')
+    def db_check_indexes():
+        """EXPLAIN the hot queries and fail if any of them skips its index."""
+        from migrations import explain_hot_queries
+        results = explain_hot_queries(db.engine)
+        for result in results:
+            status = 'OK' if result['uses_index'] else 'MISSING'
+            print(f"[{status}] {result['name']} -> {result['index']}")
+            if not result['uses_index']:
+                print(result['plan'])
+        if not all(result['uses_index'] for result in results):
+            raise SystemExit(1)
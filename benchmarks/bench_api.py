@@ -0,0 +1,318 @@
+"""
+API benchmark suite: seeds a synthetic dataset, drives every route and the
+scheduler jobs through the Flask test client and reports p50/p95/p99
+latency, SQL queries per request and peak traced memory per scenario.
+
+    python -m benchmarks.bench_api [--leads 100000] [--users 5] [--requests 30]
+        [--database-url postgresql://...] [--only leads,dashboard]
+        [--save results.json] [--baseline results.json] [--tolerance 0.25]
+
+Without --database-url a temporary SQLite file is used. A PostgreSQL URL
+must point at an empty, throwaway database: the suite creates the schema
+and inserts into it.
+
+With --baseline, the run fails (exit status 1) when a scenario's p95 is
+more than --tolerance slower than the baseline (plus 1ms of slack), or
+when it runs more queries per request than before.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Absolute slack added to the p95 limit so sub-millisecond noise never fails the gate
+LATENCY_SLACK_MS = 1.0
+
+
+def _percentile(values, fraction):
+    # Nearest-rank percentile
+    values = sorted(values)
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class QueryCounter:
+    """Counts statements sent to the database through engine events."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def _scenarios(state):
+    """
+    (name, repeat, setup, call) for every route and scheduler job.
+
+    setup(i) runs untimed before each call(i); call returns a response, or
+    None for scheduler jobs.
+    """
+    from utils.scheduler import check_scheduled_contacts, check_scheduled_messages
+
+    client = state['client']
+    app = state['app']
+    lead_ids = state['lead_ids']
+    heavy = max(3, state['requests'] // 10)
+    csv_upload = ('nome,telefone,email\n' + ''.join(
+        f'Importado {i},+55 11 97{i:07d},imp{i}@example.com\n' for i in range(200)
+    )).encode()
+
+    def login():
+        return client.post('/api/login', json={'username': state['username'], 'password': state['password']})
+
+    def delete_setup(i):
+        response = client.post('/api/leads', json={'name': f'Temp {i}', 'phone': f'+55119{i:08d}'})
+        state['temp_lead'] = response.get_json()['lead']['id']
+
+    def reset_due_messages(i):
+        state['reset_due']('messages')
+
+    def reset_due_contacts(i):
+        state['reset_due']('contacts')
+
+    def import_setup(i):
+        state['delete_imported']()
+
+    def noop(i):
+        pass
+
+    def run_job(job):
+        with app.app_context():
+            job()
+
+    return [
+        ('home', state['requests'], noop, lambda i: client.get('/')),
+        ('check-auth', state['requests'], noop, lambda i: client.get('/api/check-auth')),
+        ('login', heavy, noop, lambda i: login()),
+        ('register', heavy, noop, lambda i: client.post('/api/register', json={
+            'username': f'new{i}', 'email': f'new{i}@example.com',
+            'password': 'x', 'confirm_password': 'x',
+        })),
+        ('dashboard', state['requests'], noop, lambda i: client.get('/api/dashboard')),
+        ('leads full list', heavy, noop, lambda i: client.get('/api/leads')),
+        ('leads page', state['requests'], noop, lambda i: client.get('/api/leads?limit=50')),
+        ('leads page fields', state['requests'], noop,
+         lambda i: client.get('/api/leads?limit=50&fields=id,name,phone')),
+        ('leads status filter', state['requests'], noop, lambda i: client.get('/api/leads?limit=50&status=quente')),
+        ('leads search', state['requests'], noop, lambda i: client.get('/api/leads?search=Silva&limit=50')),
+        ('leads search phone', state['requests'], noop, lambda i: client.get('/api/leads?search=9123&limit=50')),
+        ('leads 304', state['requests'], noop, lambda i: client.get(
+            '/api/leads?limit=50', headers={'If-None-Match': state['leads_etag']})),
+        ('lead view', state['requests'], noop, lambda i: client.get(f'/api/leads/{lead_ids[i % len(lead_ids)]}')),
+        ('lead add', state['requests'], noop, lambda i: client.post('/api/leads', json={
+            'name': f'Novo {i}', 'phone': f'+55218{i:08d}', 'email': f'novo{i}@example.com',
+        })),
+        ('lead update', state['requests'], noop, lambda i: client.put(f'/api/leads/{lead_ids[i % len(lead_ids)]}', json={
+            'status': 'quente' if i % 2 else 'frio', 'notes': f'Atualizado {i}',
+        })),
+        ('lead delete', state['requests'], delete_setup,
+         lambda i: client.delete(f"/api/leads/{state['temp_lead']}")),
+        ('leads import 200', heavy, import_setup, lambda i: client.post(
+            '/api/leads/import', data={'file': (io.BytesIO(csv_upload), 'leads.csv')},
+            content_type='multipart/form-data')),
+        ('leads export csv', heavy, noop, lambda i: client.get('/api/leads/export')),
+        ('messages export ndjson', heavy, noop, lambda i: client.get('/api/messages/export?format=ndjson')),
+        ('schedule contact', state['requests'], noop, lambda i: client.post('/api/schedule-contact', json={
+            'lead_id': lead_ids[i % len(lead_ids)], 'scheduled_time': '2035-01-01T10:00',
+        })),
+        ('scheduled contacts', state['requests'], noop, lambda i: client.get('/api/scheduled-contacts')),
+        ('scheduled contacts window', state['requests'], noop,
+         lambda i: client.get('/api/scheduled-contacts?from=2035-01-01&to=2035-01-31&limit=50')),
+        ('send message', state['requests'], noop, lambda i: client.post('/api/send-message', json={
+            'lead_id': lead_ids[i % len(lead_ids)], 'message': 'Olá!',
+        })),
+        ('send message bulk', heavy, noop, lambda i: client.post('/api/send-message', json={
+            'message': 'Olá a todos!', 'is_bulk': True,
+        })),
+        ('schedule message', state['requests'], noop, lambda i: client.post('/api/schedule-message', json={
+            'lead_id': lead_ids[i % len(lead_ids)], 'message': 'Lembrete', 'scheduled_time': '2035-01-01T10:00',
+        })),
+        ('job check_scheduled_messages', heavy, reset_due_messages, lambda i: run_job(check_scheduled_messages)),
+        ('job check_scheduled_contacts', heavy, reset_due_contacts, lambda i: run_job(check_scheduled_contacts)),
+        ('logout', heavy, lambda i: login(), lambda i: client.post('/api/logout')),
+    ]
+
+
+def _run_scenario(scenario, counter):
+    name, repeat, setup, call = scenario
+    timings = []
+    queries = []
+    for i in range(repeat):
+        setup(i)
+        before = counter.count
+        started = time.perf_counter()
+        response = call(i)
+        if response is not None:
+            response.get_data()
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name}: HTTP {response.status_code} {response.get_data(as_text=True)[:200]}")
+        timings.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.count - before)
+
+    # One more call under tracemalloc for the peak memory; it slows Python
+    # down too much to stay on during the timed calls
+    setup(repeat)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    response = call(repeat)
+    if response is not None:
+        response.get_data()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'requests': repeat,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(_percentile(timings, 0.95), 3),
+        'p99_ms': round(_percentile(timings, 0.99), 3),
+        'queries': round(statistics.mean(queries), 2),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    List the scenarios that regressed against a baseline run.
+
+    Returns:
+        list: Human readable regression descriptions
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        limit = base['p95_ms'] * (1 + tolerance) + LATENCY_SLACK_MS
+        if result['p95_ms'] > limit:
+            regressions.append(f"{name}: p95 {result['p95_ms']:.1f}ms > {limit:.1f}ms (baseline {base['p95_ms']:.1f}ms)")
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: {result['queries']} queries/request > baseline {base['queries']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file')
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--leads', type=int, default=100000)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--contacts', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=30, help='timed calls per scenario (heavy ones run fewer)')
+    parser.add_argument('--only', help='comma-separated scenario names to run')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file from a previous --save to gate regressions against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    db_file = None
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        os.environ['DATABASE_URL'] = f'sqlite:///{db_file.name}'
+
+    # Measure the whole send/schedule work, not just handing it to the pool
+    os.environ.setdefault('JOB_EXECUTOR', 'inline')
+
+    # Imported here so DATABASE_URL is set before the app is created
+    from sqlalchemy import delete, select, update
+    from app import db
+    from benchmarks import dataset
+    from main import app
+    from migrations import run_migrations
+    from models import Lead, ScheduledContact, ScheduledMessage
+
+    app.config['TESTING'] = True
+    results = {}
+    try:
+        with app.app_context():
+            run_migrations(db.engine)
+            started = time.perf_counter()
+            seeded = dataset.seed(args.users, args.leads, args.messages, args.contacts)
+            print(f"Seeded {args.users} users, {args.leads} leads, {args.messages} messages, "
+                  f"{args.contacts} contacts on {db.engine.dialect.name} in {time.perf_counter() - started:.1f}s")
+            counter = QueryCounter(db.engine)
+            user_id = seeded['user_id']
+
+        client = app.test_client()
+        state = {
+            'app': app,
+            'client': client,
+            'requests': args.requests,
+            'username': seeded['username'],
+            'password': dataset.BENCH_PASSWORD,
+            'lead_ids': seeded['lead_ids'],
+        }
+
+        def reset_due(kind):
+            # Put a fixed number of rows back in the due state for the next job run
+            with app.app_context():
+                if kind == 'messages':
+                    ids = select(ScheduledMessage.id).where(
+                        ScheduledMessage.user_id == user_id
+                    ).order_by(ScheduledMessage.id).limit(500)
+                    db.session.execute(update(ScheduledMessage).where(ScheduledMessage.id.in_(ids)).values(
+                        is_sent=False, delivery_status='queued', scheduled_time=ScheduledMessage.created_at
+                    ))
+                else:
+                    ids = select(ScheduledContact.id).where(
+                        ScheduledContact.user_id == user_id
+                    ).order_by(ScheduledContact.id).limit(500)
+                    db.session.execute(update(ScheduledContact).where(ScheduledContact.id.in_(ids)).values(
+                        is_notified=False, scheduled_time=ScheduledContact.created_at
+                    ))
+                db.session.commit()
+
+        def delete_imported():
+            with app.app_context():
+                db.session.execute(delete(Lead).where(Lead.name.like('Importado %')))
+                db.session.commit()
+
+        state['reset_due'] = reset_due
+        state['delete_imported'] = delete_imported
+
+        response = client.post('/api/login', json={'username': state['username'], 'password': state['password']})
+        if response.status_code != 200:
+            raise RuntimeError(f"login failed: {response.get_data(as_text=True)}")
+        state['leads_etag'] = client.get('/api/leads?limit=50').headers.get('ETag', '')
+
+        only = set(args.only.split(',')) if args.only else None
+        print(f"{'scenario':<30} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'peak KB':>9}")
+        for scenario in _scenarios(state):
+            if only and scenario[0] not in only:
+                continue
+            result = results[scenario[0]] = _run_scenario(scenario, counter)
+            print(f"{scenario[0]:<30} {result['requests']:>4} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                  f"{result['p99_ms']:>9.2f} {result['queries']:>8.2f} {result['peak_kb']:>9.1f}")
+    finally:
+        if db_file is not None:
+            os.unlink(db_file.name)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2, sort_keys=True)
+        print(f"Results written to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Cost of building the GET /api/leads JSON response for a large account:
+ORM objects + hand-built dicts + the default provider (the old path) versus
+column projection + compiled row serializers, with the default provider and
+with orjson.
+
+    python -m benchmarks.bench_serializers [--leads 20000] [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+_db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_file.name}"
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import desc, insert
+
+from app import db
+from main import app
+from migrations import run_migrations
+from models import Lead, User
+from utils.json_provider import OrjsonProvider, orjson
+from utils.serializers import LEAD_SERIALIZER, RowSerializer
+
+FIELDS = ['id', 'name', 'phone', 'email', 'status', 'notes', 'next_contact_date', 'updated_at']
+
+
+def _seed(count):
+    user = User(username='bench', email='bench@example.com')
+    user.set_password('bench')
+    db.session.add(user)
+    db.session.commit()
+    db.session.execute(insert(Lead.__table__), [{
+        'name': f'Lead {i}',
+        'phone': f'+55119{i:08d}',
+        'email': f'lead{i}@example.com',
+        'notes': 'Cliente interessado no plano anual',
+        'status': 'frio',
+        'user_id': user.id,
+    } for i in range(count)])
+    db.session.commit()
+    return user.id
+
+
+def _orm_path(user_id, provider):
+    leads = Lead.query.filter_by(user_id=user_id).order_by(desc(Lead.updated_at)).all()
+    return provider.response([{
+        'id': lead.id,
+        'name': lead.name,
+        'phone': lead.phone,
+        'email': lead.email,
+        'status': lead.status,
+        'notes': lead.notes,
+        'next_contact_date': lead.next_contact_date.isoformat() if lead.next_contact_date else None,
+        'updated_at': lead.updated_at.isoformat(),
+    } for lead in leads])
+
+
+def _projection_path(user_id, provider, serializer):
+    rows = db.session.query(*serializer.select(FIELDS)).filter(
+        Lead.user_id == user_id
+    ).order_by(desc(Lead.updated_at)).all()
+    return provider.response(serializer.serialize(rows, FIELDS))
+
+
+def _measure(label, func, repeat):
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        size = len(func().get_data())
+        timings.append((time.perf_counter() - started) * 1000)
+    print(f"{label:<34} median {statistics.median(timings):8.1f} ms   min {min(timings):8.1f} ms   {size / 1e6:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--leads', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with app.app_context(), app.test_request_context():
+        run_migrations(db.engine)
+        user_id = _seed(args.leads)
+        default_provider = DefaultJSONProvider(app)
+        # Without orjson the serializer converts datetimes itself
+        iso_serializer = RowSerializer(LEAD_SERIALIZER.columns, native_datetimes=False)
+
+        print(f"{args.leads} leads, {len(FIELDS)} fields")
+        _measure('orm objects + default json', lambda: _orm_path(user_id, default_provider), args.repeat)
+        _measure('projection + default json', lambda: _projection_path(user_id, default_provider, iso_serializer),
+                 args.repeat)
+        if orjson is None:
+            print("orjson not installed; skipping the orjson provider")
+        else:
+            orjson_provider = OrjsonProvider(app)
+            _measure('projection + orjson', lambda: _projection_path(user_id, orjson_provider, LEAD_SERIALIZER),
+                     args.repeat)
+
+    os.unlink(_db_file.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Read latency and throughput of a SQLite database while a writer commits
+scheduler-style batch updates, with the previous engine settings (rollback
+journal, pre-ping) versus the tuned profile from utils.db_engine (WAL,
+synchronous=NORMAL, mmap, busy_timeout, cache_size).
+
+    python -m benchmarks.bench_sqlite_concurrency [--leads 50000] [--readers 4] [--duration 5]
+
+Each profile gets its own database file, since WAL mode is persistent.
+Readers are separate processes, like gunicorn workers, running the
+GET /api/leads page query in a loop; the writer updates
+--batch rows per transaction, as a claim batch of the scheduler does.
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from models import Lead, User
+from utils.db_engine import configure_engine, engine_options
+
+READ_SQL = text(
+    "SELECT id, name, phone, email, status, updated_at FROM lead "
+    "WHERE user_id = :user_id ORDER BY updated_at DESC, id DESC LIMIT 50"
+)
+WRITE_SQL = text(
+    "UPDATE lead SET status = :status, updated_at = :now "
+    "WHERE id > :start AND id <= :start + :batch"
+)
+
+
+def _baseline_engine(url):
+    # What create_app used before the backend profiles
+    return create_engine(url, pool_recycle=300, pool_pre_ping=True)
+
+
+def _tuned_engine(url):
+    engine = create_engine(url, **engine_options(url))
+    configure_engine(engine)
+    return engine
+
+
+def _seed(engine, leads):
+    db.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [{
+            'username': 'bench', 'email': 'bench@example.com', 'password_hash': '-', 'is_active': True,
+            'created_at': now,
+        }])
+        conn.execute(insert(Lead.__table__), [{
+            'name': f'Lead {i}',
+            'phone': f'+55119{i:08d}',
+            'email': f'lead{i}@example.com',
+            'status': 'frio',
+            'created_at': now,
+            'updated_at': now - timedelta(seconds=i),
+            'user_id': 1,
+        } for i in range(leads)])
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _reader(make_engine, url, duration, results):
+    engine = make_engine(url)
+    timings, errors = [], 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(READ_SQL, {'user_id': 1}).all()
+        except OperationalError:
+            errors += 1
+            continue
+        timings.append((time.perf_counter() - started) * 1000)
+    engine.dispose()
+    results.put(('read', timings, errors))
+
+
+def _writer(make_engine, url, duration, leads, batch, write_interval, results):
+    engine = make_engine(url)
+    statuses = ('frio', 'morno', 'quente')
+    timings, errors, i = [], 0, 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                conn.execute(WRITE_SQL, {'status': statuses[i % 3], 'now': datetime.utcnow(),
+                                         'start': (i * batch) % leads, 'batch': batch})
+            timings.append((time.perf_counter() - started) * 1000)
+        except OperationalError:
+            errors += 1
+        i += 1
+        time.sleep(write_interval)
+    engine.dispose()
+    results.put(('write', timings, errors))
+
+
+def _run(make_engine, url, leads, readers, duration, batch, write_interval):
+    # Separate processes, like gunicorn workers: threads would mostly measure the GIL
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_reader, args=(make_engine, url, duration, results))
+                 for _ in range(readers)]
+    processes.append(multiprocessing.Process(
+        target=_writer, args=(make_engine, url, duration, leads, batch, write_interval, results)))
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    reads = [value for kind, timings, _ in collected if kind == 'read' for value in timings]
+    writes = [value for kind, timings, _ in collected if kind == 'write' for value in timings]
+    return {
+        'reads_per_s': len(reads) / duration,
+        'read_p50': statistics.median(reads) if reads else 0.0,
+        'read_p99': _percentile(reads, 0.99),
+        'writes_per_s': len(writes) / duration,
+        'write_p50': statistics.median(writes) if writes else 0.0,
+        'errors': sum(errors for _, _, errors in collected),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--leads', type=int, default=50000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--write-interval', type=float, default=0.01)
+    args = parser.parse_args()
+
+    print(f"{args.leads} leads, {args.readers} readers, 1 writer updating {args.batch} rows "
+          f"every {args.write_interval * 1000:.0f} ms, {args.duration:.0f}s per profile")
+    for label, make_engine in (('baseline (rollback journal)', _baseline_engine), ('tuned (WAL)', _tuned_engine)):
+        db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        db_file.close()
+        url = f'sqlite:///{db_file.name}'
+        engine = make_engine(url)
+        try:
+            _seed(engine, args.leads)
+            engine.dispose()
+            result = _run(make_engine, url, args.leads, args.readers, args.duration, args.batch,
+                          args.write_interval)
+        finally:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(db_file.name + suffix):
+                    os.unlink(db_file.name + suffix)
+        print(f"{label:<28} reads {result['reads_per_s']:8.0f}/s  p50 {result['read_p50']:7.2f} ms  "
+              f"p99 {result['read_p99']:8.2f} ms   writes {result['writes_per_s']:6.1f}/s  "
+              f"p50 {result['write_p50']:7.2f} ms   lock errors {result['errors']}")
+
+
+if __name__ == '__main__':
+    main()
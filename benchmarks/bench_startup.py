@@ -0,0 +1,89 @@
+"""
+Cold start of the serverless entry point: a fresh interpreter imports main
+and serves its first request, as on every Vercel cold start.
+
+    python -m benchmarks.bench_startup [--runs 10] [--path /api/metrics] [--database-url URL]
+
+The default path queries the database, so engine creation and the first
+connection are part of the measurement. Heavy optional modules that were
+imported by the time the response was sent are listed, since none of them
+is needed to answer a request.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY_MODULES = ('apscheduler', 'twilio', 'playwright', 'openpyxl', 'requests')
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+from main import app
+imported = time.perf_counter()
+response = app.test_client().get({path!r})
+responded = time.perf_counter()
+print(json.dumps({{
+    'status': response.status_code,
+    'import_ms': (imported - started) * 1000,
+    'response_ms': (responded - imported) * 1000,
+    'heavy': [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def _project_root():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run_once(path, env):
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD.format(path=path, heavy=HEAVY_MODULES)],
+        cwd=_project_root(), env=env, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/api/metrics')
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    db_file = None
+    if args.database_url:
+        env['DATABASE_URL'] = args.database_url
+    else:
+        db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        env['DATABASE_URL'] = f'sqlite:///{db_file.name}'
+
+    try:
+        # Schema changes are a deploy step, not part of a cold start
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'main', 'db-migrate'],
+                       cwd=_project_root(), env=env, capture_output=True, check=True)
+
+        results = [_run_once(args.path, env) for _ in range(args.runs)]
+    finally:
+        if db_file is not None:
+            os.unlink(db_file.name)
+
+    print(f"GET {args.path} -> {results[0]['status']}, {args.runs} cold starts")
+    for key, label in (('import_ms', 'import main'), ('response_ms', 'first response'),
+                       ('process_ms', 'whole process')):
+        timings = [result[key] for result in results]
+        print(f"{label:<16} median {statistics.median(timings):8.1f} ms   min {min(timings):8.1f} ms")
+    heavy = sorted({name for result in results for name in result['heavy']})
+    print(f"heavy modules loaded: {', '.join(heavy) if heavy else 'none'}")
+
+
+if __name__ == '__main__':
+    main()
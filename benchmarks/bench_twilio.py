@@ -0,0 +1,103 @@
+"""
+Per-message latency of twilio_service.send_whatsapp_message against a local
+stub of the Twilio API, with a new Client per message (the old behaviour)
+versus the shared pooled client, followed by the throughput of
+send_bulk_whatsapp_messages at increasing concurrency.
+
+    python -m benchmarks.bench_twilio [--messages 200] [--latency 0.005]
+        [--concurrency 1,4,8,16] [--error-rate 0.05]
+"""
+import argparse
+import logging
+import os
+import statistics
+import time
+
+os.environ.setdefault("TWILIO_ACCOUNT_SID", "AC00000000000000000000000000000000")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "stub-token")
+os.environ.setdefault("TWILIO_PHONE_NUMBER", "+15550000000")
+
+from twilio.rest import Client
+
+from benchmarks.twilio_stub import start_stub_server
+from utils import twilio_service
+
+
+def _per_call_client_send(base_url, phone, message):
+    client = Client(twilio_service.TWILIO_ACCOUNT_SID, twilio_service.TWILIO_AUTH_TOKEN)
+    client.api.base_url = base_url
+    client.messages.create(body=message, from_=f"whatsapp:{twilio_service.TWILIO_PHONE_NUMBER}",
+                           to=f"whatsapp:{phone}")
+    client.http_client.session.close()
+
+
+def _measure(send, count):
+    timings = []
+    for i in range(count):
+        started = time.perf_counter()
+        send(f"+5511988880{i % 1000:03d}", "Olá!")
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def _report(label, timings, server, requests_before, connections_before):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<18} mean {statistics.mean(timings):7.2f} ms   p50 {statistics.median(timings):7.2f} ms   "
+          f"p95 {p95:7.2f} ms   connections {server.connections - connections_before}"
+          f"/{server.requests - requests_before} requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated server time per request (s)')
+    parser.add_argument('--concurrency', default='1,4,8,16', help='comma-separated batch concurrency levels')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of sends answered with 429')
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.latency)
+    twilio_service.TWILIO_API_BASE_URL = base_url
+    twilio_service.reset_client()
+
+    r, c = server.requests, server.connections
+    before = _measure(lambda phone, msg: _per_call_client_send(base_url, phone, msg), args.messages)
+    _report('client per call', before, server, r, c)
+
+    r, c = server.requests, server.connections
+    after = _measure(twilio_service.send_whatsapp_message, args.messages)
+    _report('shared client', after, server, r, c)
+
+    r = server.requests
+    started = time.perf_counter()
+    for _ in range(args.messages):
+        twilio_service.check_twilio_status()
+    elapsed = (time.perf_counter() - started) * 1000 / args.messages
+    print(f"{'status check':<18} mean {elapsed:7.3f} ms   API requests {server.requests - r}/{args.messages} calls")
+
+    server.shutdown()
+
+    # Retries are logged as warnings; keep the output to the summary lines
+    logging.disable(logging.WARNING)
+
+    # Batch sends: no client-side rate limit, so only concurrency bounds throughput
+    server, base_url = start_stub_server(args.latency, args.error_rate)
+    twilio_service.TWILIO_API_BASE_URL = base_url
+    twilio_service.TWILIO_RETRY_BASE_DELAY = 0.01
+    twilio_service.reset_client()
+    recipients = [{'phone': f"+5511988880{i % 1000:03d}", 'name': f"Lead {i}"} for i in range(args.messages)]
+    for concurrency in (int(value) for value in args.concurrency.split(',')):
+        started = time.perf_counter()
+        results = twilio_service.send_bulk_whatsapp_messages(
+            recipients, "Olá {nome}!", concurrency=concurrency, rate_per_second=1_000_000
+        )
+        elapsed = time.perf_counter() - started
+        retries = sum(entry['attempts'] - 1 for entry in results['recipients'])
+        print(f"{'bulk x' + str(concurrency):<18} {len(recipients) / elapsed:8.1f} msg/s   "
+              f"sent {results['success']}/{results['total']}   retries {retries}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from app import db
+from models import Lead, ScheduledContact, ScheduledMessage, User
+from utils.lead_stats import LEAD_STATUSES
+
+BENCH_PASSWORD = 'bench-password'
+
+FIRST_NAMES = ('Ana', 'Bruno', 'Carla', 'Diego', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela', 'João')
+LAST_NAMES = ('Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa', 'Rodrigues', 'Almeida', 'Gomes')
+
+INSERT_BATCH = 5000
+
+
+def _insert(model, rows):
+    for start in range(0, len(rows), INSERT_BATCH):
+        db.session.execute(insert(model.__table__), rows[start:start + INSERT_BATCH])
+    db.session.commit()
+
+
+def seed(users=1, leads=100000, messages=20000, contacts=5000, due_fraction=0.1, seed_value=42):
+    """
+    Fill an empty database with a synthetic, reproducible dataset.
+
+    Leads, messages and contacts are spread round-robin over the users, so
+    user 1 owns the largest share. A due_fraction of the pending messages
+    and contacts is scheduled in the past, for the scheduler jobs to claim.
+
+    Returns:
+        dict: Row counts and the id and username of the first user
+    """
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+
+    _insert(User, [{
+        'username': f'bench{i}',
+        'email': f'bench{i}@example.com',
+        'password_hash': password_hash,
+        'is_active': True,
+        'created_at': now,
+    } for i in range(1, users + 1)])
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).order_by(User.id)]
+
+    lead_rows = []
+    for i in range(leads):
+        phone = f'+55{rng.randint(11, 99)}9{rng.randint(0, 99999999):08d}'
+        created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+        lead_rows.append({
+            'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}',
+            'phone': phone,
+            'phone_e164': phone,
+            'email': f'lead{i}@example.com',
+            'notes': 'Interessado no plano anual' if i % 3 == 0 else '',
+            'status': rng.choice(LEAD_STATUSES),
+            'created_at': created,
+            'updated_at': created,
+            'user_id': user_ids[i % len(user_ids)],
+        })
+    _insert(Lead, lead_rows)
+    lead_rows = None
+
+    # Lead ids per user, in insertion order
+    lead_ids = {user_id: [] for user_id in user_ids}
+    for lead_id, user_id in db.session.query(Lead.id, Lead.user_id).order_by(Lead.id):
+        lead_ids[user_id].append(lead_id)
+
+    def owner_and_lead(i):
+        user_id = user_ids[i % len(user_ids)]
+        return user_id, rng.choice(lead_ids[user_id]) if lead_ids[user_id] else None
+
+    message_rows = []
+    for i in range(messages):
+        user_id, lead_id = owner_and_lead(i)
+        sent = i % 2 == 0
+        due = not sent and rng.random() < due_fraction
+        scheduled = now - timedelta(minutes=rng.randint(1, 10000)) if sent or due else \
+            now + timedelta(minutes=rng.randint(60, 100000))
+        message_rows.append({
+            'message': 'Olá {nome}, tudo bem? Temos novidades para você.',
+            'scheduled_time': scheduled,
+            'is_sent': sent,
+            'delivery_status': 'sent' if sent else 'queued',
+            'attempts': 1 if sent else 0,
+            'sent_at': scheduled if sent else None,
+            'is_bulk': i % 5 == 0,
+            'created_at': now,
+            'updated_at': now,
+            'user_id': user_id,
+            'lead_id': lead_id,
+        })
+    _insert(ScheduledMessage, message_rows)
+    message_rows = None
+
+    contact_rows = []
+    for i in range(contacts):
+        user_id, lead_id = owner_and_lead(i)
+        due = rng.random() < due_fraction
+        contact_rows.append({
+            'scheduled_time': now - timedelta(minutes=rng.randint(1, 10000)) if due else
+            now + timedelta(minutes=rng.randint(60, 100000)),
+            'notes': 'Ligar para apresentar proposta',
+            'is_notified': False,
+            'created_at': now,
+            'user_id': user_id,
+            'lead_id': lead_id,
+        })
+    _insert(ScheduledContact, contact_rows)
+
+    return {
+        'users': users,
+        'leads': leads,
+        'messages': messages,
+        'contacts': contacts,
+        'user_id': user_ids[0],
+        'username': 'bench1',
+        'lead_ids': lead_ids[user_ids[0]],
+    }
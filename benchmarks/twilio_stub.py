@@ -0,0 +1,73 @@
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    error_rate = 0.0
+
+    def setup(self):
+        super().setup()
+        # Avoid Nagle/delayed-ACK stalls on keep-alive connections
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        if self.latency:
+            time.sleep(self.latency)
+        self.server.requests += 1
+        if self.error_rate and random.random() < self.error_rate:
+            self.server.throttled += 1
+            self._reply(429, {'code': 20429, 'message': 'Too Many Requests', 'status': 429})
+            return
+        self._reply(201, {'sid': f'SM{self.server.requests:032d}', 'status': 'queued'})
+
+    def do_GET(self):
+        self.server.requests += 1
+        self._reply(200, {'sid': 'AC00000000000000000000000000000000', 'friendly_name': 'Stub', 'status': 'active'})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(latency=0.0, error_rate=0.0):
+    """
+    Start a local HTTP server that answers like the Twilio REST API.
+
+    Every POST is treated as a message create and every GET as an account
+    fetch. A fraction `error_rate` of the POSTs is answered with 429 to
+    exercise retries. The server counts connections and requests so
+    benchmarks can show connection reuse.
+
+    Returns:
+        tuple: (server, base_url)
+    """
+    handler = type('StubHandler', (_StubHandler,), {'latency': latency, 'error_rate': error_rate})
+
+    class StubServer(ThreadingHTTPServer):
+        daemon_threads = True
+        requests = 0
+        connections = 0
+        throttled = 0
+
+        def process_request(self, request, client_address):
+            self.connections += 1
+            super().process_request(request, client_address)
+
+    server = StubServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
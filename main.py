@@ -1,8 +1,28 @@
-from app import app
+import os
+
+from app import create_app, db
 from routes import register_routes
 
+# Run the scheduler (and the outbox, when MESSAGE_TRANSPORT is set) inside
+# this web process. Off by default: with several gunicorn workers every
+# worker would start one; prefer a single `python worker.py` process.
+RUN_SCHEDULER = os.environ.get("RUN_SCHEDULER", "").lower() in ('1', 'true', 'yes', 'on')
+
+# Building the app opens no database connection: schema changes are applied
+# with `flask --app main db-migrate` (or below, when running locally)
+app = create_app()
+
 # Register all routes
 register_routes(app)
 
+if RUN_SCHEDULER:
+    from utils.scheduler import init_scheduler
+    init_scheduler(app)
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    from migrations import run_migrations
+    with app.app_context():
+        run_migrations(db.engine)
+    # The reloader re-imports this module in a child process, which would
+    # start a second scheduler
+    app.run(debug=True, host='0.0.0.0', port=5000, use_reloader=not RUN_SCHEDULER)
@@ -0,0 +1,266 @@
+import logging
+import re
+from datetime import datetime
+from sqlalchemy import bindparam, desc, func, inspect, select, text, update
+from sqlalchemy.schema import CreateIndex
+
+from app import db
+from models import Lead, ScheduledMessage, ScheduledContact
+from utils.db_engine import maintenance_engine
+from utils.lead_search import create_phone_search_index, create_search_index
+from utils.phone import to_e164
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_TABLE = 'schema_migrations'
+
+# Rows read and updated per transaction by data backfills
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _create_model_indexes(engine, *models, names=None):
+    """
+    Create the indexes declared in __table_args__ that are missing.
+
+    Pass names to limit the call to the indexes a migration introduces;
+    indexes added later may depend on columns a later migration creates.
+
+    On PostgreSQL the indexes are built with CREATE INDEX CONCURRENTLY so
+    writes to the table are not blocked while they are built.
+    """
+    is_postgres = engine.dialect.name == 'postgresql'
+    options = {'isolation_level': 'AUTOCOMMIT'} if is_postgres else {}
+
+    with engine.connect().execution_options(**options) as conn:
+        for model in models:
+            for index in model.__table__.indexes:
+                if names is not None and index.name not in names:
+                    continue
+                ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+                if is_postgres:
+                    ddl = re.sub(r'^CREATE (UNIQUE )?INDEX', r'CREATE \1INDEX CONCURRENTLY', ddl)
+                logger.info(f"Creating index {index.name}")
+                conn.execute(text(ddl))
+        conn.commit()
+
+
+def _add_missing_columns(engine, model, *names):
+    """
+    Add model columns that the existing table does not have yet.
+
+    New columns must be nullable or have a server_default, so the ALTER
+    does not need to rewrite existing rows.
+    """
+    table = model.__table__
+    existing = {column['name'] for column in inspect(engine).get_columns(table.name)}
+
+    with engine.begin() as conn:
+        for name in names:
+            if name in existing:
+                continue
+            column = table.c[name]
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {name} {column.type.compile(engine.dialect)}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT '{column.server_default.arg}'"
+            if not column.nullable:
+                ddl += " NOT NULL"
+            logger.info(f"Adding column {table.name}.{name}")
+            conn.execute(text(ddl))
+
+
+def _migration_lead_search(engine):
+    create_search_index(engine)
+
+
+def _migration_hot_query_indexes(engine):
+    _create_model_indexes(engine, Lead, ScheduledMessage, ScheduledContact, names=(
+        'ix_lead_user_status', 'ix_lead_user_updated', 'ix_lead_user_created',
+        'ix_scheduled_message_pending', 'ix_scheduled_message_lead',
+        'ix_scheduled_contact_user_pending', 'ix_scheduled_contact_pending', 'ix_scheduled_contact_lead',
+    ))
+
+
+def _migration_outbox_columns(engine):
+    _add_missing_columns(
+        engine, ScheduledMessage,
+        'delivery_status', 'attempts', 'next_attempt_at', 'sent_at', 'last_error'
+    )
+    # Rows flipped to is_sent before the outbox existed count as delivered
+    with engine.begin() as conn:
+        conn.execute(
+            update(ScheduledMessage)
+            .where(ScheduledMessage.is_sent == True, ScheduledMessage.delivery_status == 'queued')
+            .values(delivery_status='sent')
+        )
+
+
+def _migration_lead_phone_e164(engine):
+    _add_missing_columns(engine, Lead, 'phone_e164')
+
+    # Backfill in short transactions walking the primary key. updated_at is
+    # written back unchanged so the onupdate default does not touch it.
+    table = Lead.__table__
+    statement = update(table).where(table.c.id == bindparam('lead_id')).values(
+        phone_e164=bindparam('e164'), updated_at=table.c.updated_at
+    )
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(table.c.id, table.c.phone)
+                .where(table.c.id > last_id, table.c.phone_e164.is_(None))
+                .order_by(table.c.id)
+                .limit(BACKFILL_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            values = [{'lead_id': row.id, 'e164': to_e164(row.phone)} for row in rows]
+            values = [value for value in values if value['e164']]
+            if values:
+                conn.execute(statement, values)
+            last_id = rows[-1].id
+
+    _create_model_indexes(engine, Lead, names=('ix_lead_user_phone_e164',))
+
+
+def _migration_scheduled_contact_window_index(engine):
+    _create_model_indexes(engine, ScheduledContact, names=('ix_scheduled_contact_user_time',))
+
+
+def _migration_phone_search_index(engine):
+    create_phone_search_index(engine)
+
+
+# Ordered list of (version, description, function). Append new entries at
+# the end; never renumber or edit one that has already shipped.
+MIGRATIONS = [
+    (1, 'lead search index', _migration_lead_search),
+    (2, 'composite and partial indexes for hot queries', _migration_hot_query_indexes),
+    (3, 'outbox delivery columns on scheduled_message', _migration_outbox_columns),
+    (4, 'canonical lead phone column', _migration_lead_phone_e164),
+    (5, 'scheduled contact window index', _migration_scheduled_contact_window_index),
+    (6, 'phone search index', _migration_phone_search_index),
+]
+
+
+def _ensure_migrations_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+            "version INTEGER PRIMARY KEY, "
+            "description VARCHAR(200) NOT NULL, "
+            "applied_at TIMESTAMP NOT NULL)"
+        ))
+
+
+def applied_versions(engine):
+    _ensure_migrations_table(engine)
+    with engine.connect() as conn:
+        return set(conn.execute(text(f"SELECT version FROM {MIGRATIONS_TABLE}")).scalars())
+
+
+def run_migrations(engine=None):
+    """
+    Bring the database schema up to date.
+
+    Missing tables are created first, then every migration that is not
+    recorded in schema_migrations is applied in order. Each migration is
+    idempotent, so a run interrupted halfway can simply be repeated.
+
+    Migrations run without the app's statement_timeout, so index builds on
+    large tables are not cut short (see maintenance_engine).
+
+    Returns:
+        list: Versions applied by this run
+    """
+    app_engine = engine or db.engine
+    engine = maintenance_engine(app_engine)
+    try:
+        db.metadata.create_all(engine)
+
+        done = applied_versions(engine)
+        applied = []
+        for version, description, migrate in MIGRATIONS:
+            if version in done:
+                continue
+            logger.info(f"Applying migration {version}: {description}")
+            migrate(engine)
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"INSERT INTO {MIGRATIONS_TABLE} (version, description, applied_at) "
+                    "VALUES (:version, :description, :applied_at)"
+                ), {'version': version, 'description': description, 'applied_at': datetime.utcnow()})
+            applied.append(version)
+        return applied
+    finally:
+        if engine is not app_engine:
+            engine.dispose()
+
+
+def _hot_queries():
+    """Representative statements for the queries the routes and scheduler run most."""
+    now = datetime.utcnow()
+    return [
+        ('dashboard stats', 'ix_lead_user_status',
+         select(Lead.status, func.count(Lead.id)).where(Lead.user_id == 1).group_by(Lead.status)),
+        ('dashboard recent leads', 'ix_lead_user_created',
+         select(Lead.id).where(Lead.user_id == 1).order_by(desc(Lead.created_at)).limit(5)),
+        ('dashboard upcoming contacts', 'ix_scheduled_contact_user_pending',
+         select(ScheduledContact.id).where(
+             ScheduledContact.user_id == 1,
+             ScheduledContact.is_notified == False,
+             ScheduledContact.scheduled_time >= now,
+         ).order_by(ScheduledContact.scheduled_time).limit(5)),
+        ('leads list', 'ix_lead_user_updated',
+         select(Lead.id).where(Lead.user_id == 1).order_by(desc(Lead.updated_at), desc(Lead.id)).limit(50)),
+        ('lead phone lookup', 'ix_lead_user_phone_e164',
+         select(Lead.id).where(Lead.user_id == 1, Lead.phone_e164.in_(['+5511988887777']))),
+        ('scheduled contacts window', 'ix_scheduled_contact_user_time',
+         select(ScheduledContact.id).where(
+             ScheduledContact.user_id == 1,
+             ScheduledContact.scheduled_time >= now,
+         ).order_by(ScheduledContact.scheduled_time, ScheduledContact.id).limit(50)),
+        ('scheduler messages', 'ix_scheduled_message_pending',
+         select(ScheduledMessage.id).where(
+             ScheduledMessage.is_sent == False,
+             ScheduledMessage.scheduled_time <= now,
+         )),
+        ('scheduler contacts', 'ix_scheduled_contact_pending',
+         select(ScheduledContact.id).where(
+             ScheduledContact.is_notified == False,
+             ScheduledContact.scheduled_time <= now,
+         )),
+    ]
+
+
+def explain_hot_queries(engine=None):
+    """
+    Run EXPLAIN on the hot queries and check each one uses its index.
+
+    On PostgreSQL sequential scans are disabled for the check, otherwise the
+    planner prefers them on small tables and the result says nothing about
+    production data sizes.
+
+    Returns:
+        list: One dict per query with 'name', 'index', 'uses_index' and 'plan'
+    """
+    engine = engine or db.engine
+    is_postgres = engine.dialect.name == 'postgresql'
+    prefix = 'EXPLAIN' if is_postgres else 'EXPLAIN QUERY PLAN'
+
+    results = []
+    with engine.connect() as conn:
+        if is_postgres:
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+        for name, index_name, statement in _hot_queries():
+            sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+            rows = conn.execute(text(f"{prefix} {sql}")).all()
+            plan = '\n'.join(str(row[-1]) for row in rows)
+            results.append({
+                'name': name,
+                'index': index_name,
+                'uses_index': index_name in plan,
+                'plan': plan,
+            })
+        conn.rollback()
+    return results
@@ -1,11 +1,15 @@
 from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import validates
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db, login_manager
+from utils.phone import to_e164
+from utils.user_cache import get_cached_user, invalidate_cached_user
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return get_cached_user(int(user_id))
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -31,10 +35,19 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+# Password, email or is_active changes must reach the user_loader cache
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user_cache(mapper, connection, target):
+    invalidate_cached_user(target.id)
+
 class Lead(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(20), nullable=False)
+    # Canonical form of phone (+5511988887777), kept in sync by _set_phone_e164
+    phone_e164 = db.Column(db.String(16), nullable=True)
     email = db.Column(db.String(120), nullable=True)
     notes = db.Column(db.Text, nullable=True)
     next_contact_date = db.Column(db.DateTime, nullable=True)
@@ -47,6 +60,19 @@ class Lead(db.Model):
     scheduled_messages = db.relationship('ScheduledMessage', backref='lead', lazy=True)
     scheduled_contacts = db.relationship('ScheduledContact', backref='lead', lazy=True)
     
+    __table_args__ = (
+        db.Index('ix_lead_user_status', 'user_id', 'status'),
+        db.Index('ix_lead_user_updated', 'user_id', 'updated_at'),
+        db.Index('ix_lead_user_created', 'user_id', 'created_at'),
+        # Not unique: leads created before phone_e164 existed may share a number
+        db.Index('ix_lead_user_phone_e164', 'user_id', 'phone_e164'),
+    )
+    
+    @validates('phone')
+    def _set_phone_e164(self, key, phone):
+        self.phone_e164 = to_e164(phone)
+        return phone
+    
     def __repr__(self):
         return f'<Lead {self.name}>'
 
@@ -61,6 +87,20 @@ class ScheduledMessage(db.Model):
     lead_id = db.Column(db.Integer, db.ForeignKey('lead.id'), nullable=True)
     is_bulk = db.Column(db.Boolean, default=False)
     
+    # Outbox delivery state: queued, sending, sent, failed (dead-lettered)
+    delivery_status = db.Column(db.String(20), default='queued', server_default='queued', nullable=False)
+    attempts = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    
+    __table_args__ = (
+        # Partial index: only pending rows, which is all the scheduler reads
+        db.Index('ix_scheduled_message_pending', 'scheduled_time',
+                 sqlite_where=is_sent == False, postgresql_where=is_sent == False),
+        db.Index('ix_scheduled_message_lead', 'lead_id'),
+    )
+    
     def __repr__(self):
         return f'<ScheduledMessage {self.id}>'
 
@@ -73,6 +113,14 @@ class ScheduledContact(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     lead_id = db.Column(db.Integer, db.ForeignKey('lead.id'), nullable=False)
     
+    __table_args__ = (
+        db.Index('ix_scheduled_contact_user_pending', 'user_id', 'is_notified', 'scheduled_time'),
+        db.Index('ix_scheduled_contact_user_time', 'user_id', 'scheduled_time'),
+        db.Index('ix_scheduled_contact_pending', 'scheduled_time',
+                 sqlite_where=is_notified == False, postgresql_where=is_notified == False),
+        db.Index('ix_scheduled_contact_lead', 'lead_id'),
+    )
+    
     def __repr__(self):
         return f'<ScheduledContact {self.id}>'
 
@@ -85,4 +133,36 @@ class MessageTemplate(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
     def __repr__(self):
-        return f'<MessageTemplate {self.name}>'
\ No newline at end of file
+        return f'<MessageTemplate {self.name}>'
+
+class Job(db.Model):
+    """Background task started by a request; polled through GET /api/jobs/<id>."""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    # queued, running, done, failed
+    status = db.Column(db.String(20), default='queued', nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    total = db.Column(db.Integer, nullable=True)
+    processed = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_job_status_created', 'status', 'created_at'),
+    )
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+class SchedulerLease(db.Model):
+    """Short-lived named lock used to serialize scheduler claims across processes on SQLite."""
+    name = db.Column(db.String(64), primary_key=True)
+    owner = db.Column(db.String(128), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<SchedulerLease {self.name} {self.owner}>'
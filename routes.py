@@ -1,16 +1,77 @@
 import os
+import tempfile
 from datetime import datetime, timedelta
-from flask import request, jsonify, send_from_directory
+from flask import Response, g, request, jsonify, send_from_directory, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
-from sqlalchemy import desc, asc
+from sqlalchemy import desc, asc, and_, or_
 from zoneinfo import ZoneInfo
 from app import db
-from models import User, Lead, ScheduledMessage, ScheduledContact, MessageTemplate
+from models import User, Lead, ScheduledMessage, ScheduledContact, MessageTemplate, Job
+from utils.lead_stats import get_lead_stats, invalidate_lead_stats
+from utils.serializers import LEAD_SERIALIZER, SCHEDULED_CONTACT_SERIALIZER
+from utils.etag import conditional_get, contact_stamp, latest_lead_update, lead_stamp
+from utils.pagination import encode_cursor, decode_cursor, parse_limit
+from utils.lead_search import apply_lead_search
+from utils.lead_import import SUPPORTED_EXTENSIONS, import_leads, iter_rows
+from utils.export import EXPORT_FORMATS, export_rows, gzip_chunks, lead_export_query, message_export_query
+from utils.scheduler import notify_scheduled
+from utils.jobs import enqueue_job, job_to_dict
 
 # Brazil timezone
 SAO_PAULO_TZ = ZoneInfo('America/Sao_Paulo')
 
+LEAD_LIST_DEFAULT_FIELDS = ['id', 'name', 'phone', 'email', 'status', 'notes', 'next_contact_date', 'updated_at']
+LEAD_DETAIL_FIELDS = LEAD_LIST_DEFAULT_FIELDS + ['created_at']
+DASHBOARD_LEAD_FIELDS = ['id', 'name', 'status', 'created_at']
+DASHBOARD_CONTACT_FIELDS = ['id', 'lead_name', 'scheduled_time', 'notes']
+CONTACT_LIST_FIELDS = ['id', 'lead_id', 'lead_name', 'scheduled_time', 'notes', 'is_notified']
+
+def _dashboard_stamp(user_id):
+    # The upcoming contacts window starts today, so the date is part of the version.
+    # The first two items are the lead_stamp the cached stats are checked against.
+    return (*lead_stamp(user_id), *contact_stamp(user_id), datetime.now(SAO_PAULO_TZ).date())
+
+def _contact_list_stamp(user_id):
+    # Contact rows include the lead name
+    return (latest_lead_update(user_id), *contact_stamp(user_id))
+
+def _parse_window_bound(value, end=False):
+    """Parse a ?from=/?to= bound; a bare date used as end covers the whole day."""
+    if not value:
+        return None
+    if 'T' in value:
+        return datetime.fromisoformat(value)
+    day = datetime.strptime(value, '%Y-%m-%d')
+    return day + timedelta(days=1) if end else day
+
+def _export_response(fields, statement, name):
+    """Stream an export in the format given by ?format=, gzipped if the client accepts it."""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'Formato inválido. Use csv ou ndjson.'}), 400
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    
+    body = export_rows(fields, statement, fmt)
+    headers = {
+        'Content-Disposition': f'attachment; filename="{name}.{extension}"',
+        'Vary': 'Accept-Encoding',
+    }
+    if 'gzip' in request.accept_encodings:
+        body = gzip_chunks(body)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+def _job_accepted(job_id, message):
+    """202 response pointing the client at GET /api/jobs/<id>."""
+    response = jsonify({'message': message, 'job_id': job_id, 'status_url': f'/api/jobs/{job_id}'})
+    response.status_code = 202
+    response.headers['Location'] = f'/api/jobs/{job_id}'
+    return response
+
+def _owns_lead(lead_id):
+    return db.session.query(Lead.id).filter_by(id=lead_id, user_id=current_user.id).first() is not None
+
 def register_routes(app):
     
     @app.route('/')
@@ -88,74 +149,98 @@ def register_routes(app):
     
     @app.route('/api/dashboard')
     @login_required
+    @conditional_get(_dashboard_stamp)
     def dashboard():
-        total_leads = Lead.query.filter_by(user_id=current_user.id).count()
-        leads_frio = Lead.query.filter_by(user_id=current_user.id, status='frio').count()
-        leads_quente = Lead.query.filter_by(user_id=current_user.id, status='quente').count()
-        leads_fervendo = Lead.query.filter_by(user_id=current_user.id, status='fervendo').count()
-        leads_cliente = Lead.query.filter_by(user_id=current_user.id, status='cliente').count()
+        # Cached stats are only reused if they were computed for the same
+        # lead version as the ETag, even when another worker wrote the lead
+        stats = get_lead_stats(current_user.id, version=tuple(g.etag_stamp[:2]))
         
         today = datetime.now(SAO_PAULO_TZ).date()
-        upcoming_contacts = ScheduledContact.query.filter(
+        # Lead names come from the same query instead of one lazy load per contact
+        upcoming_contacts = db.session.query(
+            *SCHEDULED_CONTACT_SERIALIZER.select(DASHBOARD_CONTACT_FIELDS)
+        ).join(Lead, Lead.id == ScheduledContact.lead_id).filter(
             ScheduledContact.user_id == current_user.id,
             ScheduledContact.scheduled_time >= today,
             ScheduledContact.is_notified == False
         ).order_by(ScheduledContact.scheduled_time).limit(5).all()
         
-        recent_leads = Lead.query.filter_by(user_id=current_user.id).order_by(desc(Lead.created_at)).limit(5).all()
+        recent_leads = db.session.query(*LEAD_SERIALIZER.select(DASHBOARD_LEAD_FIELDS)).filter(
+            Lead.user_id == current_user.id
+        ).order_by(desc(Lead.created_at)).limit(5).all()
         
         return jsonify({
-            'stats': {
-                'total': total_leads,
-                'frio': leads_frio,
-                'quente': leads_quente,
-                'fervendo': leads_fervendo,
-                'cliente': leads_cliente
-            },
-            'upcoming_contacts': [{
-                'id': c.id,
-                'lead_name': c.lead.name,
-                'scheduled_time': c.scheduled_time.isoformat(),
-                'notes': c.notes
-            } for c in upcoming_contacts],
-            'recent_leads': [{
-                'id': l.id,
-                'name': l.name,
-                'status': l.status,
-                'created_at': l.created_at.isoformat()
-            } for l in recent_leads]
+            'stats': stats,
+            'upcoming_contacts': SCHEDULED_CONTACT_SERIALIZER.serialize(upcoming_contacts, DASHBOARD_CONTACT_FIELDS),
+            'recent_leads': LEAD_SERIALIZER.serialize(recent_leads, DASHBOARD_LEAD_FIELDS)
         })
     
     @app.route('/api/leads', methods=['GET'])
     @login_required
+    @conditional_get(lead_stamp, last_modified=lambda stamp: stamp[1])
     def leads():
         status_filter = request.args.get('status', '')
         search_query = request.args.get('search', '')
+        cursor = request.args.get('cursor', '')
+        fields = request.args.get('fields', '')
+        
+        if fields:
+            fields = [f.strip() for f in fields.split(',') if f.strip()]
+            unknown = [f for f in fields if f not in LEAD_SERIALIZER.columns]
+            if unknown:
+                return jsonify({'error': f"Campos inválidos: {', '.join(unknown)}"}), 400
+            # One cached row function per distinct set, not per spelling
+            fields = LEAD_SERIALIZER.normalize_fields(fields)
+        else:
+            fields = LEAD_LIST_DEFAULT_FIELDS
         
-        query = Lead.query.filter_by(user_id=current_user.id)
+        # Only the requested columns are selected, plus the keyset columns
+        # needed to build the next cursor
+        columns = LEAD_SERIALIZER.select(fields) + [Lead.updated_at, Lead.id]
+        query = db.session.query(*columns).filter(Lead.user_id == current_user.id)
         
         if status_filter:
             query = query.filter(Lead.status == status_filter)
         
+        # Pagination is opt-in so clients that expect the full list keep working
+        paginate = bool(cursor) or 'limit' in request.args
+        try:
+            limit = parse_limit(request.args.get('limit'))
+        except ValueError:
+            return jsonify({'error': 'Limite inválido.'}), 400
+        
         if search_query:
-            query = query.filter(
-                (Lead.name.ilike(f'%{search_query}%')) |
-                (Lead.phone.ilike(f'%{search_query}%')) |
-                (Lead.email.ilike(f'%{search_query}%'))
-            )
-        
-        leads = query.order_by(desc(Lead.updated_at)).all()
-        
-        return jsonify([{
-            'id': l.id,
-            'name': l.name,
-            'phone': l.phone,
-            'email': l.email,
-            'status': l.status,
-            'notes': l.notes,
-            'next_contact_date': l.next_contact_date.isoformat() if l.next_contact_date else None,
-            'updated_at': l.updated_at.isoformat()
-        } for l in leads])
+            # Search results are ranked by relevance, so they are not keyset
+            # paginated; ?limit= only caps how many are returned
+            query = apply_lead_search(query, search_query)
+            if paginate:
+                query = query.limit(limit)
+            return jsonify(LEAD_SERIALIZER.serialize(query.all(), fields))
+        
+        if cursor:
+            try:
+                cursor_updated_at, cursor_id = decode_cursor(cursor)
+            except ValueError:
+                return jsonify({'error': 'Cursor inválido.'}), 400
+            query = query.filter(or_(
+                Lead.updated_at < cursor_updated_at,
+                and_(Lead.updated_at == cursor_updated_at, Lead.id < cursor_id)
+            ))
+        
+        query = query.order_by(desc(Lead.updated_at), desc(Lead.id))
+        if paginate:
+            rows = query.limit(limit + 1).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+        else:
+            rows = query.all()
+            has_more = False
+        
+        response = jsonify(LEAD_SERIALIZER.serialize(rows, fields))
+        if has_more:
+            last = rows[-1]
+            response.headers['X-Next-Cursor'] = encode_cursor(last[-2], last[-1])
+        return response
 
     @app.route('/api/leads', methods=['POST'])
     @login_required
@@ -185,30 +270,73 @@ def register_routes(app):
         
         db.session.add(lead)
         db.session.commit()
+        invalidate_lead_stats(current_user.id)
         
         return jsonify({'message': 'Lead adicionado com sucesso!', 'lead': {'id': lead.id}})
 
+    @app.route('/api/leads/import', methods=['POST'])
+    @login_required
+    def import_leads_file():
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({'error': 'Arquivo é obrigatório.'}), 400
+        
+        filename = secure_filename(upload.filename)
+        if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+            return jsonify({'error': 'Formato inválido. Envie um arquivo CSV ou XLSX.'}), 400
+        
+        user_id = current_user.id
+        
+        # Clients that accept NDJSON get one progress line per chunk
+        if request.accept_mimetypes.best == 'application/x-ndjson':
+            # The upload is closed when the request context is torn down, before
+            # the response body is generated, so the generator reads its own copy
+            stream = tempfile.TemporaryFile()
+            upload.save(stream)
+            stream.seek(0)
+            
+            def generate():
+                try:
+                    for update in import_leads(iter_rows(stream, filename), user_id):
+                        yield app.json.dumps(update) + '\n'
+                except Exception:
+                    db.session.rollback()
+                    yield app.json.dumps({'done': True, 'error': 'Não foi possível ler o arquivo.'}) + '\n'
+                finally:
+                    stream.close()
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        progress = import_leads(iter_rows(upload.stream, filename), user_id)
+        try:
+            for summary in progress:
+                pass
+        except Exception:
+            db.session.rollback()
+            return jsonify({'error': 'Não foi possível ler o arquivo.'}), 400
+        if summary.get('error'):
+            return jsonify(summary), 400
+        return jsonify(summary)
+
+    @app.route('/api/leads/export', methods=['GET'])
+    @login_required
+    def export_leads():
+        fields, statement = lead_export_query(current_user.id, request.args.get('status', ''))
+        return _export_response(fields, statement, 'leads')
+
     @app.route('/api/leads/<int:lead_id>', methods=['GET'])
     @login_required
     def view_lead(lead_id):
-        lead = Lead.query.filter_by(id=lead_id, user_id=current_user.id).first_or_404()
-        return jsonify({
-            'id': lead.id,
-            'name': lead.name,
-            'phone': lead.phone,
-            'email': lead.email,
-            'status': lead.status,
-            'notes': lead.notes,
-            'next_contact_date': lead.next_contact_date.isoformat() if lead.next_contact_date else None,
-            'created_at': lead.created_at.isoformat(),
-            'updated_at': lead.updated_at.isoformat()
-        })
+        lead = db.session.query(*LEAD_SERIALIZER.select(LEAD_DETAIL_FIELDS)).filter(
+            Lead.id == lead_id, Lead.user_id == current_user.id
+        ).first_or_404()
+        return jsonify(LEAD_SERIALIZER.compile(LEAD_DETAIL_FIELDS)(lead))
 
     @app.route('/api/leads/<int:lead_id>', methods=['PUT'])
     @login_required
     def update_lead(lead_id):
         lead = Lead.query.filter_by(id=lead_id, user_id=current_user.id).first_or_404()
         data = request.get_json()
+        old_status = lead.status
         
         lead.name = data.get('name', lead.name)
         lead.phone = data.get('phone', lead.phone)
@@ -226,7 +354,10 @@ def register_routes(app):
             lead.next_contact_date = None
             
         lead.updated_at = datetime.utcnow()
+        status_changed = lead.status != old_status
         db.session.commit()
+        if status_changed:
+            invalidate_lead_stats(current_user.id)
         
         return jsonify({'message': 'Lead atualizado com sucesso!'})
 
@@ -240,6 +371,7 @@ def register_routes(app):
         
         db.session.delete(lead)
         db.session.commit()
+        invalidate_lead_stats(current_user.id)
         
         return jsonify({'message': 'Lead removido com sucesso!'})
 
@@ -265,6 +397,9 @@ def register_routes(app):
             except ValueError:
                 return jsonify({'error': 'Formato de data/hora inválido.'}), 400
         
+        if not _owns_lead(lead_id):
+            return jsonify({'error': 'Lead não encontrado.'}), 404
+        
         contact = ScheduledContact(
             lead_id=lead_id,
             scheduled_time=scheduled_time,
@@ -274,21 +409,62 @@ def register_routes(app):
         
         db.session.add(contact)
         db.session.commit()
+        notify_scheduled('contacts', scheduled_time)
         
         return jsonify({'message': 'Contato agendado com sucesso!'})
 
     @app.route('/api/scheduled-contacts', methods=['GET'])
     @login_required
+    @conditional_get(_contact_list_stamp)
     def get_scheduled_contacts():
-        contacts = ScheduledContact.query.filter_by(user_id=current_user.id).order_by(asc(ScheduledContact.scheduled_time)).all()
-        return jsonify([{
-            'id': c.id,
-            'lead_id': c.lead_id,
-            'lead_name': c.lead.name,
-            'scheduled_time': c.scheduled_time.isoformat(),
-            'notes': c.notes,
-            'is_notified': c.is_notified
-        } for c in contacts])
+        cursor = request.args.get('cursor', '')
+        
+        query = db.session.query(
+            *SCHEDULED_CONTACT_SERIALIZER.select(CONTACT_LIST_FIELDS)
+        ).join(Lead, Lead.id == ScheduledContact.lead_id).filter(ScheduledContact.user_id == current_user.id)
+        
+        # Optional window: ?from= and ?to= as YYYY-MM-DD or YYYY-MM-DDThh:mm
+        try:
+            window_start = _parse_window_bound(request.args.get('from'))
+            window_end = _parse_window_bound(request.args.get('to'), end=True)
+        except ValueError:
+            return jsonify({'error': 'Intervalo de datas inválido.'}), 400
+        if window_start:
+            query = query.filter(ScheduledContact.scheduled_time >= window_start)
+        if window_end:
+            query = query.filter(ScheduledContact.scheduled_time < window_end)
+        
+        # Pagination is opt-in, as in GET /api/leads
+        paginate = bool(cursor) or 'limit' in request.args
+        try:
+            limit = parse_limit(request.args.get('limit'))
+        except ValueError:
+            return jsonify({'error': 'Limite inválido.'}), 400
+        
+        if cursor:
+            try:
+                cursor_time, cursor_id = decode_cursor(cursor)
+            except ValueError:
+                return jsonify({'error': 'Cursor inválido.'}), 400
+            query = query.filter(or_(
+                ScheduledContact.scheduled_time > cursor_time,
+                and_(ScheduledContact.scheduled_time == cursor_time, ScheduledContact.id > cursor_id)
+            ))
+        
+        query = query.order_by(asc(ScheduledContact.scheduled_time), asc(ScheduledContact.id))
+        if paginate:
+            contacts = query.limit(limit + 1).all()
+            has_more = len(contacts) > limit
+            contacts = contacts[:limit]
+        else:
+            contacts = query.all()
+            has_more = False
+        
+        response = jsonify(SCHEDULED_CONTACT_SERIALIZER.serialize(contacts, CONTACT_LIST_FIELDS))
+        if has_more:
+            last = contacts[-1]
+            response.headers['X-Next-Cursor'] = encode_cursor(last.scheduled_time, last.id)
+        return response
     @app.route('/api/send-message', methods=['POST'])
     @login_required
     def send_message():
@@ -299,37 +475,25 @@ def register_routes(app):
         
         if not message:
             return jsonify({'error': 'Mensagem é obrigatória.'}), 400
-            
-        if is_bulk:
-            leads = Lead.query.filter_by(user_id=current_user.id).all()
-            for lead in leads:
-                # In a real app, this would send an email/SMS/WhatsApp
-                # For now, we just create a "sent" scheduled message record
-                msg = ScheduledMessage(
-                    message=message,
-                    scheduled_time=datetime.utcnow(),
-                    is_sent=True,
-                    user_id=current_user.id,
-                    lead_id=lead.id,
-                    is_bulk=True
-                )
-                db.session.add(msg)
-        else:
-            if not lead_id:
-                return jsonify({'error': 'Lead é obrigatório para envio individual.'}), 400
-                
-            msg = ScheduledMessage(
-                message=message,
-                scheduled_time=datetime.utcnow(),
-                is_sent=True,
-                user_id=current_user.id,
-                lead_id=lead_id,
-                is_bulk=False
-            )
-            db.session.add(msg)
-            
-        db.session.commit()
-        return jsonify({'message': 'Lembrete enviado com sucesso!'})
+        if not is_bulk and not lead_id:
+            return jsonify({'error': 'Lead é obrigatório para envio individual.'}), 400
+        if not is_bulk and not _owns_lead(lead_id):
+            return jsonify({'error': 'Lead não encontrado.'}), 404
+        
+        # Creating (and delivering) the messages runs in the background
+        job_id = enqueue_job('send_message', current_user.id, {
+            'lead_id': lead_id,
+            'message': message,
+            'is_bulk': bool(is_bulk),
+        })
+        return _job_accepted(job_id, 'Envio de mensagem iniciado.')
+
+    @app.route('/api/messages/export', methods=['GET'])
+    @login_required
+    def export_messages():
+        lead_id = request.args.get('lead_id', type=int)
+        fields, statement = message_export_query(current_user.id, lead_id)
+        return _export_response(fields, statement, 'mensagens')
 
     @app.route('/api/schedule-message', methods=['POST'])
     @login_required
@@ -351,33 +515,26 @@ def register_routes(app):
             except ValueError:
                 return jsonify({'error': 'Formato de data/hora inválido.'}), 400
                 
-        if is_bulk:
-            # For bulk scheduling, we might create one record per lead or handle differently
-            # Here we create one record per lead for simplicity
-            leads = Lead.query.filter_by(user_id=current_user.id).all()
-            for lead in leads:
-                msg = ScheduledMessage(
-                    message=message,
-                    scheduled_time=scheduled_time,
-                    is_sent=False,
-                    user_id=current_user.id,
-                    lead_id=lead.id,
-                    is_bulk=True
-                )
-                db.session.add(msg)
-        else:
-            if not lead_id:
-                return jsonify({'error': 'Lead é obrigatório para agendamento individual.'}), 400
-                
-            msg = ScheduledMessage(
-                message=message,
-                scheduled_time=scheduled_time,
-                is_sent=False,
-                user_id=current_user.id,
-                lead_id=lead_id,
-                is_bulk=False
-            )
-            db.session.add(msg)
-            
-        db.session.commit()
-        return jsonify({'message': 'Lembrete agendado com sucesso!'})
+        if not is_bulk and not lead_id:
+            return jsonify({'error': 'Lead é obrigatório para agendamento individual.'}), 400
+        if not is_bulk and not _owns_lead(lead_id):
+            return jsonify({'error': 'Lead não encontrado.'}), 404
+        
+        job_id = enqueue_job('schedule_message', current_user.id, {
+            'lead_id': lead_id,
+            'message': message,
+            'scheduled_time': scheduled_time.isoformat(),
+            'is_bulk': bool(is_bulk),
+        })
+        return _job_accepted(job_id, 'Agendamento de mensagem iniciado.')
+
+    @app.route('/api/jobs/<int:job_id>', methods=['GET'])
+    @login_required
+    def view_job(job_id):
+        job = Job.query.filter_by(id=job_id, user_id=current_user.id).first()
+        if job is None:
+            return jsonify({'error': 'Tarefa não encontrada.'}), 404
+        response = jsonify(job_to_dict(job))
+        # Progress changes while the job runs
+        response.headers['Cache-Control'] = 'no-store'
+        return response
@@ -0,0 +1,55 @@
+import pytest
+
+from app import create_app, db
+from migrations import run_migrations
+from models import User
+from routes import register_routes
+from utils import lead_stats, user_cache
+
+TEST_PASSWORD = 'test-password'
+
+
+def make_app(database_url):
+    """Build a fully wired app on database_url with its schema up to date."""
+    app = create_app()
+    app.config['TESTING'] = True
+    register_routes(app)
+    with app.app_context():
+        run_migrations(db.engine)
+    return app
+
+
+@pytest.fixture
+def database_url(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'crm.db'}"
+    monkeypatch.setenv('DATABASE_URL', url)
+    return url
+
+
+@pytest.fixture
+def app(database_url):
+    app = make_app(database_url)
+    yield app
+    # Process-wide caches would leak rows of this database into the next test
+    lead_stats._stats_cache.clear()
+    user_cache._user_cache.clear()
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def user(app):
+    with app.app_context():
+        user = User(username='tester', email='tester@example.com')
+        user.set_password(TEST_PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def client(app, user):
+    client = app.test_client()
+    response = client.post('/api/login', json={'username': 'tester', 'password': TEST_PASSWORD})
+    assert response.status_code == 200
+    return client
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, insert
+
+from models import Lead
+
+
+def _insert_lead(database_url, user_id, name, updated_at):
+    # A separate engine stands in for another gunicorn worker: nothing in
+    # this process hears about the write
+    engine = create_engine(database_url)
+    with engine.begin() as conn:
+        conn.execute(insert(Lead.__table__).values(
+            name=name, phone='+5511999990000', status='frio', user_id=user_id,
+            created_at=updated_at, updated_at=updated_at,
+        ))
+    engine.dispose()
+
+
+def test_dashboard_etag_never_covers_stale_cached_stats(client, user, database_url):
+    now = datetime.utcnow()
+    _insert_lead(database_url, user, 'Primeiro', now)
+
+    first = client.get('/api/dashboard')
+    assert first.status_code == 200
+    assert first.json['stats']['total'] == 1
+    assert client.get('/api/dashboard', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    # The stats of this process are now cached; another worker adds a lead
+    _insert_lead(database_url, user, 'Segundo', now + timedelta(seconds=1))
+
+    second = client.get('/api/dashboard', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert second.json['stats']['total'] == 2
+
+    revalidated = client.get('/api/dashboard', headers={'If-None-Match': second.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert client.get('/api/dashboard').json['stats']['total'] == 2
@@ -0,0 +1,27 @@
+import zlib
+
+from utils import export
+
+
+def _rows(consumed, count):
+    for i in range(count):
+        consumed.append(i)
+        yield (i, f'Lead {i}')
+
+
+def test_ndjson_sends_the_first_row_immediately():
+    consumed = []
+    chunks = export._ndjson_chunks(['id', 'name'], _rows(consumed, 1000))
+    assert next(chunks) == '{"id": 0, "name": "Lead 0"}\n'
+    assert consumed == [0]
+    assert ''.join(chunks).count('\n') == 999
+
+
+def test_gzip_flushes_the_first_chunk():
+    consumed = []
+    chunks = export.gzip_chunks(export._csv_chunks(['id', 'name'], _rows(consumed, 1000)))
+    decompressor = zlib.decompressobj(31)
+    assert decompressor.decompress(next(chunks)) == b'id,name\r\n'
+    assert consumed == []
+    body = decompressor.decompress(b''.join(chunks)) + decompressor.flush()
+    assert body.count(b'\r\n') == 1000
@@ -0,0 +1,59 @@
+import importlib
+
+from app import db
+from models import Job, Lead, ScheduledContact, ScheduledMessage, User
+from utils import jobs
+
+
+def test_job_executor_defaults_to_inline_on_vercel(monkeypatch):
+    monkeypatch.delenv('JOB_EXECUTOR', raising=False)
+    try:
+        monkeypatch.setenv('VERCEL', '1')
+        assert importlib.reload(jobs).JOB_EXECUTOR == 'inline'
+        monkeypatch.delenv('VERCEL')
+        assert importlib.reload(jobs).JOB_EXECUTOR == 'thread'
+    finally:
+        monkeypatch.undo()
+        importlib.reload(jobs)
+
+
+def test_bulk_send_job_reports_progress_and_result(app, client, user, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_EXECUTOR', 'inline')
+    with app.app_context():
+        db.session.add_all([Lead(name=f'Lead {i}', phone=f'1198888{i:04d}', user_id=user) for i in range(3)])
+        db.session.commit()
+
+    response = client.post('/api/send-message', json={'message': 'Olá {nome}', 'is_bulk': True})
+    assert response.status_code == 202
+
+    job = client.get(response.headers['Location']).json
+    assert job['status'] == 'done'
+    assert (job['processed'], job['total']) == (3, 3)
+    assert job['result'] == {'messages': 3, 'delivery': 'sent'}
+    with app.app_context():
+        assert ScheduledMessage.query.filter_by(user_id=user, is_bulk=True).count() == 3
+
+
+def test_messages_cannot_target_another_users_lead(app, client, user, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_EXECUTOR', 'inline')
+    with app.app_context():
+        other = User(username='other', email='other@example.com')
+        other.set_password('other-password')
+        db.session.add(other)
+        db.session.flush()
+        lead = Lead(name='Alheio', phone='11988880000', user_id=other.id)
+        db.session.add(lead)
+        db.session.commit()
+        lead_id = lead.id
+
+    for path, extra in (('/api/send-message', {}), ('/api/schedule-message', {'scheduled_time': '2030-01-01T10:00'}),
+                        ('/api/schedule-contact', {'scheduled_time': '2030-01-01T10:00'})):
+        response = client.post(path, json=dict({'lead_id': lead_id, 'message': 'Olá {nome}'}, **extra))
+        assert response.status_code == 404
+
+    # Jobs check the owner as well
+    with app.app_context():
+        job_id = jobs.enqueue_job('send_message', user, {'lead_id': lead_id, 'message': 'Olá', 'is_bulk': False})
+        assert db.session.get(Job, job_id).result == '{"messages": 0, "delivery": "sent"}'
+        assert ScheduledMessage.query.count() == 0
+        assert ScheduledContact.query.count() == 0
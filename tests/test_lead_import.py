@@ -0,0 +1,45 @@
+import io
+
+import pytest
+
+from app import db
+from models import Lead
+
+CSV_TEXT = 'nome;telefone;observações\nJosé Conceição;11988887777;Prefere manhã\n'
+
+
+def _import(client, data):
+    return client.post('/api/leads/import', data={'file': (io.BytesIO(data), 'leads.csv')},
+                       content_type='multipart/form-data')
+
+
+@pytest.mark.parametrize('encoding', ['utf-8', 'utf-8-sig', 'cp1252'])
+def test_csv_import_keeps_accents(app, client, user, encoding):
+    response = _import(client, CSV_TEXT.encode(encoding))
+    assert response.status_code == 200
+    assert response.json['imported'] == 1
+
+    with app.app_context():
+        lead = db.session.query(Lead).filter_by(user_id=user).one()
+        assert (lead.name, lead.notes) == ('José Conceição', 'Prefere manhã')
+
+
+def test_csv_import_detects_cp1252_after_the_first_chunk(app, client, user):
+    rows = ''.join(f'Lead {i};119{i:08d};\n' for i in range(3000))
+    data = (CSV_TEXT + rows + 'João;11977776666;\n').encode('cp1252')
+    response = _import(client, data)
+    assert response.status_code == 200
+    assert response.json['imported'] == 3002
+
+    with app.app_context():
+        names = {name for (name,) in db.session.query(Lead.name).filter(Lead.name.notlike('Lead %'))}
+        assert names == {'José Conceição', 'João'}
+        assert not db.session.query(Lead).filter(Lead.name.contains('�')).count()
+
+
+def test_csv_import_rejects_undecodable_bytes(app, client, user):
+    # 0x81 is valid in neither UTF-8 nor cp1252
+    response = _import(client, b'nome;telefone\nJos\x81;11988887777\n')
+    assert response.status_code == 400
+    with app.app_context():
+        assert not db.session.query(Lead).count()
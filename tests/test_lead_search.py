@@ -0,0 +1,27 @@
+import pytest
+
+
+@pytest.fixture
+def leads(client):
+    for name, phone in (('Ana Souza', '(11) 98888-7777'), ('Bruno Lima', '11977776666'), ('Carla', '12345')):
+        assert client.post('/api/leads', json={'name': name, 'phone': phone}).status_code == 200
+
+
+def _search(client, text):
+    return sorted(lead['name'] for lead in client.get('/api/leads', query_string={'search': text}).json)
+
+
+@pytest.mark.parametrize('text', ['988887777', '5511988887777', '+55 11 98888-7777', '(11) 98888-7777', '8888'])
+def test_phone_search_matches_any_part_of_the_number(client, leads, text):
+    assert _search(client, text) == ['Ana Souza']
+
+
+def test_phone_search(client, leads):
+    assert _search(client, '977776666') == ['Bruno Lima']
+    # Numbers that cannot be normalized are matched on the raw value
+    assert _search(client, '2345') == ['Carla']
+    assert _search(client, '7777') == ['Ana Souza', 'Bruno Lima']
+
+
+def test_text_search_still_uses_the_index(client, leads):
+    assert _search(client, 'souz') == ['Ana Souza']
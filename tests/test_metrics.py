@@ -0,0 +1,29 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from utils import metrics
+
+
+def test_metrics_require_login_without_a_token(app, client, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', '')
+    assert app.test_client().get('/api/metrics').status_code == 401
+    assert client.get('/api/metrics').status_code == 200
+
+
+def test_metrics_token(app, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', 'secret')
+    anonymous = app.test_client()
+    assert anonymous.get('/api/metrics').status_code == 401
+    assert anonymous.get('/api/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+
+def test_failed_statements_do_not_leak_timings(app):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            for _ in range(5):
+                with pytest.raises(OperationalError):
+                    conn.execute(text('SELECT * FROM missing_table'))
+            conn.execute(text('SELECT 1'))
+            assert conn.info.get('query_start') == []
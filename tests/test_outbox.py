@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from app import db
+from models import Lead, ScheduledMessage
+from utils import outbox
+from utils.scheduler import claim_outbox_messages
+
+
+def _queue_message(user):
+    lead = Lead(name='Ana', phone='11988880001', user_id=user)
+    db.session.add(lead)
+    db.session.flush()
+    message = ScheduledMessage(message='Olá {nome}', scheduled_time=datetime.utcnow(), lead_id=lead.id,
+                               user_id=user, delivery_status='queued', attempts=0)
+    db.session.add(message)
+    db.session.commit()
+    return message.id
+
+
+def test_stale_claim_cannot_send_after_the_message_is_claimed_again(app, user):
+    sent = []
+
+    def transport(phone, message):
+        sent.append((phone, message))
+        return True
+
+    with app.app_context():
+        message_id = _queue_message(user)
+        assert claim_outbox_messages(10) == [(message_id, 1)]
+
+        # The first claimer waits for a free page past the sending timeout
+        db.session.execute(update(ScheduledMessage).where(ScheduledMessage.id == message_id).values(
+            updated_at=datetime.utcnow() - timedelta(seconds=outbox.SENDING_TIMEOUT_SECONDS + 1)))
+        db.session.commit()
+        assert outbox.requeue_stale_messages() == 1
+        assert claim_outbox_messages(10) == [(message_id, 2)]
+
+        assert outbox.deliver_message(message_id, 1, transport) is None
+        assert outbox.deliver_message(message_id, 2, transport) == 'sent'
+        assert outbox.deliver_message(message_id, 2, transport) is None
+        assert sent == [('+5511988880001', 'Olá Ana')]
+
+
+def test_failed_attempts_retry_then_dead_letter(app, user, monkeypatch):
+    monkeypatch.setattr(outbox, 'OUTBOX_BACKOFF_SECONDS', 0)
+
+    with app.app_context():
+        message_id = _queue_message(user)
+        statuses = []
+        for attempt in (1, 2, 3):
+            assert claim_outbox_messages(10) == [(message_id, attempt)]
+            statuses.append(outbox.deliver_message(message_id, attempt, lambda phone, message: False, max_attempts=3))
+        assert statuses == ['queued', 'queued', 'failed']
+        message = db.session.get(ScheduledMessage, message_id)
+        assert (message.attempts, message.last_error) == (3, 'Transporte não confirmou o envio')
@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import event, insert
+
+from app import db
+from models import Lead, ScheduledContact
+
+
+@contextmanager
+def count_queries(app):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def _add_contacts(app, user_id, count):
+    now = datetime.utcnow()
+    with app.app_context():
+        lead_ids = db.session.execute(insert(Lead.__table__).returning(Lead.id), [{
+            'name': f'Lead {i}', 'phone': f'+55119{i:08d}', 'status': 'frio', 'user_id': user_id,
+            'created_at': now, 'updated_at': now,
+        } for i in range(count)]).scalars().all()
+        db.session.execute(insert(ScheduledContact.__table__), [{
+            'scheduled_time': now + timedelta(days=1, minutes=i), 'notes': 'Ligar', 'is_notified': False,
+            'user_id': user_id, 'lead_id': lead_id, 'created_at': now,
+        } for i, lead_id in enumerate(lead_ids)])
+        db.session.commit()
+
+
+def _queries_for(app, client, url):
+    # Warm the per-process caches (user loader, lead stats) first
+    assert client.get(url).status_code == 200
+    with count_queries(app) as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(statements), response.json
+
+
+def test_contact_lists_run_a_constant_number_of_queries(app, client, user):
+    _add_contacts(app, user, 3)
+    few = {url: _queries_for(app, client, url) for url in ('/api/scheduled-contacts', '/api/dashboard')}
+    assert len(few['/api/scheduled-contacts'][1]) == 3
+
+    _add_contacts(app, user, 297)
+    many = {url: _queries_for(app, client, url) for url in ('/api/scheduled-contacts', '/api/dashboard')}
+    assert len(many['/api/scheduled-contacts'][1]) == 300
+
+    for url in few:
+        assert many[url][0] == few[url][0], f'{url}: {few[url][0]} queries with 3 contacts, {many[url][0]} with 300'
@@ -0,0 +1,49 @@
+import pytest
+
+from utils.rate_limit import AdaptiveRateLimiter, TokenBucket
+
+
+def test_token_bucket_allows_a_burst_then_makes_callers_wait():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+
+
+def test_error_spike_halves_the_rate():
+    limiter = AdaptiveRateLimiter(rate=8, window=10, error_threshold=0.3)
+    for _ in range(3):
+        assert not limiter.record(True)
+    assert not limiter.record(False)
+    # 2 errors in 5 outcomes is over 30%
+    assert limiter.record(False)
+    assert limiter.rate == 4
+    assert limiter.backoffs == 1
+
+
+def test_backoff_stops_at_min_rate():
+    limiter = AdaptiveRateLimiter(rate=8, min_rate=2)
+    for _ in range(50):
+        limiter.record(False)
+    assert limiter.rate == 2
+    assert limiter.backoffs == 10
+
+
+def test_successes_recover_to_the_target_rate():
+    limiter = AdaptiveRateLimiter(rate=8, recovery_step=1)
+    for _ in range(5):
+        limiter.record(False)
+    assert limiter.rate == 4
+    for _ in range(3):
+        limiter.record(True)
+    assert limiter.rate == 7
+    for _ in range(10):
+        limiter.record(True)
+    assert limiter.rate == limiter.target_rate == 8
+
+
+def test_few_outcomes_do_not_trigger_a_backoff():
+    limiter = AdaptiveRateLimiter(rate=8)
+    for _ in range(4):
+        assert not limiter.record(False)
+    assert limiter.rate == 8
@@ -0,0 +1,61 @@
+import multiprocessing
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert
+
+from app import db
+from models import ScheduledMessage
+
+WORKERS = 6
+DUE_ROWS = 3000
+BATCH_SIZE = 100
+
+
+def _claim_worker(database_url, start, results):
+    # Runs in a fresh interpreter (spawn), like a separate gunicorn worker
+    os.environ['DATABASE_URL'] = database_url
+    from app import create_app
+    from utils.scheduler import claim_due_messages
+
+    app = create_app()
+    claimed = []
+    with app.app_context():
+        start.wait()
+        while True:
+            batch = claim_due_messages(batch_size=BATCH_SIZE)
+            if not batch:
+                break
+            claimed.extend(batch)
+    results.put(claimed)
+
+
+def test_concurrent_processes_claim_each_due_message_once(app, user, database_url):
+    past = datetime.utcnow() - timedelta(minutes=5)
+    with app.app_context():
+        db.session.execute(insert(ScheduledMessage.__table__), [{
+            'message': f'Mensagem {i}', 'scheduled_time': past, 'is_sent': False,
+            'delivery_status': 'queued', 'attempts': 0, 'user_id': user,
+        } for i in range(DUE_ROWS)])
+        db.session.commit()
+        due_ids = {message_id for (message_id,) in db.session.query(ScheduledMessage.id)}
+        db.engine.dispose()
+
+    context = multiprocessing.get_context('spawn')
+    start = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=_claim_worker, args=(database_url, start, results))
+                 for _ in range(WORKERS)]
+    for process in processes:
+        process.start()
+    start.set()
+    claimed = [results.get(timeout=120) for _ in processes]
+    for process in processes:
+        process.join(timeout=30)
+        assert process.exitcode == 0
+
+    all_claimed = [message_id for ids in claimed for message_id in ids]
+    assert len(all_claimed) == len(set(all_claimed)), 'a message was claimed by more than one process'
+    assert set(all_claimed) == due_ids
+    with app.app_context():
+        assert db.session.query(func.count(ScheduledMessage.id)).filter(
+            ScheduledMessage.is_sent == False).scalar() == 0
@@ -0,0 +1,36 @@
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, insert
+
+from app import db
+from models import ScheduledMessage
+from utils import scheduler as scheduler_module
+from utils.scheduler import DueTimeScheduler
+
+
+def test_event_scheduler_picks_up_rows_from_another_process(app, user, database_url, monkeypatch):
+    monkeypatch.setattr(scheduler_module, '_app', app)
+    scheduler = DueTimeScheduler(app, resync_interval=900, probe_interval=0.2)
+    scheduler.start()
+    try:
+        # A separate engine stands in for a web worker: notify_scheduled
+        # in that process cannot reach this scheduler
+        now = datetime.utcnow()
+        engine = create_engine(database_url)
+        with engine.begin() as conn:
+            message_id = conn.execute(insert(ScheduledMessage.__table__).values(
+                message='Olá', scheduled_time=now, is_sent=False, delivery_status='queued', attempts=0,
+                is_bulk=False, created_at=now, updated_at=now, user_id=user,
+            )).inserted_primary_key[0]
+        engine.dispose()
+
+        deadline = time.monotonic() + 5
+        sent = False
+        while not sent and time.monotonic() < deadline:
+            time.sleep(0.1)
+            with app.app_context():
+                sent = db.session.get(ScheduledMessage, message_id).is_sent
+        assert sent
+    finally:
+        scheduler.shutdown()
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from utils.serializers import LEAD_SERIALIZER, RowSerializer
+
+
+def test_row_functions_match_the_fields(app):
+    updated_at = datetime(2030, 1, 2, 3, 4, 5)
+    row = (7, 'Ana', updated_at, 99)
+    fields = ['id', 'name', 'updated_at']
+
+    assert RowSerializer(LEAD_SERIALIZER.columns, native_datetimes=True).compile(fields)(row) == {
+        'id': 7, 'name': 'Ana', 'updated_at': updated_at}
+    assert RowSerializer(LEAD_SERIALIZER.columns, native_datetimes=False).compile(fields)(row) == {
+        'id': 7, 'name': 'Ana', 'updated_at': '2030-01-02T03:04:05'}
+
+
+def test_repeated_fields_do_not_grow_the_cache(app, client):
+    serializer = RowSerializer(LEAD_SERIALIZER.columns)
+    for count in range(1, 40):
+        serializer.compile(serializer.normalize_fields(['id'] * count + ['name']))
+    assert len(serializer._compiled._data) == 1
+
+    assert client.post('/api/leads', json={'name': 'Ana', 'phone': '11988887777'}).status_code == 200
+    response = client.get('/api/leads', query_string={'fields': 'name,id,id,name'})
+    assert response.status_code == 200
+    assert [list(lead) for lead in response.json] == [['id', 'name']]
@@ -0,0 +1,129 @@
+import contextlib
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app import db
+from models import Lead, ScheduledMessage
+from utils import jobs, outbox, whatsapp_service
+
+WHATSAPP_ERROR = 'O número de telefone compartilhado por URL é inválido.'
+
+
+class StubElement:
+    def __init__(self, page, text=None):
+        self.page = page
+        self.text = text
+
+    async def text_content(self):
+        return self.text
+
+    async def click(self):
+        self.page.pool.delivered.append(self.page.query)
+
+
+class StubPage:
+    """Answers the selectors _deliver_on_page uses, without a browser."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.query = None
+
+    async def goto(self, url, **kwargs):
+        params = parse_qs(urlparse(url).query)
+        self.query = (params['phone'][0], params['text'][0])
+
+    async def query_selector(self, selector):
+        assert selector == 'div._9a59P'
+        if self.query[0] in self.pool.failing:
+            return StubElement(self, WHATSAPP_ERROR)
+        return None
+
+    async def wait_for_selector(self, selector, timeout=None):
+        return StubElement(self)
+
+
+class StubPool:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.delivered = []
+
+    async def ensure_size(self, size):
+        pass
+
+    @contextlib.asynccontextmanager
+    async def page(self):
+        yield StubPage(self), True
+
+
+@pytest.fixture
+def stub_pool(monkeypatch):
+    pool = StubPool()
+    monkeypatch.setattr(whatsapp_service, 'get_browser_pool', lambda: pool)
+    return pool
+
+
+def test_whatsapp_errors_halve_the_rate(stub_pool):
+    recipients = [{'phone': f'1198888{i:04d}', 'name': f'Lead {i}'} for i in range(6)]
+    stub_pool.failing = {f'551198888{i:04d}' for i in range(6)}
+    progress = []
+
+    results = whatsapp_service.send_bulk_messages_concurrent_sync(
+        recipients, 'Olá {nome}', tabs=2, rate_per_minute=6000, progress_callback=progress.append
+    )
+
+    assert progress[0]['rate_per_minute'] == 6000
+    assert progress[-1]['rate_per_minute'] == 3000
+    assert results['backoffs'] == 1
+    assert (results['success'], results['failed']) == (0, 6)
+    assert [entry['phone'] for entry in results['recipients']] == [r['phone'] for r in recipients]
+    assert all(entry['status'] == 'failed' and entry['reason'] == WHATSAPP_ERROR
+               for entry in results['recipients'])
+    assert stub_pool.delivered == []
+
+
+def test_results_are_reported_per_recipient(stub_pool):
+    recipients = [
+        {'phone': '11988880001', 'name': 'Ana'},
+        {'phone': '123', 'name': 'Sem número'},
+        {'phone': '11988880002', 'name': 'Bruno'},
+    ]
+    stub_pool.failing = {'5511988880002'}
+
+    results = whatsapp_service.send_bulk_messages_concurrent_sync(
+        recipients, 'Olá {nome}', tabs=3, rate_per_minute=6000
+    )
+
+    assert [(entry['name'], entry['status'], entry['reason']) for entry in results['recipients']] == [
+        ('Ana', 'sent', None),
+        ('Sem número', 'failed', whatsapp_service.INVALID_PHONE_REASON),
+        ('Bruno', 'failed', WHATSAPP_ERROR),
+    ]
+    assert stub_pool.delivered == [('5511988880001', 'Olá Ana')]
+    # An invalid number is bad data, not a sign of blocking
+    assert results['backoffs'] == 0
+
+
+def test_bulk_job_uses_the_multi_tab_sender(app, client, user, stub_pool, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_EXECUTOR', 'inline')
+    monkeypatch.setattr(outbox, 'MESSAGE_TRANSPORT', 'whatsapp')
+    # Only whether this process owns the outbox matters here
+    monkeypatch.setattr(outbox, '_dispatcher', object())
+    monkeypatch.setattr(whatsapp_service, 'BULK_RATE_PER_MINUTE', 6000)
+    with app.app_context():
+        db.session.add_all([Lead(name='Ana', phone='11988880001', user_id=user),
+                            Lead(name='Bruno', phone='11988880002', user_id=user)])
+        db.session.commit()
+    stub_pool.failing = {'5511988880002'}
+
+    response = client.post('/api/send-message', json={'message': 'Olá {nome}', 'is_bulk': True})
+    job = client.get(response.headers['Location']).json
+
+    assert job['status'] == 'done'
+    assert job['result'] == {'messages': 2, 'delivery': 'whatsapp_batch', 'statuses': {'sent': 1, 'queued': 1}}
+    assert stub_pool.delivered == [('5511988880001', 'Olá Ana')]
+    with app.app_context():
+        rows = {lead_name: (status, attempts, error) for lead_name, status, attempts, error in db.session.query(
+            Lead.name, ScheduledMessage.delivery_status, ScheduledMessage.attempts, ScheduledMessage.last_error
+        ).join(Lead, Lead.id == ScheduledMessage.lead_id)}
+    assert rows == {'Ana': ('sent', 1, None), 'Bruno': ('queued', 1, WHATSAPP_ERROR)}
@@ -0,0 +1,48 @@
+import multiprocessing
+
+import pytest
+
+from utils import outbox, whatsapp_service
+
+
+def _hold_profile(session_dir, claimed, release):
+    whatsapp_service.claim_session_dir(session_dir)
+    claimed.set()
+    release.wait(30)
+
+
+def test_second_process_cannot_claim_the_profile(tmp_path):
+    session_dir = str(tmp_path / 'sessions')
+    context = multiprocessing.get_context('spawn')
+    claimed, release = context.Event(), context.Event()
+    holder = context.Process(target=_hold_profile, args=(session_dir, claimed, release))
+    holder.start()
+    try:
+        assert claimed.wait(30)
+        with pytest.raises(RuntimeError, match='WHATSAPP_SESSION_DIR') as error:
+            whatsapp_service.claim_session_dir(session_dir)
+        assert f"pid {holder.pid}" in str(error.value)
+    finally:
+        release.set()
+        holder.join()
+
+    # Released when the owner exits; claiming again in the same process is a no-op
+    whatsapp_service.claim_session_dir(session_dir)
+    whatsapp_service.claim_session_dir(session_dir)
+
+
+def test_whatsapp_outbox_fails_at_startup_when_the_profile_is_taken(app, tmp_path, monkeypatch):
+    session_dir = str(tmp_path / 'sessions')
+    monkeypatch.setattr(whatsapp_service, 'SESSION_DIR', session_dir)
+    context = multiprocessing.get_context('spawn')
+    claimed, release = context.Event(), context.Event()
+    holder = context.Process(target=_hold_profile, args=(session_dir, claimed, release))
+    holder.start()
+    try:
+        assert claimed.wait(30)
+        with pytest.raises(RuntimeError, match='já está em uso'):
+            outbox.init_outbox(app, 'whatsapp')
+        assert outbox.get_dispatcher() is None
+    finally:
+        release.set()
+        holder.join()
@@ -0,0 +1,118 @@
+import logging
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger(__name__)
+
+# SQLite profile: WAL lets readers run while the scheduler writes, and
+# synchronous=NORMAL is durable in WAL mode except for the last commits
+# before a power loss
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Page cache per connection, in KiB
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", "65536"))
+
+# PostgreSQL profile
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "300"))
+# Pinging on every checkout costs a round-trip; pool_recycle already drops
+# connections before typical server-side idle timeouts
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "").lower() in ('1', 'true', 'yes', 'on')
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+
+def sqlite_pragmas():
+    """PRAGMA statements run on every new SQLite connection, in order."""
+    return [
+        f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        # Negative values are a size in KiB instead of a page count
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def engine_options(database_uri):
+    """
+    Engine options for the backend of a database URI.
+
+    Args:
+        database_uri (str): SQLALCHEMY_DATABASE_URI
+
+    Returns:
+        dict: Keyword arguments for create_engine / SQLALCHEMY_ENGINE_OPTIONS
+    """
+    backend = make_url(database_uri).get_backend_name()
+
+    if backend == 'sqlite':
+        # A local file never drops connections: no ping, no recycling.
+        # The driver-level timeout covers locks taken before the pragmas run.
+        return {'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000}}
+
+    if backend == 'postgresql':
+        options = {
+            'pool_size': DB_POOL_SIZE,
+            'max_overflow': DB_MAX_OVERFLOW,
+            'pool_timeout': DB_POOL_TIMEOUT,
+            'pool_recycle': DB_POOL_RECYCLE,
+            'pool_pre_ping': DB_POOL_PRE_PING,
+        }
+        if DB_STATEMENT_TIMEOUT_MS:
+            # Sent with the startup packet, so it costs no extra round-trip
+            options['connect_args'] = {'options': f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+        return options
+
+    return {'pool_recycle': DB_POOL_RECYCLE, 'pool_pre_ping': True}
+
+
+def maintenance_engine(engine):
+    """
+    Engine for long-running DDL, such as migrations, on the same database.
+
+    The app's PostgreSQL connections carry statement_timeout. A CREATE INDEX
+    CONCURRENTLY on a large table would hit it and leave an INVALID index,
+    which IF NOT EXISTS then skips on every later run. This engine turns the
+    timeout off and keeps no pool; the caller disposes it. Other backends
+    get the engine back unchanged.
+    """
+    if engine.dialect.name != 'postgresql':
+        return engine
+    return create_engine(engine.url, poolclass=NullPool, connect_args={'options': '-c statement_timeout=0'})
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def configure_engine(engine):
+    """Apply the SQLite pragmas to every new connection of a SQLite engine."""
+    if engine.dialect.name != 'sqlite':
+        return
+    if not event.contains(engine, 'connect', _set_sqlite_pragmas):
+        event.listen(engine, 'connect', _set_sqlite_pragmas)
+        logger.info(f"SQLite engine tuned: {', '.join(sqlite_pragmas())}")
+
+
+def init_engines(app, db):
+    """
+    Attach the backend-specific connection setup to the app's engines.
+
+    Flask-SQLAlchemy builds the engines in init_app but connects lazily,
+    so this opens no connection.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            configure_engine(engine)
@@ -0,0 +1,89 @@
+import hashlib
+from functools import wraps
+from flask import current_app, g, make_response, request
+from flask_login import current_user
+from sqlalchemy import case, func, select
+
+from app import db
+from models import Lead, ScheduledContact
+
+
+def latest_lead_update(user_id):
+    """Most recent Lead.updated_at of a user, read from ix_lead_user_updated."""
+    return db.session.query(func.max(Lead.updated_at)).filter(Lead.user_id == user_id).scalar()
+
+
+def lead_stamp(user_id):
+    """
+    Version of a user's leads: (count, max(updated_at)).
+
+    Inserts and updates move max(updated_at) forward and deletes lower the
+    count. Each aggregate is its own scalar subquery, so max() is answered
+    from the end of the index instead of scanning it with the count.
+    """
+    count = select(func.count()).select_from(Lead).where(Lead.user_id == user_id).scalar_subquery()
+    latest = select(func.max(Lead.updated_at)).where(Lead.user_id == user_id).scalar_subquery()
+    return db.session.execute(select(count, latest)).one()
+
+
+def contact_stamp(user_id):
+    """
+    Version of a user's scheduled contacts: (count, max(id), notified count).
+
+    Contact lists also show lead names, so callers combine it with
+    latest_lead_update.
+    """
+    return db.session.query(
+        func.count(ScheduledContact.id),
+        func.max(ScheduledContact.id),
+        func.sum(case((ScheduledContact.is_notified == True, 1), else_=0))
+    ).filter(ScheduledContact.user_id == user_id).one()
+
+
+def _make_etag(user_id, stamp):
+    raw = f"{user_id}|{request.full_path}|{tuple(stamp)!r}"
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def conditional_get(stamp_func, last_modified=None):
+    """
+    Answer GETs with a 304 when the client's ETag still matches.
+
+    The ETag hashes the user, the full path with query string and a stamp
+    derived from cheap aggregate queries, so an unchanged resource costs
+    only the stamp query: the view, its main query and the serialization
+    are skipped. The stamp is left in g.etag_stamp so the view can check
+    its own caches against the version the ETag describes.
+
+    Args:
+        stamp_func (callable): stamp_func(user_id) -> tuple that changes
+            whenever the response would
+        last_modified (callable): Optional last_modified(stamp) -> datetime
+            sent as Last-Modified
+
+    Returns:
+        callable: Decorator for views behind login_required
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            stamp = stamp_func(current_user.id)
+            g.etag_stamp = stamp
+            etag = _make_etag(current_user.id, stamp)
+            modified = last_modified(stamp) if last_modified else None
+
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if modified is not None:
+                response.last_modified = modified
+            # Let browsers cache the body but revalidate it on every use
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
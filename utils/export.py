@@ -0,0 +1,155 @@
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime
+from sqlalchemy import select
+
+from app import db
+from models import Lead, ScheduledMessage
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", "1000"))
+
+# Bytes of CSV/NDJSON buffered before a piece of the response is sent
+EXPORT_FLUSH_BYTES = 64 * 1024
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+LEAD_EXPORT_COLUMNS = {
+    'id': Lead.id,
+    'name': Lead.name,
+    'phone': Lead.phone,
+    'email': Lead.email,
+    'status': Lead.status,
+    'notes': Lead.notes,
+    'next_contact_date': Lead.next_contact_date,
+    'created_at': Lead.created_at,
+    'updated_at': Lead.updated_at,
+}
+
+MESSAGE_EXPORT_COLUMNS = {
+    'id': ScheduledMessage.id,
+    'lead_id': ScheduledMessage.lead_id,
+    'lead_name': Lead.name,
+    'lead_phone': Lead.phone,
+    'message': ScheduledMessage.message,
+    'scheduled_time': ScheduledMessage.scheduled_time,
+    'is_bulk': ScheduledMessage.is_bulk,
+    'delivery_status': ScheduledMessage.delivery_status,
+    'attempts': ScheduledMessage.attempts,
+    'sent_at': ScheduledMessage.sent_at,
+    'last_error': ScheduledMessage.last_error,
+    'created_at': ScheduledMessage.created_at,
+}
+
+
+def lead_export_query(user_id, status=None):
+    statement = select(*LEAD_EXPORT_COLUMNS.values()).where(Lead.user_id == user_id)
+    if status:
+        statement = statement.where(Lead.status == status)
+    return list(LEAD_EXPORT_COLUMNS), statement.order_by(Lead.id)
+
+
+def message_export_query(user_id, lead_id=None):
+    statement = select(*MESSAGE_EXPORT_COLUMNS.values()).outerjoin(
+        Lead, Lead.id == ScheduledMessage.lead_id
+    ).where(ScheduledMessage.user_id == user_id)
+    if lead_id:
+        statement = statement.where(ScheduledMessage.lead_id == lead_id)
+    return list(MESSAGE_EXPORT_COLUMNS), statement.order_by(ScheduledMessage.id)
+
+
+def _iter_result(statement):
+    # stream_results asks the driver for a server-side cursor (named cursor on
+    # PostgreSQL) and yield_per fetches it in batches instead of all at once
+    result = db.session.execute(
+        statement.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_SIZE)
+    )
+    try:
+        yield from result
+    finally:
+        result.close()
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_chunks(fields, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    # The header goes out before the query runs, so the first byte is immediate
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    for row in rows:
+        writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+        if buffer.tell() >= EXPORT_FLUSH_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(fields, rows):
+    pending = []
+    size = 0
+    first = True
+    for row in rows:
+        line = json.dumps({field: _json_value(value) for field, value in zip(fields, row)},
+                          ensure_ascii=False) + '\n'
+        pending.append(line)
+        size += len(line)
+        # NDJSON has no header: the first row goes out on its own, as soon
+        # as the query returns it
+        if first or size >= EXPORT_FLUSH_BYTES:
+            first = False
+            yield ''.join(pending)
+            pending = []
+            size = 0
+    yield ''.join(pending)
+
+
+def gzip_chunks(chunks):
+    """Compress a stream of text chunks into a gzip stream, piece by piece."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    first = True
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if first:
+            # zlib buffers small inputs; push the first chunk out so gzip
+            # does not delay the first byte
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            first = False
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_rows(fields, statement, fmt='csv'):
+    """
+    Generate the export of a query as CSV or NDJSON text chunks.
+
+    Rows are read through a server-side cursor and written out as they
+    arrive, so memory use does not depend on how many rows there are.
+
+    Args:
+        fields (list): Column names, in the order of the selected columns
+        statement: SQLAlchemy select to export
+        fmt (str): 'csv' or 'ndjson'
+
+    Returns:
+        iterator: Text chunks of the response body
+    """
+    if fmt == 'ndjson':
+        return _ndjson_chunks(fields, _iter_result(statement))
+    return _csv_chunks(fields, _iter_result(statement))
@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import insert, update
+
+from models import Job, Lead, ScheduledMessage
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# 'thread' runs jobs on a background pool; 'inline' runs them inside the
+# request, for platforms that freeze the process after the response and
+# for benchmarks. Vercel (vercel.json) sets VERCEL in its functions.
+JOB_EXECUTOR = os.environ.get("JOB_EXECUTOR", "inline" if os.environ.get("VERCEL") else "thread")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+# Rows inserted per statement, and per progress update, by the message jobs
+JOB_CHUNK_SIZE = int(os.environ.get("JOB_CHUNK_SIZE", "1000"))
+# Jobs left 'running' longer than this by a dead process are failed
+JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", "900"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _report_progress(job_id, processed, total=None):
+    values = {'processed': processed}
+    if total is not None:
+        values['total'] = total
+    db.session.execute(update(Job).where(Job.id == job_id).values(values))
+    db.session.commit()
+
+
+def _insert_messages(job_id, user_id, payload, scheduled_time, delivery_status):
+    """
+    Insert one ScheduledMessage per target lead in chunks, reporting progress.
+
+    Args:
+        delivery_status (str): 'sent', 'queued', or 'sending' for messages
+            this process delivers itself
+
+    Returns:
+        list: IDs of the messages created
+    """
+    if payload.get('is_bulk'):
+        lead_ids = [lead_id for (lead_id,) in db.session.query(Lead.id).filter(
+            Lead.user_id == user_id).order_by(Lead.id)]
+    else:
+        # The route checks the owner too; a job must never reach another user's lead
+        lead_ids = [lead_id for (lead_id,) in db.session.query(Lead.id).filter(
+            Lead.id == payload['lead_id'], Lead.user_id == user_id)]
+    _report_progress(job_id, 0, len(lead_ids))
+
+    now = datetime.utcnow()
+    sent = delivery_status == 'sent'
+    base = {
+        'message': payload['message'],
+        'scheduled_time': scheduled_time,
+        'is_sent': sent,
+        'delivery_status': delivery_status,
+        # Rows this process delivers itself are claimed as their first attempt
+        'attempts': 1 if delivery_status == 'sending' else 0,
+        'sent_at': now if sent else None,
+        'is_bulk': bool(payload.get('is_bulk')),
+        'created_at': now,
+        'updated_at': now,
+        'user_id': user_id,
+    }
+    table = ScheduledMessage.__table__
+    message_ids = []
+    for start in range(0, len(lead_ids), JOB_CHUNK_SIZE):
+        chunk = lead_ids[start:start + JOB_CHUNK_SIZE]
+        message_ids.extend(db.session.execute(
+            insert(table).returning(table.c.id), [dict(base, lead_id=lead_id) for lead_id in chunk]
+        ).scalars())
+        db.session.commit()
+        _report_progress(job_id, start + len(chunk))
+    return message_ids
+
+
+def _send_message_job(job_id, user_id, payload):
+    """
+    Record a message sent now to one lead or to every lead of the user.
+
+    With an outbox transport configured the messages are queued for
+    immediate delivery; otherwise they are only marked as sent, as before.
+    The outbox may run in another process (worker.py), so the transport
+    setting decides, not whether this process has a dispatcher. Bulk sends
+    in the process that owns the WhatsApp Web browser go out through its
+    multi-tab sender instead of one pool page per message.
+    """
+    from utils.outbox import MESSAGE_TRANSPORT, deliver_whatsapp_batch, get_dispatcher
+    from utils.scheduler import notify_scheduled
+
+    now = datetime.utcnow()
+    dispatcher = get_dispatcher()
+    if not MESSAGE_TRANSPORT:
+        message_ids = _insert_messages(job_id, user_id, payload, now, 'sent')
+        return {'messages': len(message_ids), 'delivery': 'sent'}
+
+    if payload.get('is_bulk') and MESSAGE_TRANSPORT == 'whatsapp' and dispatcher is not None:
+        message_ids = _insert_messages(job_id, user_id, payload, now, 'sending')
+        counts = deliver_whatsapp_batch(message_ids)
+        return {'messages': len(message_ids), 'delivery': 'whatsapp_batch', 'statuses': counts}
+
+    message_ids = _insert_messages(job_id, user_id, payload, now, 'queued')
+    if dispatcher is not None:
+        dispatcher.drain()
+    else:
+        notify_scheduled('messages', now)
+    return {'messages': len(message_ids), 'delivery': 'queued'}
+
+
+def _schedule_message_job(job_id, user_id, payload):
+    from utils.scheduler import notify_scheduled
+
+    scheduled_time = datetime.fromisoformat(payload['scheduled_time'])
+    message_ids = _insert_messages(job_id, user_id, payload, scheduled_time, 'queued')
+    notify_scheduled('messages', scheduled_time)
+    return {'messages': len(message_ids), 'scheduled_time': payload['scheduled_time']}
+
+
+JOB_HANDLERS = {
+    'send_message': _send_message_job,
+    'schedule_message': _schedule_message_job,
+}
+
+
+def register_job_handler(kind, handler):
+    """
+    Make a job kind available to enqueue_job.
+
+    Args:
+        kind (str): Value stored in Job.kind
+        handler (callable): handler(job_id, user_id, payload) returning a
+            JSON-serializable result; raising marks the job as failed
+    """
+    JOB_HANDLERS[kind] = handler
+
+
+def run_job(job_id):
+    """
+    Claim a queued job and run its handler.
+
+    The claim is a conditional UPDATE, so a job resubmitted after a restart
+    still runs only once.
+
+    Returns:
+        str: The final status, or None if the job was not queued
+    """
+    claimed = db.session.execute(
+        update(Job).where(Job.id == job_id, Job.status == 'queued').values(
+            status='running', started_at=datetime.utcnow()),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return None
+
+    kind, user_id, payload = db.session.query(Job.kind, Job.user_id, Job.payload).filter(Job.id == job_id).one()
+    try:
+        result = JOB_HANDLERS[kind](job_id, user_id, json.loads(payload))
+        values = {'status': 'done', 'result': json.dumps(result)}
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Job {job_id} ({kind}) failed: {str(e)}")
+        values = {'status': 'failed', 'error': str(e)}
+
+    values['finished_at'] = datetime.utcnow()
+    db.session.execute(update(Job).where(Job.id == job_id).values(values))
+    db.session.commit()
+    return values['status']
+
+
+def _run_in_context(app, job_id):
+    try:
+        with app.app_context():
+            run_job(job_id)
+    except Exception as e:
+        logger.error(f"Error running job {job_id}: {str(e)}")
+
+
+def _get_executor(app):
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+                resume_jobs(app)
+    return _executor
+
+
+def resume_jobs(app):
+    """
+    Fail jobs whose process died while running them and resubmit queued
+    jobs that were never started. Runs once, when the pool is created.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+    with app.app_context():
+        stale = db.session.execute(
+            update(Job).where(Job.status == 'running', Job.started_at < cutoff).values(
+                status='failed', error='Tarefa interrompida', finished_at=datetime.utcnow()),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        db.session.commit()
+        if stale:
+            logger.warning(f"{stale} interrupted jobs marked as failed")
+        queued = [job_id for (job_id,) in db.session.query(Job.id).filter(Job.status == 'queued').order_by(Job.id)]
+    for job_id in queued:
+        _executor.submit(_run_in_context, app, job_id)
+
+
+def enqueue_job(kind, user_id, payload):
+    """
+    Store a job and hand it to the executor.
+
+    Args:
+        kind (str): Key of JOB_HANDLERS
+        user_id (int): Owner of the job
+        payload (dict): JSON-serializable arguments for the handler
+
+    Returns:
+        int: ID of the new job
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    job = Job(kind=kind, status='queued', payload=json.dumps(payload), processed=0, user_id=user_id)
+    db.session.add(job)
+    db.session.commit()
+    job_id = job.id
+
+    if JOB_EXECUTOR == 'inline':
+        run_job(job_id)
+    else:
+        app = current_app._get_current_object()
+        _get_executor(app).submit(_run_in_context, app, job_id)
+    return job_id
+
+
+def job_to_dict(job):
+    def iso(value):
+        return value.isoformat() if value else None
+
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'total': job.total,
+        'processed': job.processed,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'created_at': iso(job.created_at),
+        'started_at': iso(job.started_at),
+        'finished_at': iso(job.finished_at),
+    }
+
+
+def shutdown_jobs(wait=True):
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
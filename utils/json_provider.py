@@ -0,0 +1,49 @@
+import logging
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    JSON provider that encodes with orjson.
+
+    orjson writes datetimes as ISO 8601 natively and produces bytes, which
+    the response is built from directly. Anything orjson does not know is
+    handed to Flask's default conversion (Decimal, UUID, dataclasses...).
+    """
+
+    def _options(self):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        option = self._options()
+        if self.compact is False or (self.compact is None and self._app.debug):
+            option |= orjson.OPT_INDENT_2
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=option) + b'\n',
+            mimetype=self.mimetype
+        )
+
+
+def init_json_provider(app):
+    """Use orjson for jsonify and request.get_json when it is installed."""
+    if orjson is None:
+        logger.info("orjson not installed, using the default JSON provider")
+        return
+    app.json = OrjsonProvider(app)
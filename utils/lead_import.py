@@ -0,0 +1,253 @@
+import codecs
+import csv
+import io
+import logging
+import os
+import unicodedata
+from sqlalchemy import insert, select
+
+from app import db
+from models import Lead
+from utils.lead_stats import LEAD_STATUSES, invalidate_lead_stats
+from utils.phone import to_e164
+
+logger = logging.getLogger(__name__)
+
+# Rows inserted per executemany / commit
+IMPORT_CHUNK_SIZE = int(os.environ.get("LEAD_IMPORT_CHUNK_SIZE", "2000"))
+
+# Bytes read at a time while checking a CSV's encoding
+ENCODING_SCAN_SIZE = 64 * 1024
+
+# Rejected rows reported back in detail; the rest are only counted
+MAX_REPORTED_REJECTS = 1000
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx')
+
+# Accepted spellings of each column header, after _normalize_header
+HEADER_ALIASES = {
+    'name': ('name', 'nome', 'nome completo', 'cliente'),
+    'phone': ('phone', 'telefone', 'celular', 'whatsapp', 'fone', 'numero'),
+    'email': ('email', 'e-mail'),
+    'notes': ('notes', 'observacoes', 'observacao', 'obs', 'notas'),
+    'status': ('status',),
+}
+
+_FIELD_LENGTHS = {
+    'name': Lead.__table__.c.name.type.length,
+    'phone': Lead.__table__.c.phone.type.length,
+    'email': Lead.__table__.c.email.type.length,
+}
+
+
+def _normalize_header(value):
+    value = unicodedata.normalize('NFKD', str(value or '')).encode('ascii', 'ignore').decode()
+    return value.strip().lower()
+
+
+def _map_header(header):
+    """
+    Map each column position to a Lead field.
+
+    Returns:
+        dict: {field: column index} for the recognized columns
+    """
+    aliases = {alias: field for field, names in HEADER_ALIASES.items() for alias in names}
+    mapping = {}
+    for index, value in enumerate(header):
+        field = aliases.get(_normalize_header(value))
+        if field and field not in mapping:
+            mapping[field] = index
+    return mapping
+
+
+def _cell_to_str(value):
+    if value is None:
+        return ''
+    # Spreadsheets often store phone numbers as numbers (11988887777.0)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _detect_csv_encoding(stream):
+    """
+    Pick the encoding of an uploaded CSV and rewind the stream.
+
+    Excel on Windows saves "CSV" as cp1252, so a file that is not valid
+    UTF-8 anywhere is read as cp1252 instead of having its accents replaced
+    with U+FFFD. The whole file is checked, in chunks, so a bad byte past
+    the first rows cannot fail the import after some chunks were committed.
+
+    Returns:
+        str: 'utf-8-sig' or 'cp1252'
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    encoding = 'utf-8-sig'
+    try:
+        while True:
+            data = stream.read(ENCODING_SCAN_SIZE)
+            decoder.decode(data, final=not data)
+            if not data:
+                break
+    except UnicodeDecodeError:
+        encoding = 'cp1252'
+    stream.seek(0)
+    return encoding
+
+
+def _iter_csv_rows(stream):
+    encoding = _detect_csv_encoding(stream)
+    # Strict: bytes cp1252 does not define either fail the import
+    text = io.TextIOWrapper(stream, encoding=encoding, newline='')
+    sample = text.read(4096)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    # Only the sample is kept in memory; the rest is read line by line
+    yield from csv.reader(_chain_sample(sample, text), dialect)
+
+
+def _chain_sample(sample, text):
+    lines = sample.splitlines(keepends=True)
+    if lines and not lines[-1].endswith(('\n', '\r')):
+        lines[-1] += text.readline()
+    yield from lines
+    yield from text
+
+
+def _iter_xlsx_rows(stream):
+    import openpyxl
+
+    # read_only parses the sheet XML incrementally instead of building every cell
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_rows(stream, filename):
+    """
+    Read an uploaded CSV or XLSX file row by row.
+
+    Args:
+        stream: Binary, seekable file object
+        filename (str): Original file name, used to pick the format
+
+    Returns:
+        iterator: One list of raw cell values per row, header included
+    """
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.xlsx':
+        return _iter_xlsx_rows(stream)
+    if extension == '.csv':
+        return _iter_csv_rows(stream)
+    raise ValueError(f"Unsupported file type: {extension}")
+
+
+def _existing_phones(user_id, phones):
+    """The given canonical phones that the user's leads already use."""
+    if not phones:
+        return set()
+    return set(db.session.execute(
+        select(Lead.phone_e164).where(Lead.user_id == user_id, Lead.phone_e164.in_(phones))
+    ).scalars())
+
+
+def import_leads(rows, user_id, chunk_size=None):
+    """
+    Insert leads from an iterator of rows, one chunk at a time.
+
+    The first row is the header. Phones are normalized to E.164 and rows
+    whose phone is invalid, repeated in the file or already used by one of
+    the user's leads are rejected. Existing phones are looked up once per
+    chunk through the (user_id, phone_e164) index, and each chunk is
+    inserted with a single executemany and committed.
+
+    Args:
+        rows (iterator): Raw rows as returned by iter_rows
+        user_id (int): Owner of the imported leads
+        chunk_size (int): Rows per insert (default IMPORT_CHUNK_SIZE)
+
+    Yields:
+        dict: Progress after each chunk ('processed', 'imported', 'rejected'),
+        and a final summary with 'done' set and the rejected rows listed
+    """
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    summary = {'processed': 0, 'imported': 0, 'rejected': 0, 'rejects': [], 'done': False}
+
+    rows = iter(rows)
+    mapping = _map_header(next(rows, None) or [])
+    if 'name' not in mapping or 'phone' not in mapping:
+        summary.update(done=True, error='Colunas obrigatórias ausentes: nome e telefone')
+        yield summary
+        return
+
+    seen_phones = set()
+
+    def reject(line, reason):
+        summary['rejected'] += 1
+        if len(summary['rejects']) < MAX_REPORTED_REJECTS:
+            summary['rejects'].append({'row': line, 'reason': reason})
+
+    def flush(chunk):
+        existing = _existing_phones(user_id, [values['phone_e164'] for _, values in chunk])
+        new_rows = []
+        for line, values in chunk:
+            if values['phone_e164'] in existing:
+                reject(line, 'Telefone duplicado')
+            else:
+                new_rows.append(values)
+        if new_rows:
+            db.session.execute(insert(Lead.__table__), new_rows)
+            summary['imported'] += len(new_rows)
+        db.session.commit()
+        return {key: summary[key] for key in ('processed', 'imported', 'rejected')}
+
+    chunk = []
+    # Line 1 is the header
+    for line, row in enumerate(rows, start=2):
+        values = {field: _cell_to_str(row[index]) if index < len(row) else ''
+                  for field, index in mapping.items()}
+        if not any(values.values()):
+            continue
+        summary['processed'] += 1
+
+        phone = to_e164(values['phone'])
+        status = values.get('status', '').lower() or 'frio'
+        too_long = [field for field, length in _FIELD_LENGTHS.items() if len(values.get(field, '')) > length]
+        if not values['name']:
+            reject(line, 'Nome ausente')
+        elif not phone:
+            reject(line, 'Telefone inválido')
+        elif phone in seen_phones:
+            reject(line, 'Telefone duplicado')
+        elif status not in LEAD_STATUSES:
+            reject(line, f"Status inválido: {status}")
+        elif too_long:
+            reject(line, f"Campo muito longo: {', '.join(too_long)}")
+        else:
+            seen_phones.add(phone)
+            chunk.append((line, {
+                'name': values['name'],
+                'phone': values['phone'],
+                'phone_e164': phone,
+                'email': values.get('email', ''),
+                'notes': values.get('notes', ''),
+                'status': status,
+                'user_id': user_id,
+            }))
+
+        if len(chunk) >= chunk_size:
+            yield flush(chunk)
+            chunk = []
+
+    flush(chunk)
+    if summary['imported']:
+        invalidate_lead_stats(user_id)
+    logger.info(f"Lead import for user {user_id}: {summary['imported']} imported, {summary['rejected']} rejected")
+
+    summary['done'] = True
+    yield summary
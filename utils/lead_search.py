@@ -0,0 +1,212 @@
+import logging
+import re
+from sqlalchemy import Float, Integer, desc, func, or_, text
+
+from app import db
+from models import Lead
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'lead_fts'
+
+# Cached result of get_search_backend: 'fts5' (SQLite), 'trigram'
+# (PostgreSQL + pg_trgm) or 'like' when neither is available
+search_backend = None
+
+# Phone digits are indexed next to the raw value so "11988887777" matches
+# a lead stored as "(11) 98888-7777"
+_PHONE_DIGITS_SQL = (
+    "replace(replace(replace(replace(replace(replace("
+    "{col}, ' ', ''), '-', ''), '(', ''), ')', ''), '+', ''), '.', '')"
+)
+
+_SQLITE_SETUP = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, phone, email,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS lead_fts_ai AFTER INSERT ON lead BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, phone, email)
+        VALUES (new.id, new.name,
+                new.phone || ' ' || {_PHONE_DIGITS_SQL.format(col='new.phone')},
+                coalesce(new.email, ''));
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS lead_fts_ad AFTER DELETE ON lead BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS lead_fts_au AFTER UPDATE OF name, phone, email ON lead BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, name, phone, email)
+        VALUES (new.id, new.name,
+                new.phone || ' ' || {_PHONE_DIGITS_SQL.format(col='new.phone')},
+                coalesce(new.email, ''));
+    END""",
+]
+
+_SQLITE_REBUILD = f"""
+    INSERT INTO {FTS_TABLE}(rowid, name, phone, email)
+    SELECT id, name, phone || ' ' || {_PHONE_DIGITS_SQL.format(col='phone')}, coalesce(email, '')
+    FROM lead
+"""
+
+# Queries made only of digits and phone punctuation, e.g. "+55 11 98888-7777"
+_PHONE_QUERY = re.compile(r'[\d\s()+.\-]*\d[\d\s()+.\-]*')
+
+_POSTGRES_SETUP = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_lead_name_trgm ON lead USING gin (name gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_lead_phone_trgm ON lead USING gin (phone gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_lead_email_trgm ON lead USING gin (email gin_trgm_ops)",
+]
+
+
+def _sqlite_has_fts5(conn):
+    options = conn.execute(text("PRAGMA compile_options")).scalars().all()
+    return 'ENABLE_FTS5' in options
+
+
+def create_search_index(engine):
+    """
+    Create the lead search index for the current database backend.
+
+    On SQLite this creates an FTS5 table kept in sync with the lead table by
+    triggers, so every write path (routes, imports, raw SQL) updates it.
+    On PostgreSQL it creates pg_trgm GIN indexes, which the database
+    maintains itself. Safe to run more than once.
+    """
+    global search_backend
+
+    search_backend = None
+    if engine.dialect.name == 'sqlite':
+        with engine.begin() as conn:
+            if not _sqlite_has_fts5(conn):
+                logger.warning("SQLite has no FTS5 support, lead search will use LIKE")
+                return
+            is_new = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+            ), {'name': FTS_TABLE}).first() is None
+            for statement in _SQLITE_SETUP:
+                conn.execute(text(statement))
+            if is_new:
+                conn.execute(text(_SQLITE_REBUILD))
+    elif engine.dialect.name == 'postgresql':
+        # CONCURRENTLY cannot run inside a transaction block
+        # A failure propagates so the migration stays pending and is retried
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            for statement in _POSTGRES_SETUP:
+                conn.execute(text(statement))
+
+
+def create_phone_search_index(engine):
+    """
+    Index phone_e164 for the substring matches of phone searches.
+
+    On PostgreSQL this is a pg_trgm GIN index, which LIKE '%...%' can use.
+    SQLite answers them from the (user_id, phone_e164) index without
+    reading the table.
+    """
+    if engine.dialect.name != 'postgresql':
+        return
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_lead_phone_e164_trgm "
+            "ON lead USING gin (phone_e164 gin_trgm_ops)"
+        ))
+
+
+def get_search_backend(engine):
+    """
+    Return which search strategy the database supports.
+
+    The answer is looked up once per process from the schema created by
+    create_search_index.
+
+    Returns:
+        str: 'fts5', 'trigram' or 'like'
+    """
+    global search_backend
+
+    if search_backend is not None:
+        return search_backend
+
+    backend = 'like'
+    try:
+        with engine.connect() as conn:
+            if engine.dialect.name == 'sqlite':
+                if conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+                ), {'name': FTS_TABLE}).first():
+                    backend = 'fts5'
+            elif engine.dialect.name == 'postgresql':
+                if conn.execute(text(
+                    "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+                )).first():
+                    backend = 'trigram'
+    except Exception as e:
+        logger.error(f"Error detecting lead search backend: {str(e)}")
+
+    search_backend = backend
+    return backend
+
+
+def build_fts_query(search_text):
+    """
+    Turn free text into an FTS5 query where every word is a prefix match.
+
+    Returns:
+        str: The MATCH expression, or an empty string if there are no words
+    """
+    tokens = re.findall(r'\w+', search_text)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def apply_lead_search(query, search_text):
+    """
+    Filter a Lead query by free text and order it by relevance.
+
+    Args:
+        query: A query selecting from the lead table
+        search_text (str): Raw text typed by the user
+
+    Queries that look like a phone number match the digits anywhere in the
+    canonical phone_e164, so "988887777", "5511988887777" and
+    "+55 11 98888-7777" all find a lead stored as "(11) 98888-7777". The raw
+    phone is matched too, for leads whose number could not be normalized.
+
+    Returns:
+        The filtered and ranked query
+    """
+    if _PHONE_QUERY.fullmatch(search_text.strip()):
+        digits = ''.join(c for c in search_text if c.isdigit())
+        return query.filter(or_(
+            Lead.phone_e164.like(f'%{digits}%'),
+            Lead.phone.ilike(f'%{search_text.strip()}%')
+        )).order_by(desc(Lead.updated_at))
+
+    backend = get_search_backend(db.engine)
+    if backend == 'fts5':
+        match = build_fts_query(search_text)
+        if not match:
+            return query
+        ranked = text(
+            f"SELECT rowid AS lead_id, rank AS search_rank FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH :match"
+        ).bindparams(match=match).columns(lead_id=Integer, search_rank=Float).subquery('lead_search')
+        return query.join(ranked, ranked.c.lead_id == Lead.id).order_by(
+            ranked.c.search_rank, desc(Lead.updated_at)
+        )
+
+    pattern = f'%{search_text}%'
+    query = query.filter(
+        (Lead.name.ilike(pattern)) |
+        (Lead.phone.ilike(pattern)) |
+        (Lead.email.ilike(pattern))
+    )
+    if backend == 'trigram':
+        score = func.greatest(
+            func.similarity(Lead.name, search_text),
+            func.similarity(Lead.phone, search_text),
+            func.similarity(func.coalesce(Lead.email, ''), search_text),
+        )
+        return query.order_by(desc(score), desc(Lead.updated_at))
+    return query.order_by(desc(Lead.updated_at))
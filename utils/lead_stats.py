@@ -0,0 +1,63 @@
+import os
+from sqlalchemy import func
+
+from app import db
+from models import Lead
+from utils.cache import TTLCache
+
+LEAD_STATUSES = ('frio', 'quente', 'fervendo', 'cliente')
+
+# Lead writes in this process drop the cached stats; the TTL only matters
+# for writes made by other workers. Patching the cached counts in place
+# would race with a concurrent read that already saw the write.
+STATS_TTL = int(os.environ.get("DASHBOARD_STATS_TTL", "60"))
+
+_stats_cache = TTLCache(maxsize=4096, ttl=STATS_TTL)
+
+
+def _empty_stats():
+    stats = {'total': 0}
+    stats.update({status: 0 for status in LEAD_STATUSES})
+    return stats
+
+
+def get_lead_stats(user_id, version=None):
+    """
+    Return the lead counts per status for a user.
+
+    Counts are computed with a single GROUP BY status query and cached
+    per user until a lead write invalidates them.
+
+    Args:
+        user_id (int): Owner of the leads
+        version: Optional lead version read from the database (lead_stamp).
+            A cached entry stored under another version is recomputed, so
+            writes made by other workers are never served under a newer
+            ETag.
+
+    Returns:
+        dict: 'total' plus one count per status
+    """
+    cached = _stats_cache.get(user_id)
+    if cached is not None:
+        cached_version, stats = cached
+        if version is None or cached_version == version:
+            return dict(stats)
+
+    rows = db.session.query(Lead.status, func.count(Lead.id)).filter(
+        Lead.user_id == user_id
+    ).group_by(Lead.status).all()
+
+    stats = _empty_stats()
+    for status, count in rows:
+        stats['total'] += count
+        if status in stats:
+            stats[status] = count
+
+    _stats_cache.set(user_id, (version, stats))
+    return dict(stats)
+
+
+def invalidate_lead_stats(user_id):
+    """Drop the cached stats of a user so the next read recomputes them."""
+    _stats_cache.pop(user_id)
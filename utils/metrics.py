@@ -0,0 +1,234 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, current_app, g, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Bearer token for GET /api/metrics scrapers; without one only logged-in
+# users can read it
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+SEND_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        samples = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((f'{self.name}_bucket', _format_labels(self.labels, key, ('le', bound)), cumulative))
+            samples.append((f'{self.name}_bucket', _format_labels(self.labels, key, ('le', '+Inf')), count))
+            samples.append((f'{self.name}_sum', _format_labels(self.labels, key), total))
+            samples.append((f'{self.name}_count', _format_labels(self.labels, key), count))
+        return samples
+
+
+class CallbackGauge:
+    """Gauge whose values are computed by a function when metrics are scraped."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels, collect):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def samples(self):
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in self.collect().items()]
+
+
+REQUEST_DURATION = Histogram(
+    'crm_http_request_duration_seconds', 'Time spent handling HTTP requests.', ('method', 'route', 'status'))
+REQUEST_SQL_QUERIES = Histogram(
+    'crm_http_request_sql_queries', 'SQL statements executed per HTTP request.', ('route',), QUERY_COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram(
+    'crm_http_request_sql_seconds', 'Time spent in SQL per HTTP request.', ('route',))
+SQL_QUERIES = Counter('crm_sql_queries_total', 'SQL statements executed.')
+SQL_SECONDS = Counter('crm_sql_seconds_total', 'Time spent executing SQL statements.')
+JOB_DURATION = Histogram(
+    'crm_scheduler_job_duration_seconds', 'Duration of scheduler job runs.', ('job',))
+JOB_ROWS = Counter('crm_scheduler_rows_claimed_total', 'Rows claimed by scheduler jobs.', ('job',))
+JOB_ERRORS = Counter('crm_scheduler_job_errors_total', 'Scheduler job runs that failed.', ('job',))
+SEND_DURATION = Histogram(
+    'crm_transport_send_duration_seconds', 'Time to send one message through a transport.',
+    ('transport',), SEND_BUCKETS)
+SEND_FAILURES = Counter('crm_transport_send_failures_total', 'Messages a transport failed to send.', ('transport',))
+
+
+def _scheduler_backlog():
+    """Due rows still waiting for the scheduler, counted through the partial indexes."""
+    from datetime import datetime
+    from app import db
+    from models import ScheduledContact, ScheduledMessage
+    from utils.scheduler import due_message_conditions
+
+    now = datetime.utcnow()
+    messages = db.session.query(ScheduledMessage.id).filter(*due_message_conditions(now)).count()
+    contacts = db.session.query(ScheduledContact.id).filter(
+        ScheduledContact.is_notified == False,
+        ScheduledContact.scheduled_time <= now
+    ).count()
+    return {('messages',): messages, ('contacts',): contacts}
+
+
+SCHEDULER_BACKLOG = CallbackGauge(
+    'crm_scheduler_backlog', 'Due rows not yet claimed by the scheduler.', ('kind',), _scheduler_backlog)
+
+METRICS = [
+    REQUEST_DURATION, REQUEST_SQL_QUERIES, REQUEST_SQL_SECONDS, SQL_QUERIES, SQL_SECONDS,
+    JOB_DURATION, JOB_ROWS, JOB_ERRORS, SCHEDULER_BACKLOG, SEND_DURATION, SEND_FAILURES,
+]
+
+
+def observe_job(job, seconds, rows=0, failed=False):
+    """Record one run of a scheduler job."""
+    JOB_DURATION.observe(seconds, job)
+    if rows:
+        JOB_ROWS.inc(rows, job)
+    if failed:
+        JOB_ERRORS.inc(1, job)
+
+
+def observe_send(transport, seconds, success):
+    """Record one message sent (or not) through a transport."""
+    SEND_DURATION.observe(seconds, transport)
+    if not success:
+        SEND_FAILURES.inc(1, transport)
+
+
+def render():
+    """Render every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for name, labels, value in metric.samples():
+            lines.append(f'{name}{labels} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    # after_cursor_execute does not run for a failed statement
+    conn = context.connection
+    if conn is not None and conn.info.get('query_start'):
+        conn.info['query_start'].pop()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    SQL_QUERIES.inc()
+    SQL_SECONDS.inc(elapsed)
+    if has_request_context() and 'metrics_sql' in g:
+        g.metrics_sql[0] += 1
+        g.metrics_sql[1] += elapsed
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_sql = [0, 0.0]
+
+
+def _after_request(response):
+    started = g.pop('metrics_start', None)
+    if started is None:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUEST_DURATION.observe(time.perf_counter() - started, request.method, route, response.status_code)
+    queries, sql_seconds = g.pop('metrics_sql', (0, 0.0))
+    REQUEST_SQL_QUERIES.observe(queries, route)
+    REQUEST_SQL_SECONDS.observe(sql_seconds, route)
+    return response
+
+
+def metrics_view():
+    if METRICS_TOKEN:
+        authorized = request.headers.get('Authorization') == f'Bearer {METRICS_TOKEN}'
+    else:
+        authorized = current_user.is_authenticated
+    if not authorized:
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    try:
+        body = render()
+    except Exception as e:
+        current_app.logger.error(f"Error rendering metrics: {str(e)}")
+        return Response('Error rendering metrics\n', status=500, mimetype='text/plain')
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+def init_metrics(app):
+    """Time every request and expose all metrics at GET /api/metrics."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/api/metrics', 'metrics', metrics_view)
@@ -0,0 +1,385 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, func, update
+
+from models import ScheduledMessage, Lead
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Transport used to deliver due ScheduledMessage rows. Empty keeps the old
+# behaviour: due messages are only marked as sent so they show up in the UI.
+MESSAGE_TRANSPORT = os.environ.get("MESSAGE_TRANSPORT", "")
+
+OUTBOX_WORKERS = int(os.environ.get("OUTBOX_WORKERS", "8"))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_BACKOFF_SECONDS = float(os.environ.get("OUTBOX_BACKOFF_SECONDS", "30"))
+
+# Messages stuck in 'sending' longer than this (worker died mid-delivery)
+# are put back in the queue
+SENDING_TIMEOUT_SECONDS = int(os.environ.get("OUTBOX_SENDING_TIMEOUT", "600"))
+STALE_CHECK_INTERVAL = 60
+
+_dispatcher = None
+
+
+def _log_transport(phone, message):
+    logger.info(f"Outbox message to {phone}: {message[:50]}")
+    return True
+
+
+def _twilio_transport(phone, message):
+    from utils.twilio_service import send_whatsapp_message
+    return send_whatsapp_message(phone, message)
+
+
+def _whatsapp_transport(phone, message):
+    from utils.whatsapp_service import send_message_sync
+    return send_message_sync(phone, message)
+
+
+TRANSPORTS = {
+    'log': _log_transport,
+    'twilio': _twilio_transport,
+    'whatsapp': _whatsapp_transport,
+}
+
+
+def register_transport(name, send):
+    """
+    Make a delivery transport available to the outbox.
+
+    Args:
+        name (str): Value used in MESSAGE_TRANSPORT to select it
+        send (callable): send(phone, message) returning True on success;
+            returning False or raising counts as a failed attempt
+    """
+    TRANSPORTS[name] = send
+
+
+def retry_delay(attempts, base=None):
+    """Exponential backoff with +/-20% jitter for the given number of failed attempts."""
+    base = OUTBOX_BACKOFF_SECONDS if base is None else base
+    return base * (2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+
+def requeue_stale_messages():
+    """Put messages left in 'sending' by a dead worker back in the queue."""
+    cutoff = datetime.utcnow() - timedelta(seconds=SENDING_TIMEOUT_SECONDS)
+    result = db.session.execute(
+        update(ScheduledMessage).where(
+            ScheduledMessage.is_sent == False,
+            ScheduledMessage.scheduled_time <= datetime.utcnow(),
+            ScheduledMessage.delivery_status == 'sending',
+            ScheduledMessage.updated_at < cutoff
+        ).values(delivery_status='queued'),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    if result.rowcount:
+        logger.warning(f"{result.rowcount} outbox messages stuck in 'sending' were requeued")
+    return result.rowcount
+
+
+def deliver_message(message_id, attempt, transport, max_attempts=None):
+    """
+    Deliver one claimed message and record the outcome.
+
+    On failure the message goes back to 'queued' with an exponential
+    backoff, or to 'failed' (dead letter) once max_attempts is reached.
+    updated_at is stamped when the delivery starts, not only at the claim,
+    so a message that waited for a free worker is not taken for stale.
+
+    Args:
+        message_id (int): ID of the message
+        attempt (int): attempts value returned by claim_outbox_messages,
+            the token of this claim
+        transport (callable): transport(phone, message) returning True on success
+        max_attempts (int): Attempts before the message is dead-lettered
+
+    Returns:
+        str: The new delivery_status, or None if the claim is no longer held
+    """
+    max_attempts = max_attempts or OUTBOX_MAX_ATTEMPTS
+    started = db.session.execute(
+        update(ScheduledMessage).where(*_claim_conditions(message_id, attempt)).values(
+            updated_at=datetime.utcnow()),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    db.session.commit()
+    if not started:
+        logger.warning(f"Outbox message {message_id} was claimed again by another worker, skipping")
+        return None
+
+    message, phone, name = db.session.query(
+        ScheduledMessage.message, func.coalesce(Lead.phone_e164, Lead.phone), Lead.name
+    ).outerjoin(Lead, and_(Lead.id == ScheduledMessage.lead_id, Lead.user_id == ScheduledMessage.user_id)).filter(
+        ScheduledMessage.id == message_id
+    ).one()
+    db.session.rollback()
+    if name and '{nome}' in message:
+        message = message.replace('{nome}', name)
+
+    if not phone:
+        return _record_delivery(message_id, attempt, 'Mensagem sem lead de destino', max_attempts, final=True)
+    error = None
+    try:
+        if not transport(phone, message):
+            error = 'Transporte não confirmou o envio'
+    except Exception as e:
+        error = str(e)
+    return _record_delivery(message_id, attempt, error, max_attempts)
+
+
+def _claim_conditions(message_id, attempt):
+    return [
+        ScheduledMessage.id == message_id,
+        ScheduledMessage.delivery_status == 'sending',
+        ScheduledMessage.attempts == attempt,
+    ]
+
+
+def _record_delivery(message_id, attempt, error, max_attempts, final=False):
+    """
+    Store the outcome of one delivery attempt of a claimed message.
+
+    Args:
+        attempt (int): Claim token, see deliver_message
+        error (str): Why the attempt failed, or None if it succeeded
+        final (bool): Dead-letter a failure without retrying
+
+    Returns:
+        str: The new delivery_status
+    """
+    from utils.scheduler import notify_scheduled
+
+    now = datetime.utcnow()
+    values = {}
+    if error is None:
+        values.update(is_sent=True, delivery_status='sent', sent_at=now, last_error=None)
+    elif final or attempt >= max_attempts:
+        values.update(delivery_status='failed', last_error=error)
+        logger.error(f"Outbox message {message_id} dead-lettered after {attempt} attempts: {error}")
+    else:
+        next_attempt_at = now + timedelta(seconds=retry_delay(attempt))
+        values.update(delivery_status='queued', next_attempt_at=next_attempt_at, last_error=error)
+        logger.warning(f"Outbox message {message_id} failed (attempt {attempt}), retrying at {next_attempt_at}: {error}")
+
+    db.session.execute(
+        update(ScheduledMessage).where(*_claim_conditions(message_id, attempt)).values(values),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+
+    if values['delivery_status'] == 'queued':
+        notify_scheduled('messages', values['next_attempt_at'])
+    return values['delivery_status']
+
+
+def deliver_whatsapp_batch(message_ids, max_attempts=None):
+    """
+    Deliver claimed messages through the multi-tab WhatsApp Web sender.
+
+    Used for bulk sends when this process owns the browser pool: the tabs
+    share one adaptive rate limit instead of each message taking a pool
+    page on its own. While the batch runs the rows' updated_at is kept
+    fresh, so requeue_stale_messages does not put them back in the queue.
+    Failed messages are retried one by one by the outbox.
+
+    Args:
+        message_ids (list): IDs of messages in 'sending', claimed by this
+            process with attempts set to 1
+        max_attempts (int): Attempts before a message is dead-lettered
+
+    Returns:
+        dict: Number of messages per new delivery_status
+    """
+    from utils.whatsapp_service import INVALID_PHONE_REASON, send_bulk_messages_concurrent_sync
+
+    max_attempts = max_attempts or OUTBOX_MAX_ATTEMPTS
+    rows = db.session.query(
+        ScheduledMessage.id, ScheduledMessage.message, ScheduledMessage.attempts,
+        func.coalesce(Lead.phone_e164, Lead.phone), Lead.name
+    ).outerjoin(Lead, and_(Lead.id == ScheduledMessage.lead_id, Lead.user_id == ScheduledMessage.user_id)).filter(
+        ScheduledMessage.id.in_(message_ids),
+        ScheduledMessage.delivery_status == 'sending'
+    ).order_by(ScheduledMessage.id).all()
+    db.session.rollback()
+
+    app = current_app._get_current_object()
+    claimed_ids = [row[0] for row in rows]
+    last_touch = time.monotonic()
+
+    def keep_claimed(progress):
+        # Runs on the browser pool's thread, after each recipient
+        nonlocal last_touch
+        if time.monotonic() - last_touch < SENDING_TIMEOUT_SECONDS / 4:
+            return
+        last_touch = time.monotonic()
+        with app.app_context():
+            db.session.execute(
+                update(ScheduledMessage).where(
+                    ScheduledMessage.id.in_(claimed_ids),
+                    ScheduledMessage.delivery_status == 'sending'
+                ).values(updated_at=datetime.utcnow()),
+                execution_options={'synchronize_session': False}
+            )
+            db.session.commit()
+
+    # Bulk rows share one text; {nome} is filled in per recipient
+    by_message = {}
+    for row in rows:
+        by_message.setdefault(row[1], []).append(row)
+
+    counts = {}
+    for message, group in by_message.items():
+        failures = []
+        sendable = [row for row in group if row[3]]
+        failures.extend((row, 'Mensagem sem lead de destino') for row in group if not row[3])
+        sent_ids = []
+        if sendable:
+            results = send_bulk_messages_concurrent_sync(
+                [{'phone': phone, 'name': name} for _, _, _, phone, name in sendable],
+                message,
+                progress_callback=keep_claimed
+            )
+            for row, outcome in zip(sendable, results['recipients']):
+                if outcome['status'] == 'sent':
+                    sent_ids.append(row[0])
+                else:
+                    failures.append((row, outcome['reason'] or 'Transporte não confirmou o envio'))
+
+        if sent_ids:
+            db.session.execute(
+                update(ScheduledMessage).where(
+                    ScheduledMessage.id.in_(sent_ids),
+                    ScheduledMessage.delivery_status == 'sending',
+                    ScheduledMessage.attempts == 1
+                ).values(is_sent=True, delivery_status='sent', sent_at=datetime.utcnow(), last_error=None),
+                execution_options={'synchronize_session': False}
+            )
+            db.session.commit()
+            counts['sent'] = counts.get('sent', 0) + len(sent_ids)
+        for (message_id, _, attempt, phone, _), error in failures:
+            # A missing or invalid number will not work on a retry either
+            final = not phone or error == INVALID_PHONE_REASON
+            status = _record_delivery(message_id, attempt, error, max_attempts, final=final)
+            counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+class OutboxDispatcher:
+    """
+    Bounded worker pool that delivers due ScheduledMessage rows.
+
+    drain() claims at most as many rows as there are free slots (twice the
+    number of workers), so rows are never left in 'sending' waiting behind
+    a long in-memory queue. When a worker finishes and rows were left
+    behind, it drains again by itself.
+    """
+
+    def __init__(self, app, transport, workers=None, max_attempts=None):
+        self.app = app
+        self.transport = transport
+        self.workers = workers or OUTBOX_WORKERS
+        self.max_attempts = max_attempts or OUTBOX_MAX_ATTEMPTS
+        self._capacity = self.workers * 2
+        self._in_flight = 0
+        self._backlog = False
+        self._lock = threading.Lock()
+        self._draining = threading.Lock()
+        self._last_stale_check = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='outbox')
+
+    def drain(self):
+        """
+        Claim due messages and submit them to the worker pool.
+
+        Returns:
+            list: IDs submitted by this call
+        """
+        if not self._draining.acquire(blocking=False):
+            return []
+        submitted = []
+        try:
+            with self.app.app_context():
+                if time.monotonic() - self._last_stale_check > STALE_CHECK_INTERVAL:
+                    self._last_stale_check = time.monotonic()
+                    requeue_stale_messages()
+
+                while True:
+                    with self._lock:
+                        free = self._capacity - self._in_flight
+                    if free <= 0:
+                        self._backlog = True
+                        break
+
+                    from utils.scheduler import claim_outbox_messages
+                    claimed = claim_outbox_messages(free)
+                    with self._lock:
+                        self._in_flight += len(claimed)
+                    for message_id, attempt in claimed:
+                        self._executor.submit(self._deliver, message_id, attempt)
+                    submitted.extend(message_id for message_id, _ in claimed)
+
+                    if len(claimed) < free:
+                        self._backlog = False
+                        break
+        finally:
+            self._draining.release()
+        return submitted
+
+    def _deliver(self, message_id, attempt):
+        try:
+            with self.app.app_context():
+                deliver_message(message_id, attempt, self.transport, self.max_attempts)
+        except Exception as e:
+            logger.error(f"Error delivering outbox message {message_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            if self._backlog:
+                self.drain()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def init_outbox(app, transport_name=None):
+    """
+    Create the process-wide dispatcher for the configured transport.
+
+    Returns:
+        OutboxDispatcher: The dispatcher, or None when no transport is set
+    """
+    global _dispatcher
+
+    transport_name = transport_name if transport_name is not None else MESSAGE_TRANSPORT
+    if _dispatcher is not None:
+        _dispatcher.shutdown(wait=False)
+        _dispatcher = None
+    if not transport_name:
+        return None
+    if transport_name not in TRANSPORTS:
+        raise ValueError(f"Unknown message transport: {transport_name}")
+    workers = None
+    if transport_name == 'whatsapp':
+        # Fail at startup, not on the first send, if another process owns the browser profile
+        from utils.whatsapp_service import POOL_SIZE, claim_session_dir
+        claim_session_dir()
+        # Sends wait for a pool page; more workers would only hold claims longer
+        workers = POOL_SIZE
+
+    _dispatcher = OutboxDispatcher(app, TRANSPORTS[transport_name], workers)
+    logger.info(f"Outbox dispatcher started with transport '{transport_name}' and {_dispatcher.workers} workers")
+    return _dispatcher
+
+
+def get_dispatcher():
+    return _dispatcher
@@ -0,0 +1,52 @@
+import base64
+import binascii
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(timestamp, row_id):
+    """
+    Build an opaque cursor from the (timestamp, id) pair of the last row of a page.
+
+    Args:
+        timestamp (datetime): Sort key of the last row
+        row_id (int): Primary key of the last row, used as tie-breaker
+
+    Returns:
+        str: URL-safe cursor string
+    """
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Parse a cursor produced by encode_cursor.
+
+    Returns:
+        tuple: (datetime, int)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        timestamp, row_id = raw.split('|', 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """
+    Parse a page size query parameter, clamping it to [1, maximum].
+
+    Raises:
+        ValueError: If the value is not an integer
+    """
+    if value in (None, ''):
+        return default
+    return max(1, min(int(value), maximum))
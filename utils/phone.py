@@ -0,0 +1,50 @@
+import os
+
+# Country code added to numbers stored without one
+DEFAULT_COUNTRY_CODE = os.environ.get("DEFAULT_COUNTRY_CODE", "55")
+
+# Shortest number (country code included) accepted as valid
+MIN_PHONE_DIGITS = 10
+
+# E.164 allows at most 15 digits
+MAX_PHONE_DIGITS = 15
+
+
+def normalize_phone(phone):
+    """
+    Reduce a phone number to its digits with the country code.
+
+    Formatting characters are dropped. Numbers written with a leading '+'
+    already carry their country code; any other number gets
+    DEFAULT_COUNTRY_CODE prepended when it does not start with it.
+
+    Args:
+        phone (str): Phone number as typed, e.g. '(11) 98888-7777'
+
+    Returns:
+        str: Digits only, e.g. '5511988887777', or None if the number is invalid
+    """
+    if phone is None:
+        return None
+    phone = str(phone).strip()
+    if phone.startswith('+'):
+        # Canonical values (phone_e164) take this path without re-parsing
+        digits = phone[1:] if phone[1:].isdigit() else ''.join(c for c in phone if c.isdigit())
+    else:
+        digits = ''.join(c for c in phone if c.isdigit())
+        if digits and not digits.startswith(DEFAULT_COUNTRY_CODE):
+            digits = DEFAULT_COUNTRY_CODE + digits
+    if not MIN_PHONE_DIGITS <= len(digits) <= MAX_PHONE_DIGITS:
+        return None
+    return digits
+
+
+def to_e164(phone):
+    """
+    Return the phone number in E.164 format, e.g. '+5511988887777'.
+
+    Returns:
+        str: The canonical number, or None if the number is invalid
+    """
+    digits = normalize_phone(phone)
+    return '+' + digits if digits else None
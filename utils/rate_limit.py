@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter usable from threads and from asyncio code.
+
+    Tokens refill continuously at `rate` per second up to `capacity`, so
+    short bursts are allowed while the long-run average stays at `rate`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated_at
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    def reserve(self):
+        """
+        Take one token, going into debt if none is available.
+
+        Returns:
+            float: Seconds the caller must wait before proceeding
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+
+    def acquire(self):
+        """Block the current thread until a token is available."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Wait without blocking the event loop until a token is available."""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """
+    Token bucket that slows down when errors spike and recovers gradually.
+
+    Callers report each outcome with record(). When more than
+    `error_threshold` of the last `window` outcomes are errors, the rate is
+    halved (never below `min_rate`). Every success then adds back a small
+    step until the target rate is reached again.
+    """
+
+    def __init__(self, rate, min_rate=None, capacity=None, window=10, error_threshold=0.3, recovery_step=None):
+        super().__init__(rate, capacity)
+        self.target_rate = float(rate)
+        self.min_rate = float(min_rate if min_rate is not None else rate / 8)
+        self.error_threshold = error_threshold
+        self.recovery_step = recovery_step if recovery_step is not None else self.target_rate / 20
+        self.backoffs = 0
+        self._outcomes = deque(maxlen=window)
+
+    def record(self, success):
+        """
+        Report the outcome of one rate-limited operation.
+
+        Returns:
+            bool: True if this outcome triggered a backoff
+        """
+        with self._lock:
+            self._outcomes.append(bool(success))
+            errors = self._outcomes.count(False)
+            spiking = (
+                len(self._outcomes) >= min(5, self._outcomes.maxlen)
+                and errors / len(self._outcomes) > self.error_threshold
+            )
+            current = self.rate
+
+        if spiking:
+            self.set_rate(max(self.min_rate, current / 2))
+            with self._lock:
+                self._outcomes.clear()
+                self.backoffs += 1
+            return True
+        if success and current < self.target_rate:
+            self.set_rate(min(self.target_rate, current + self.recovery_step))
+        return False
@@ -1,45 +1,247 @@
+import atexit
+import heapq
 import logging
+import os
+import socket
+import threading
+import time
 from datetime import datetime, timedelta
 from flask import current_app
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.interval import IntervalTrigger
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from flask_login import current_user
 
-from models import ScheduledMessage, ScheduledContact, Lead, User
-# No longer using Twilio service
+from models import ScheduledMessage, ScheduledContact, Lead, User, SchedulerLease
 from app import db
+from utils.metrics import observe_job
 
 logger = logging.getLogger(__name__)
 
 scheduler = None
+_app = None
+
+# Maximum number of rows claimed (and committed) per UPDATE
+CLAIM_BATCH_SIZE = int(os.environ.get("SCHEDULER_BATCH_SIZE", "500"))
+
+
+def _app_context():
+    """App context for job threads, which do not inherit the one from init_scheduler."""
+    app = _app if _app is not None else current_app._get_current_object()
+    return app.app_context()
+
+
+# How long a claim lease is valid if its holder dies without releasing it
+LEASE_TTL_SECONDS = 30
+LEASE_RETRIES = 50
+LEASE_RETRY_DELAY = 0.1
+
+
+def _lease_owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def acquire_lease(name, owner, ttl=LEASE_TTL_SECONDS):
+    """
+    Try to take the named lease for ttl seconds.
+
+    The lease is taken over if it is free, expired or already held by
+    owner. Both paths are single statements, so two processes can never
+    hold the same lease at once.
+
+    Returns:
+        bool: True if owner now holds the lease
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl)
+    try:
+        result = db.session.execute(
+            update(SchedulerLease).where(
+                SchedulerLease.name == name,
+                (SchedulerLease.expires_at < now) | (SchedulerLease.owner == owner)
+            ).values(owner=owner, expires_at=expires_at),
+            execution_options={'synchronize_session': False}
+        )
+        if result.rowcount == 0:
+            db.session.execute(insert(SchedulerLease).values(name=name, owner=owner, expires_at=expires_at))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+
+def release_lease(name, owner):
+    db.session.execute(delete(SchedulerLease).where(
+        SchedulerLease.name == name,
+        SchedulerLease.owner == owner
+    ))
+    db.session.commit()
+
+
+def _claim_due_batch(model, conditions, values, batch_size, returning=()):
+    """
+    Apply values to up to batch_size rows matching conditions in one statement.
+
+    Safe to run from several processes at once. On PostgreSQL the due rows
+    are locked with FOR UPDATE SKIP LOCKED, so concurrent workers claim
+    disjoint chunks in parallel. SQLite has no row locks; there the claim
+    runs under a lease in scheduler_lease, so workers take turns chunk by
+    chunk.
+
+    Returns:
+        list: IDs of the rows claimed by this call, or (id, *returning)
+        tuples when extra columns are requested
+    """
+    due_ids = select(model.id).where(*conditions).order_by(
+        model.scheduled_time
+    ).limit(batch_size).with_for_update(skip_locked=True)
+
+    # The conditions are checked again in the outer WHERE so a row claimed
+    # by a concurrent run between the subquery and the update is skipped
+    statement = update(model).where(
+        model.id.in_(due_ids.scalar_subquery()),
+        *conditions
+    ).values(values).returning(model.id, *returning)
+
+    use_lease = db.engine.dialect.name == 'sqlite'
+    lease_name = f"claim:{model.__tablename__}"
+    owner = _lease_owner()
+    if use_lease:
+        for _ in range(LEASE_RETRIES):
+            if acquire_lease(lease_name, owner):
+                break
+            time.sleep(LEASE_RETRY_DELAY)
+        else:
+            raise RuntimeError(f"Could not acquire lease {lease_name}")
+
+    try:
+        result = db.session.execute(statement, execution_options={'synchronize_session': False})
+        claimed = [tuple(row) for row in result] if returning else result.scalars().all()
+        db.session.commit()
+    finally:
+        if use_lease:
+            db.session.rollback()
+            release_lease(lease_name, owner)
+    return claimed
+
+
+def _claim_all_due(model, conditions, values, label, batch_size=None, max_rows=None, returning=()):
+    batch_size = batch_size or CLAIM_BATCH_SIZE
+    claimed = []
+
+    while True:
+        size = batch_size if max_rows is None else min(batch_size, max_rows - len(claimed))
+        if size <= 0:
+            break
+        try:
+            batch = _claim_due_batch(model, conditions, values, size, returning)
+        except Exception as e:
+            logger.error(f"Error claiming {label} batch: {str(e)}")
+            db.session.rollback()
+            break
+        claimed.extend(batch)
+        if len(batch) < size:
+            break
+
+    if claimed:
+        logger.info(f"{len(claimed)} {label} claimed")
+    return claimed
+
+
+def due_message_conditions(current_time):
+    """Filter for messages that are queued and due at current_time, including retries."""
+    return [
+        ScheduledMessage.is_sent == False,
+        ScheduledMessage.scheduled_time <= current_time,
+        ScheduledMessage.delivery_status == 'queued',
+        or_(ScheduledMessage.next_attempt_at == None, ScheduledMessage.next_attempt_at <= current_time),
+    ]
+
+
+def claim_due_messages(batch_size=None):
+    """
+    Mark every due scheduled message as sent, in chunks of batch_size rows.
+
+    Each chunk is a single UPDATE ... RETURNING and a single commit. A
+    failing chunk is rolled back and the rest is left for the next run.
+
+    Returns:
+        list: IDs of the claimed messages, for downstream processing
+    """
+    current_time = datetime.utcnow()
+    return _claim_all_due(
+        ScheduledMessage,
+        due_message_conditions(current_time),
+        {'is_sent': True, 'delivery_status': 'sent', 'sent_at': current_time},
+        'scheduled messages',
+        batch_size
+    )
+
+
+def claim_outbox_messages(max_rows, batch_size=None):
+    """
+    Move up to max_rows due messages from 'queued' to 'sending' for delivery.
+
+    Each claim increments attempts, and the new value is the claim token:
+    deliver_message only acts on a message whose attempts still match, so
+    a message requeued by requeue_stale_messages and claimed again cannot
+    also be sent by its previous claimer.
+
+    Returns:
+        list: (id, attempt) of each claimed message
+    """
+    return _claim_all_due(
+        ScheduledMessage,
+        due_message_conditions(datetime.utcnow()),
+        {'delivery_status': 'sending', 'attempts': ScheduledMessage.attempts + 1},
+        'outbox messages',
+        batch_size,
+        max_rows,
+        returning=(ScheduledMessage.attempts,)
+    )
+
+
+def claim_due_contacts(batch_size=None):
+    """
+    Mark every due scheduled contact as notified, in chunks of batch_size rows.
+
+    Returns:
+        list: IDs of the claimed contacts, for downstream processing
+    """
+    return _claim_all_due(
+        ScheduledContact,
+        [ScheduledContact.is_notified == False, ScheduledContact.scheduled_time <= datetime.utcnow()],
+        {'is_notified': True},
+        'contact reminders',
+        batch_size
+    )
+
 
 def check_scheduled_messages():
     """
-    Check and mark any scheduled messages that are due to be sent.
-    Instead of sending via WhatsApp, we'll mark them as ready in the UI.
+    Hand due scheduled messages over for sending.
+
+    With a delivery transport configured (MESSAGE_TRANSPORT), due rows are
+    claimed by the outbox, which delivers them through Twilio or WhatsApp
+    Web. Without one they are only marked as sent, for the UI.
     """
-    with current_app.app_context():
+    from utils.outbox import get_dispatcher
+
+    started = time.perf_counter()
+    claimed, failed = [], False
+    with _app_context():
         try:
-            # Get all unsent scheduled messages that are due
-            current_time = datetime.utcnow()
-            due_messages = ScheduledMessage.query.filter(
-                ScheduledMessage.is_sent == False,
-                ScheduledMessage.scheduled_time <= current_time
-            ).all()
-            
-            for message in due_messages:
-                try:
-                    # Simply mark the message as sent so it appears in the UI
-                    # We don't actually send any messages via WhatsApp
-                    message.is_sent = True
-                    db.session.commit()
-                    logger.info(f"Scheduled message {message.id} marked as ready")
-                except Exception as e:
-                    logger.error(f"Error updating scheduled message {message.id}: {str(e)}")
-                    db.session.rollback()
-            
+            dispatcher = get_dispatcher()
+            if dispatcher is not None:
+                # A delivery transport is configured: hand due rows to the outbox
+                claimed = dispatcher.drain()
+            else:
+                claimed = claim_due_messages()
         except Exception as e:
             logger.error(f"Error checking scheduled messages: {str(e)}")
+            failed = True
+    observe_job('check_scheduled_messages', time.perf_counter() - started, len(claimed), failed)
+    return claimed
 
 
 def check_scheduled_contacts():
@@ -47,65 +249,280 @@ def check_scheduled_contacts():
     Check for scheduled contacts that are due and mark them as notified.
     Instead of sending WhatsApp messages, we'll display alerts in the UI.
     """
-    with current_app.app_context():
+    started = time.perf_counter()
+    claimed, failed = [], False
+    with _app_context():
         try:
-            # Get all unnotified scheduled contacts that are due
-            current_time = datetime.utcnow()
-            
-            # Find contacts that are coming up today or already passed but not notified
-            due_contacts = ScheduledContact.query.filter(
-                ScheduledContact.is_notified == False,
-                ScheduledContact.scheduled_time <= current_time
-            ).all()
-            
-            # Mark them as notified so they show up in the dashboard alerts
-            for contact in due_contacts:
-                try:
-                    # Mark contact as notified
-                    contact.is_notified = True
-                    db.session.commit()
-                    logger.info(f"Contact reminder {contact.id} marked as notified")
-                except Exception as e:
-                    logger.error(f"Error updating contact reminder {contact.id}: {str(e)}")
-                    db.session.rollback()
-            
+            claimed = claim_due_contacts()
         except Exception as e:
             logger.error(f"Error checking scheduled contacts: {str(e)}")
+            failed = True
+    observe_job('check_scheduled_contacts', time.perf_counter() - started, len(claimed), failed)
+    return claimed
+
+
+# Minimum delay before the event-driven scheduler re-runs a job whose rows
+# were still due right after the previous run
+RERUN_DELAY_SECONDS = 1
+
+
+def _next_message_due():
+    return db.session.query(
+        func.min(func.coalesce(ScheduledMessage.next_attempt_at, ScheduledMessage.scheduled_time))
+    ).filter(
+        ScheduledMessage.is_sent == False,
+        ScheduledMessage.delivery_status == 'queued'
+    ).scalar()
+
 
+def _next_contact_due():
+    return db.session.query(func.min(ScheduledContact.scheduled_time)).filter(
+        ScheduledContact.is_notified == False
+    ).scalar()
 
-def init_scheduler(app):
+
+def _last_message_id():
+    return db.session.query(func.max(ScheduledMessage.id)).scalar()
+
+
+def _last_contact_id():
+    return db.session.query(func.max(ScheduledContact.id)).scalar()
+
+
+class DueTimeScheduler:
+    """
+    Scheduler that sleeps until the next due row instead of polling.
+
+    It keeps a min-heap with the earliest pending scheduled_time of each
+    kind ('messages', 'contacts'). The heap is loaded from the database at
+    start, refreshed after every run and fed by notify() when this process
+    inserts new rows, so the thread wakes exactly at the next deadline.
+
+    Rows inserted by other processes (the web workers, when the scheduler
+    runs in worker.py) are found by a probe every probe_interval seconds:
+    a max(id) per table, read from the primary key, and a refresh of the
+    kinds whose max changed. A full resync every resync_interval seconds
+    catches the rest, such as a row whose id was allocated before the last
+    probe but committed after it. 0 disables either one.
+    """
+
+    def __init__(self, app, resync_interval=None, probe_interval=None):
+        self.app = app
+        self.resync_interval = resync_interval if resync_interval is not None else int(
+            os.environ.get("SCHEDULER_RESYNC_SECONDS", "900")
+        )
+        self.probe_interval = probe_interval if probe_interval is not None else float(
+            os.environ.get("SCHEDULER_PROBE_SECONDS", "5")
+        )
+        self.jobs = {
+            'messages': (_next_message_due, check_scheduled_messages),
+            'contacts': (_next_contact_due, check_scheduled_contacts),
+        }
+        self.last_ids = {
+            'messages': _last_message_id,
+            'contacts': _last_contact_id,
+        }
+        self._seen_ids = {}
+        self.running = False
+        self._heap = []
+        self._next_due = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        self.running = True
+        self._resync()
+        self._thread = threading.Thread(target=self._run, name='due-time-scheduler', daemon=True)
+        self._thread.start()
+
+    def shutdown(self, wait=True):
+        with self._condition:
+            self.running = False
+            self._condition.notify()
+        if wait and self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=10)
+
+    def notify(self, kind, due_time):
+        """Register a new due time; wakes the thread if it is earlier than the current deadline."""
+        with self._condition:
+            current = self._next_due.get(kind)
+            if current is not None and current <= due_time:
+                return
+            self._next_due[kind] = due_time
+            heapq.heappush(self._heap, (due_time, kind))
+            self._condition.notify()
+
+    def _load_next_due(self, kind):
+        next_due, _ = self.jobs[kind]
+        with self.app.app_context():
+            try:
+                return next_due()
+            finally:
+                db.session.remove()
+
+    def _refresh(self, kind, after_run=False):
+        try:
+            due_time = self._load_next_due(kind)
+        except Exception as e:
+            logger.error(f"Error loading next due time for {kind}: {str(e)}")
+            return
+        with self._condition:
+            self._next_due.pop(kind, None)
+        if due_time is not None:
+            if after_run:
+                # Rows still due right after a run are waiting on a saturated
+                # outbox; check back shortly instead of spinning
+                due_time = max(due_time, datetime.utcnow() + timedelta(seconds=RERUN_DELAY_SECONDS))
+            self.notify(kind, due_time)
+
+    def _load_last_ids(self):
+        with self.app.app_context():
+            try:
+                return {kind: last_id() for kind, last_id in self.last_ids.items()}
+            finally:
+                db.session.remove()
+
+    def _probe(self):
+        """Refresh the kinds that got rows from other processes since the last probe."""
+        self._last_probe = time.monotonic()
+        try:
+            seen = self._load_last_ids()
+        except Exception as e:
+            logger.error(f"Error probing for new scheduled rows: {str(e)}")
+            return
+        changed = [kind for kind, last_id in seen.items() if last_id != self._seen_ids.get(kind)]
+        self._seen_ids = seen
+        for kind in changed:
+            self._refresh(kind)
+
+    def _resync(self):
+        try:
+            self._seen_ids = self._load_last_ids()
+        except Exception as e:
+            logger.error(f"Error probing for new scheduled rows: {str(e)}")
+        for kind in self.jobs:
+            self._refresh(kind)
+        self._last_resync = self._last_probe = time.monotonic()
+
+    def _pop_due(self):
+        """Wait until something is due and return the kinds to run, or None on shutdown."""
+        with self._condition:
+            while self.running:
+                now = datetime.utcnow()
+                # Entries whose time no longer matches _next_due are stale
+                while self._heap and self._next_due.get(self._heap[0][1]) != self._heap[0][0]:
+                    heapq.heappop(self._heap)
+
+                due = set()
+                while self._heap and self._heap[0][0] <= now:
+                    _, kind = heapq.heappop(self._heap)
+                    self._next_due.pop(kind, None)
+                    due.add(kind)
+                if due:
+                    return due
+
+                timeout = None
+                if self._heap:
+                    timeout = (self._heap[0][0] - now).total_seconds()
+                for last, interval in ((self._last_resync, self.resync_interval),
+                                       (self._last_probe, self.probe_interval)):
+                    if not interval:
+                        continue
+                    wake_in = last + interval - time.monotonic()
+                    if wake_in <= 0:
+                        return set()
+                    timeout = wake_in if timeout is None else min(timeout, wake_in)
+                self._condition.wait(timeout)
+            return None
+
+    def _run(self):
+        while True:
+            due = self._pop_due()
+            if due is None:
+                return
+            if not due:
+                if self.resync_interval and time.monotonic() - self._last_resync >= self.resync_interval:
+                    self._resync()
+                else:
+                    self._probe()
+                continue
+            for kind in due:
+                _, job = self.jobs[kind]
+                job()
+                self._refresh(kind, after_run=True)
+
+
+def notify_scheduled(kind, due_time):
+    """
+    Tell the event-driven scheduler that a row of this kind is due at due_time.
+
+    Args:
+        kind (str): 'messages' or 'contacts'
+        due_time (datetime): scheduled_time of the new row
+
+    Does nothing when the scheduler is not running in event mode in this
+    process; a scheduler in another process finds the row with its probe.
+    """
+    if isinstance(scheduler, DueTimeScheduler) and scheduler.running:
+        scheduler.notify(kind, due_time)
+
+
+def init_scheduler(app, mode=None):
     """
     Initialize the scheduler for handling scheduled tasks.
+
+    Args:
+        app: Flask application the jobs run against
+        mode (str): 'interval' polls on a fixed schedule, 'event' sleeps
+            until the next due row. Defaults to the SCHEDULER_MODE
+            environment variable, or 'interval'.
     """
-    global scheduler
+    global scheduler, _app
     if scheduler:
         scheduler.shutdown()
-        
-    scheduler = BackgroundScheduler()
     
-    # Add scheduled jobs
-    scheduler.add_job(
-        func=check_scheduled_messages,
-        trigger=IntervalTrigger(minutes=1),
-        id='check_scheduled_messages',
-        name='Check and send scheduled messages',
-        replace_existing=True
-    )
+    _app = app
+    mode = mode or os.environ.get("SCHEDULER_MODE", "interval")
     
-    scheduler.add_job(
-        func=check_scheduled_contacts,
-        trigger=IntervalTrigger(minutes=5),
-        id='check_scheduled_contacts',
-        name='Check and send contact reminders',
-        replace_existing=True
-    )
+    # Delivers due messages when MESSAGE_TRANSPORT is set
+    from utils.outbox import init_outbox
+    init_outbox(app)
     
-    # Start the scheduler
-    scheduler.start()
-    logger.info("Scheduler initialized and started successfully")
+    if mode == 'event':
+        scheduler = DueTimeScheduler(app)
+        scheduler.start()
+        logger.info("Event-driven scheduler initialized and started successfully")
+    else:
+        # APScheduler is only needed by processes that run the jobs
+        from apscheduler.schedulers.background import BackgroundScheduler
+        from apscheduler.triggers.interval import IntervalTrigger
+
+        scheduler = BackgroundScheduler()
+        
+        # Add scheduled jobs
+        scheduler.add_job(
+            func=check_scheduled_messages,
+            trigger=IntervalTrigger(minutes=1),
+            id='check_scheduled_messages',
+            name='Check and send scheduled messages',
+            replace_existing=True
+        )
+        
+        scheduler.add_job(
+            func=check_scheduled_contacts,
+            trigger=IntervalTrigger(minutes=5),
+            id='check_scheduled_contacts',
+            name='Check and send contact reminders',
+            replace_existing=True
+        )
+        
+        # Start the scheduler
+        scheduler.start()
+        logger.info("Scheduler initialized and started successfully")
     
-    # Register a function to shut down the scheduler when the app is shut down
-    def shutdown_scheduler(exc):
+    # Shut the scheduler down with the process. This used to be a
+    # teardown_appcontext handler, which stopped it after the first request.
+    def shutdown_scheduler():
         global scheduler
         if scheduler and scheduler.running:
             try:
@@ -113,4 +530,4 @@ def init_scheduler(app):
             except Exception as e:
                 logger.error(f"Error shutting down scheduler: {str(e)}")
     
-    app.teardown_appcontext(shutdown_scheduler)
+    atexit.register(shutdown_scheduler)
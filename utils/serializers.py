@@ -0,0 +1,111 @@
+from sqlalchemy import Date, DateTime
+
+from models import Lead, ScheduledContact
+from utils.cache import TTLCache
+from utils.json_provider import orjson
+
+# With the orjson provider datetimes are encoded natively, in the same ISO
+# 8601 form isoformat() gives, so rows can be passed through untouched
+NATIVE_DATETIMES = orjson is not None
+
+# Row functions kept per serializer; field lists come from ?fields=
+COMPILED_CACHE_SIZE = 128
+COMPILED_CACHE_TTL = 3600
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+class RowSerializer:
+    """
+    Turns row tuples from a column projection into dicts.
+
+    The row function for each combination of fields is built once and
+    cached: ``dict(zip(fields, row))`` when no value needs converting, so
+    serializing a row costs one C-level dict build and no per-field lookups.
+    The cache is bounded, and callers taking fields from a request should
+    pass them through normalize_fields first.
+    """
+
+    def __init__(self, columns, native_datetimes=None):
+        """
+        Args:
+            columns (dict): Output field name -> column to select
+            native_datetimes (bool): Leave datetimes for the JSON provider to
+                encode (default NATIVE_DATETIMES)
+        """
+        self.columns = columns
+        self.native_datetimes = NATIVE_DATETIMES if native_datetimes is None else native_datetimes
+        self._compiled = TTLCache(maxsize=COMPILED_CACHE_SIZE, ttl=COMPILED_CACHE_TTL)
+
+    def normalize_fields(self, fields):
+        """
+        Drop repeated fields and put them in the serializer's column order.
+
+        Returns:
+            list: The requested fields, each once, in a canonical order
+        """
+        requested = set(fields)
+        return [field for field in self.columns if field in requested]
+
+    def select(self, fields):
+        """Columns to query, in the order the serializer expects them."""
+        return [self.columns[field] for field in fields]
+
+    def compile(self, fields):
+        """
+        Return the serializer for rows selected with select(fields).
+
+        Returns:
+            callable: row -> dict
+        """
+        fields = tuple(fields)
+        serialize = self._compiled.get(fields)
+        if serialize is None:
+            serialize = self._build(fields)
+            self._compiled.set(fields, serialize)
+        return serialize
+
+    def _build(self, fields):
+        if self.native_datetimes:
+            converted = []
+        else:
+            converted = [index for index, field in enumerate(fields)
+                         if isinstance(self.columns[field].type, (DateTime, Date))]
+        # Rows may carry extra trailing columns (keyset cursors); zip stops at fields
+        if not converted:
+            return lambda row: dict(zip(fields, row))
+
+        def serialize(row):
+            data = dict(zip(fields, row))
+            for index in converted:
+                data[fields[index]] = _iso(row[index])
+            return data
+        return serialize
+
+    def serialize(self, rows, fields):
+        """Serialize rows selected with select(fields) into a list of dicts."""
+        return list(map(self.compile(fields), rows))
+
+
+LEAD_SERIALIZER = RowSerializer({
+    'id': Lead.id,
+    'name': Lead.name,
+    'phone': Lead.phone,
+    'email': Lead.email,
+    'status': Lead.status,
+    'notes': Lead.notes,
+    'next_contact_date': Lead.next_contact_date,
+    'created_at': Lead.created_at,
+    'updated_at': Lead.updated_at,
+})
+
+SCHEDULED_CONTACT_SERIALIZER = RowSerializer({
+    'id': ScheduledContact.id,
+    'lead_id': ScheduledContact.lead_id,
+    'lead_name': Lead.name,
+    'scheduled_time': ScheduledContact.scheduled_time,
+    'notes': ScheduledContact.notes,
+    'is_notified': ScheduledContact.is_notified,
+})
@@ -0,0 +1,149 @@
+import logging
+import os
+import re
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: record every statement of every request (development/staging only)
+SQL_DIAGNOSTICS = os.environ.get("SQL_DIAGNOSTICS", "").lower() in ('1', 'true', 'yes', 'on')
+# Statements slower than this are logged together with their EXPLAIN plan
+SLOW_QUERY_MS = float(os.environ.get("SQL_SLOW_QUERY_MS", "100"))
+# Repeating one statement shape this many times in a request is reported as N+1
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+
+REPORT_HEADER = 'X-SQL-Diagnostics'
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_NAMED_PARAM = re.compile(r"%\(\w+\)s|:\w+|\$\d+")
+_PARAM_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement):
+    """
+    Reduce a SQL statement to its shape, so lookups that only differ in
+    their parameters or IN-list length compare equal.
+    """
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _NAMED_PARAM.sub('?', shape)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _WHITESPACE.sub(' ', shape).strip()
+    return _PARAM_LIST.sub('(?)', shape)
+
+
+def _recording():
+    return has_request_context() and 'sql_diagnostics' in g and not g.get('sql_diagnostics_paused')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _recording():
+        conn.info.setdefault('diagnostics_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('diagnostics_start')
+    if not starts or not _recording():
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+    g.sql_diagnostics.append({
+        'statement': statement,
+        'parameters': None if executemany else parameters,
+        'ms': elapsed_ms,
+    })
+
+
+def _explain(engine, statement, parameters):
+    """EXPLAIN one recorded statement on a separate connection; never runs it."""
+    if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    prefix = 'EXPLAIN' if engine.dialect.name == 'postgresql' else 'EXPLAIN QUERY PLAN'
+    g.sql_diagnostics_paused = True
+    try:
+        with engine.connect() as conn:
+            rows = conn.exec_driver_sql(f"{prefix} {statement}", parameters or ()).all()
+            conn.rollback()
+        return '\n'.join(str(row[-1]) for row in rows)
+    except Exception as e:
+        return f"EXPLAIN failed: {str(e)}"
+    finally:
+        g.sql_diagnostics_paused = False
+
+
+def build_report(statements, engine=None):
+    """
+    Summarize the statements recorded for one request.
+
+    Args:
+        statements (list): Dicts with 'statement', 'parameters' and 'ms'
+        engine: Engine used to EXPLAIN slow statements; skipped when None
+
+    Returns:
+        dict: 'queries', 'ms', 'slow' (statement, ms and plan) and
+            'n_plus_one' (shape and count), worst first
+    """
+    shapes = Counter(statement_shape(entry['statement']) for entry in statements)
+    n_plus_one = [
+        {'shape': shape, 'count': count}
+        for shape, count in shapes.most_common() if count >= N_PLUS_ONE_THRESHOLD
+    ]
+    slow = []
+    for entry in sorted(statements, key=lambda entry: entry['ms'], reverse=True):
+        if entry['ms'] < SLOW_QUERY_MS:
+            break
+        slow.append({
+            'statement': entry['statement'],
+            'ms': round(entry['ms'], 2),
+            'plan': _explain(engine, entry['statement'], entry['parameters']) if engine is not None else None,
+        })
+    return {
+        'queries': len(statements),
+        'ms': round(sum(entry['ms'] for entry in statements), 2),
+        'slow': slow,
+        'n_plus_one': n_plus_one,
+    }
+
+
+def _before_request():
+    g.sql_diagnostics = []
+
+
+def _after_request(response):
+    statements = g.pop('sql_diagnostics', None)
+    if statements is None:
+        return response
+    from app import db
+
+    report = build_report(statements, db.engine)
+    response.headers[REPORT_HEADER] = (
+        f"queries={report['queries']}; time={report['ms']}ms; "
+        f"slow={len(report['slow'])}; n_plus_one={len(report['n_plus_one'])}"
+    )
+
+    label = f"{request.method} {request.path}"
+    for entry in report['n_plus_one']:
+        logger.warning(f"Possible N+1 in {label}: {entry['count']}x {entry['shape']}")
+    for entry in report['slow']:
+        logger.warning(f"Slow query in {label} ({entry['ms']} ms): {entry['statement']}\n{entry['plan']}")
+    logger.debug(f"{label}: {report['queries']} queries in {report['ms']} ms")
+    return response
+
+
+def init_sql_diagnostics(app):
+    """Record and report the SQL of every request when SQL_DIAGNOSTICS is set."""
+    if not SQL_DIAGNOSTICS:
+        return
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    logger.warning(
+        f"SQL diagnostics enabled (slow query threshold {SLOW_QUERY_MS} ms, "
+        f"N+1 threshold {N_PLUS_ONE_THRESHOLD}); do not use in production"
+    )
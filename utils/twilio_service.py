@@ -1,22 +1,101 @@
 import os
 import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
 from twilio.base.exceptions import TwilioRestException
 
+from utils.cache import TTLCache
+from utils.metrics import observe_send
+from utils.phone import to_e164
+from utils.rate_limit import TokenBucket
+
 logger = logging.getLogger(__name__)
 
 TWILIO_ACCOUNT_SID = os.environ.get("TWILIO_ACCOUNT_SID", "")
 TWILIO_AUTH_TOKEN = os.environ.get("TWILIO_AUTH_TOKEN", "")
 TWILIO_PHONE_NUMBER = os.environ.get("TWILIO_PHONE_NUMBER", "")
 
+# Overrides the REST API host, e.g. to point at a local stub server
+TWILIO_API_BASE_URL = os.environ.get("TWILIO_API_BASE_URL", "")
+
+# Keep-alive connections kept open to the Twilio API
+TWILIO_POOL_SIZE = int(os.environ.get("TWILIO_POOL_SIZE", "16"))
+TWILIO_TIMEOUT = float(os.environ.get("TWILIO_TIMEOUT", "15"))
+
+# How long (seconds) the result of check_twilio_status is reused
+TWILIO_STATUS_TTL = int(os.environ.get("TWILIO_STATUS_TTL", "60"))
+
+# Batch sending: parallel requests, overall messages per second and retries
+TWILIO_BULK_CONCURRENCY = int(os.environ.get("TWILIO_BULK_CONCURRENCY", "8"))
+TWILIO_RATE_PER_SECOND = float(os.environ.get("TWILIO_RATE_PER_SECOND", "10"))
+TWILIO_MAX_RETRIES = int(os.environ.get("TWILIO_MAX_RETRIES", "3"))
+TWILIO_RETRY_BASE_DELAY = float(os.environ.get("TWILIO_RETRY_BASE_DELAY", "1"))
+
+_client = None
+_client_lock = threading.Lock()
+_status_cache = TTLCache(maxsize=1, ttl=TWILIO_STATUS_TTL)
+
+
+def get_client():
+    """
+    Return the process-wide Twilio client, creating it on first use.
+
+    The client shares one requests session with a keep-alive connection
+    pool, so only the first message pays for the TCP/TLS handshake.
 
-def check_twilio_status():
+    Returns:
+        Client: Twilio REST client
+    """
+    global _client
+    if _client is not None:
+        return _client
+
+    with _client_lock:
+        if _client is None:
+            http_client = TwilioHttpClient(pool_connections=True, timeout=TWILIO_TIMEOUT)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TWILIO_POOL_SIZE)
+            http_client.session.mount("https://", adapter)
+            http_client.session.mount("http://", adapter)
+
+            client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, http_client=http_client)
+            if TWILIO_API_BASE_URL:
+                client.api.base_url = TWILIO_API_BASE_URL
+            _client = client
+    return _client
+
+
+def reset_client():
+    """Drop the shared client and cached status, e.g. after credentials change."""
+    global _client
+    with _client_lock:
+        if _client is not None and _client.http_client.session is not None:
+            _client.http_client.session.close()
+        _client = None
+    _status_cache.clear()
+
+
+def check_twilio_status(force_refresh=False):
     """
     Check the status of the Twilio configuration.
     
+    The account lookup is cached for TWILIO_STATUS_TTL seconds.
+    
+    Args:
+        force_refresh (bool): Skip the cache and query Twilio again
+    
     Returns:
         dict: Status information about Twilio configuration
     """
+    if not force_refresh:
+        cached = _status_cache.get('status')
+        if cached is not None:
+            return dict(cached)
+    
     status = {
         'configured': False,
         'account_sid_set': bool(TWILIO_ACCOUNT_SID),
@@ -32,15 +111,34 @@ def check_twilio_status():
         
         # Try to connect to Twilio API
         try:
-            client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-            account = client.api.accounts(TWILIO_ACCOUNT_SID).fetch()
+            account = get_client().api.accounts(TWILIO_ACCOUNT_SID).fetch()
             status['connection_successful'] = True
             status['account_name'] = account.friendly_name
             status['account_status'] = account.status
         except Exception as e:
             status['error'] = str(e)
     
-    return status
+    _status_cache.set('status', status)
+    return dict(status)
+
+
+def _create_message(to_phone_number, message):
+    """Send one message through the shared client; raises on API errors."""
+    formatted_to = to_e164(to_phone_number)
+    if not formatted_to:
+        raise ValueError(f"Invalid phone number: {to_phone_number}")
+    started = time.perf_counter()
+    success = False
+    try:
+        sent = get_client().messages.create(
+            body=message,
+            from_=f"whatsapp:{TWILIO_PHONE_NUMBER}",
+            to=f"whatsapp:{formatted_to}"
+        )
+        success = True
+        return sent
+    finally:
+        observe_send('twilio', time.perf_counter() - started, success)
 
 
 def send_whatsapp_message(to_phone_number, message):
@@ -58,20 +156,9 @@ def send_whatsapp_message(to_phone_number, message):
         logger.error("Twilio credentials are not properly configured")
         return False
     
-    # Ensure the phone number has the correct format for WhatsApp
-    formatted_to = to_phone_number.strip()
-    if not formatted_to.startswith('+'):
-        formatted_to = '+' + formatted_to
-    
     try:
-        client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-        
         # Send the WhatsApp message
-        message = client.messages.create(
-            body=message,
-            from_=f"whatsapp:{TWILIO_PHONE_NUMBER}",
-            to=f"whatsapp:{formatted_to}"
-        )
+        message = _create_message(to_phone_number, message)
         
         logger.info(f"Message sent successfully. SID: {message.sid}")
         return True
@@ -82,3 +169,100 @@ def send_whatsapp_message(to_phone_number, message):
     except Exception as e:
         logger.error(f"Error sending WhatsApp message: {str(e)}")
         return False
+
+
+def _is_retryable(error):
+    return isinstance(error, TwilioRestException) and (error.status == 429 or error.status >= 500)
+
+
+def _send_with_retries(phone, message, limiter, max_retries):
+    """
+    Send one message, retrying rate-limit (429) and server (5xx) errors.
+
+    Retries wait with exponential backoff and full jitter.
+
+    Returns:
+        tuple: (sid or None, error message or None, attempts made)
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        limiter.acquire()
+        try:
+            return _create_message(phone, message).sid, None, attempt
+        except Exception as e:
+            if attempt > max_retries or not _is_retryable(e):
+                return None, str(e), attempt
+            delay = random.uniform(0, TWILIO_RETRY_BASE_DELAY * (2 ** (attempt - 1)))
+            logger.warning(f"Twilio error for {phone} (attempt {attempt}), retrying in {delay:.2f}s: {str(e)}")
+            time.sleep(delay)
+
+
+def send_bulk_whatsapp_messages(recipients, message_template, concurrency=None, rate_per_second=None,
+                                max_retries=None):
+    """
+    Send a WhatsApp message to many recipients concurrently using Twilio API.
+    
+    At most `concurrency` requests are in flight at once and the total rate is
+    held under `rate_per_second` by a shared token bucket. 429 and 5xx
+    responses are retried with jittered exponential backoff.
+    
+    Args:
+        recipients (list): Dicts with 'phone' and optional 'name'
+        message_template (str): Message text; {nome} is replaced by the name
+        concurrency (int): Parallel requests (default TWILIO_BULK_CONCURRENCY)
+        rate_per_second (float): Maximum messages per second (default TWILIO_RATE_PER_SECOND)
+        max_retries (int): Retries per recipient on 429/5xx (default TWILIO_MAX_RETRIES)
+        
+    Returns:
+        dict: Same summary as whatsapp_service.send_bulk_messages, plus
+        'recipients' with the status, SID, attempts and error of each one
+    """
+    results = {
+        'total': len(recipients),
+        'success': 0,
+        'failed': 0,
+        'failed_recipients': [],
+        'recipients': [],
+        'error_message': None
+    }
+    
+    if not TWILIO_ACCOUNT_SID or not TWILIO_AUTH_TOKEN or not TWILIO_PHONE_NUMBER:
+        results['error_message'] = "Twilio credentials are not properly configured"
+        results['failed'] = len(recipients)
+        logger.error(results['error_message'])
+        return results
+    
+    concurrency = concurrency or TWILIO_BULK_CONCURRENCY
+    max_retries = TWILIO_MAX_RETRIES if max_retries is None else max_retries
+    limiter = TokenBucket(rate_per_second or TWILIO_RATE_PER_SECOND)
+    
+    def send_one(recipient):
+        message = message_template
+        if '{nome}' in message_template and recipient.get('name'):
+            message = message_template.replace('{nome}', recipient['name'])
+        sid, error, attempts = _send_with_retries(recipient['phone'], message, limiter, max_retries)
+        return {
+            'phone': recipient['phone'],
+            'name': recipient.get('name', ''),
+            'status': 'sent' if sid else 'failed',
+            'sid': sid,
+            'attempts': attempts,
+            'reason': error
+        }
+    
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='twilio-bulk') as executor:
+        for entry in executor.map(send_one, recipients):
+            results['recipients'].append(entry)
+            if entry['sid']:
+                results['success'] += 1
+            else:
+                results['failed'] += 1
+                results['failed_recipients'].append({
+                    'phone': entry['phone'],
+                    'name': entry['name'],
+                    'reason': entry['reason']
+                })
+    
+    logger.info(f"Twilio bulk send finished: {results['success']}/{results['total']} sent")
+    return results
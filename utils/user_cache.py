@@ -0,0 +1,66 @@
+import os
+from flask_login import UserMixin
+
+from app import db
+from utils.cache import TTLCache
+
+# Writes made through the ORM in this process invalidate the entry at once;
+# the TTL bounds how long another worker keeps serving a changed user.
+USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", "30"))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "4096"))
+
+# Cached for ids that no longer exist, so stale sessions do not hit the DB
+_MISSING = object()
+
+_user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+class CachedUser(UserMixin):
+    """
+    Read-only snapshot of the User columns the request handlers use.
+
+    Returned by the login manager's user_loader instead of a session-bound
+    User, so it can be shared between requests and threads.
+    """
+
+    def __init__(self, id, username, email, phone_number, is_active):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.phone_number = phone_number
+        # Rows created before is_active had a default hold NULL; treat them as active
+        self._active = is_active is not False
+
+    @property
+    def is_active(self):
+        return self._active
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+def get_cached_user(user_id):
+    """
+    Return the snapshot of an active user, loading it on a cache miss.
+
+    Returns:
+        CachedUser: The user, or None if it does not exist or is inactive
+    """
+    user = _user_cache.get(user_id)
+    if user is None:
+        from models import User
+
+        row = db.session.query(
+            User.id, User.username, User.email, User.phone_number, User.is_active
+        ).filter(User.id == user_id).first()
+        user = CachedUser(*row) if row else _MISSING
+        _user_cache.set(user_id, user)
+
+    if user is _MISSING or not user.is_active:
+        return None
+    return user
+
+
+def invalidate_cached_user(user_id):
+    """Drop a user from the cache so the next request reloads it."""
+    _user_cache.pop(user_id)
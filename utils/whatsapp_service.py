@@ -1,186 +1,427 @@
 import asyncio
+import atexit
+import contextlib
 import logging
 import os
+import threading
+import time
+from urllib.parse import quote
 from playwright.async_api import async_playwright
 
+from utils.metrics import observe_send
+from utils.phone import normalize_phone
+from utils.rate_limit import AdaptiveRateLimiter
+
 logger = logging.getLogger(__name__)
 
-# WhatsApp Web URL
-WHATSAPP_WEB_URL = "https://web.whatsapp.com/"
+# WhatsApp Web URL (pode apontar para uma página de teste local)
+WHATSAPP_WEB_URL = os.environ.get("WHATSAPP_WEB_URL", "https://web.whatsapp.com/")
 
 # Configuração de tempo de espera
 MAX_WAIT_TIME = 90000  # 90 segundos - aumentado para ambientes de baixo processamento
 
 # Caminho para salvar o estado da sessão do navegador
-# Caminho para salvar o estado da sessão do navegador
-SESSION_DIR = os.path.join('/tmp', 'sessions')
+SESSION_DIR = os.environ.get("WHATSAPP_SESSION_DIR", os.path.join('/tmp', 'sessions'))
 os.makedirs(SESSION_DIR, exist_ok=True)
 
-async def init_browser():
-    """Inicializa o navegador em modo headless para automação."""
-    try:
-        # Em ambientes como Replit, precisamos usar configurações específicas
-        playwright = await async_playwright().start()
-        browser = await playwright.chromium.launch(
-            headless=True,  # Sempre usar headless em ambientes como Replit
-            args=[
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-accelerated-2d-canvas',
-                '--no-first-run',
-                '--no-zygote',
-                '--disable-gpu',
-                '--disable-infobars',
-                '--window-position=0,0',
-                '--ignore-certificate-errors',
-                '--ignore-certificate-errors-spki-list',
-                '--mute-audio',
-                '--disable-extensions',
-                '--disable-default-apps',
-                '--enable-features=NetworkService',
-                '--disable-features=TranslateUI',
-                '--disable-notifications',
-                '--disable-background-timer-throttling',
-                '--disable-backgrounding-occluded-windows',
-                '--disable-breakpad',
-                '--disable-component-extensions-with-background-pages',
-                '--disable-ipc-flooding-protection',
-                '--disable-renderer-backgrounding',
-            ],
-            # Aumentando o timeout para lançamento
-            timeout=60000,
-        )
-        
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36",
-            viewport={'width': 1280, 'height': 800}
-        )
-        
-        # Cria uma nova página
-        page = await context.new_page()
-        
-        return playwright, browser, context, page
-    except Exception as e:
-        logger.error(f"Erro ao inicializar o navegador: {str(e)}")
-        # Repassar a exceção para que o chamador possa lidar com ela
-        raise
+# Número de páginas mantidas abertas no pool de navegador
+POOL_SIZE = int(os.environ.get("WHATSAPP_POOL_SIZE", "1"))
+
+# Tempo máximo (s) para a verificação de saúde de uma página
+HEALTH_CHECK_TIMEOUT = 5
+
+# Envio em massa concorrente: abas em paralelo e ritmo total (mensagens/minuto)
+BULK_TABS = int(os.environ.get("WHATSAPP_BULK_TABS", "3"))
+BULK_RATE_PER_MINUTE = float(os.environ.get("WHATSAPP_BULK_RATE_PER_MINUTE", "12"))
+
+INVALID_PHONE_REASON = 'Número de telefone inválido'
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36"
+VIEWPORT = {'width': 1280, 'height': 800}
+
+BROWSER_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-accelerated-2d-canvas',
+    '--no-first-run',
+    '--no-zygote',
+    '--disable-gpu',
+    '--disable-infobars',
+    '--window-position=0,0',
+    '--ignore-certificate-errors',
+    '--ignore-certificate-errors-spki-list',
+    '--mute-audio',
+    '--disable-extensions',
+    '--disable-default-apps',
+    '--enable-features=NetworkService',
+    '--disable-features=TranslateUI',
+    '--disable-notifications',
+    '--disable-background-timer-throttling',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-breakpad',
+    '--disable-component-extensions-with-background-pages',
+    '--disable-ipc-flooding-protection',
+    '--disable-renderer-backgrounding',
+]
 
 async def load_whatsapp_web(page):
     """Carrega o WhatsApp Web e aguarda pelo QR code."""
     try:
         # Aumentando o timeout para carregar a página
         await page.goto(WHATSAPP_WEB_URL, wait_until="networkidle", timeout=90000)
-        
+
         # Aguardar que a página carregue completamente
         await asyncio.sleep(3)
-        
+
         # Verifica se o QR code está visível
         qr_code = await page.query_selector('[data-testid="qrcode"]')
-        
+
         if qr_code:
             logger.info("Por favor, escaneie o código QR no navegador para continuar.")
-            
+
             # Em um ambiente real, aqui capturaríamos a imagem do QR code
             # para exibir na interface, mas isso não é possível no ambiente Replit
-            
+
             return False
         else:
             # Verifica se já está logado (procura por seletores típicos da página principal)
             chat_list = await page.query_selector('[data-testid="chat-list"]')
             compose_box = await page.query_selector('[data-testid="conversation-compose-box"]')
-            
+
             if chat_list or compose_box:
                 logger.info("WhatsApp Web já está logado e pronto para uso.")
                 return True
             else:
                 logger.info("WhatsApp Web carregado, mas não foi possível detectar o estado de login.")
                 return False
-            
+
     except Exception as e:
         logger.error(f"Erro ao carregar WhatsApp Web: {str(e)}")
         return False
 
-async def send_whatsapp_message(phone_number, message):
-    """Envia uma mensagem para um número específico no WhatsApp Web."""
-    playwright = None
-    browser = None
-    
-    try:
-        # Inicializa um navegador com as configurações para ambiente Replit
-        playwright, browser, context, page = await init_browser()
-        
-        # Carrega o WhatsApp Web
-        success = await load_whatsapp_web(page)
-        if not success:
-            logger.error("Não foi possível carregar o WhatsApp Web. Verifique se você escaneou o QR code.")
-            await cleanup(playwright, browser)
-            return False
-        
-        # Formata o número do telefone (remove caracteres não numéricos)
-        clean_phone = ''.join(c for c in phone_number if c.isdigit())
-        
-        # Se o número não começar com +, adicionar o código do país (Brasil +55)
-        if not clean_phone.startswith('55'):
-            clean_phone = '55' + clean_phone
-        
-        # Validação básica do número
-        if len(clean_phone) < 10:
-            logger.warning(f"Número de telefone inválido: {phone_number}")
-            await cleanup(playwright, browser)
-            return False
-        
-        # Gera o URL direto para o chat
-        direct_chat_url = f"{WHATSAPP_WEB_URL}send?phone={clean_phone}&text={message}"
-        
-        # Navega para o URL de chat direto com timeout aumentado
-        await page.goto(direct_chat_url, wait_until="networkidle", timeout=60000)
-        
-        # Verifica se há um erro com o número de telefone (indicado pelo WhatsApp)
-        error_selector = 'div._9a59P'
-        error_element = await page.query_selector(error_selector)
-        
-        if error_element:
-            error_text = await error_element.text_content()
-            logger.warning(f"Erro do WhatsApp para {phone_number}: {error_text}")
-            await cleanup(playwright, browser)
+
+# Perfis do Chromium reservados por este processo, por diretório
+_profile_locks = {}
+_profile_locks_lock = threading.Lock()
+
+PROFILE_LOCK_FILE = 'crm-owner.lock'
+
+
+def _profile_in_use_message(session_dir, owner):
+    return (
+        f"O perfil do WhatsApp Web em {session_dir} já está em uso ({owner}). "
+        "O Chromium só abre um perfil por vez, então apenas um processo pode usar "
+        "MESSAGE_TRANSPORT=whatsapp: rode a entrega só no worker.py (ou com "
+        "RUN_SCHEDULER=1 em um único processo) ou use outro WHATSAPP_SESSION_DIR, "
+        "com um novo login por QR code."
+    )
+
+
+def claim_session_dir(session_dir=None):
+    """
+    Reserva o perfil do Chromium em session_dir para este processo.
+
+    O Chromium trava o diretório de perfil (SingletonLock) enquanto o
+    navegador está aberto, e um segundo processo falharia só no primeiro
+    envio. A trava (flock) fica em um arquivo do próprio perfil e é mantida
+    até o processo terminar; chamar de novo no mesmo processo não faz nada.
+
+    Raises:
+        RuntimeError: Se outro processo já reservou o perfil
+    """
+    import fcntl
+
+    session_dir = os.path.abspath(session_dir or SESSION_DIR)
+    with _profile_locks_lock:
+        if session_dir in _profile_locks:
+            return
+        os.makedirs(session_dir, exist_ok=True)
+        lock_file = open(os.path.join(session_dir, PROFILE_LOCK_FILE), 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.seek(0)
+            owner = lock_file.read().strip() or 'outro processo'
+            lock_file.close()
+            raise RuntimeError(_profile_in_use_message(session_dir, owner))
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(f"pid {os.getpid()}")
+        lock_file.flush()
+        _profile_locks[session_dir] = lock_file
+
+
+class WhatsAppBrowserPool:
+    """
+    Pool de páginas do WhatsApp Web mantidas abertas entre os envios.
+
+    Usa um contexto persistente do Chromium gravado em SESSION_DIR, então o
+    login (QR code) sobrevive a reinícios do processo. O perfil só pode ser
+    aberto por um processo por vez (ver claim_session_dir). Cada página passa por
+    uma verificação de saúde antes de ser entregue; páginas travadas são
+    recriadas e, se o navegador cair, ele é relançado automaticamente.
+    """
+
+    def __init__(self, size=POOL_SIZE, session_dir=SESSION_DIR):
+        self.size = size
+        self.session_dir = session_dir
+        self._playwright = None
+        self._context = None
+        self._idle = None
+        self._logged_in = {}
+        self._lock = None
+        self._crashed = False
+
+    @property
+    def is_alive(self):
+        return self._context is not None and not self._crashed
+
+    async def start(self):
+        """Lança o navegador e abre as páginas do pool no WhatsApp Web."""
+        claim_session_dir(self.session_dir)
+        self._playwright = await async_playwright().start()
+        try:
+            self._context = await self._playwright.chromium.launch_persistent_context(
+                self.session_dir,
+                headless=True,
+                args=BROWSER_ARGS,
+                timeout=60000,
+                user_agent=USER_AGENT,
+                viewport=VIEWPORT,
+            )
+        except Exception as e:
+            # Um Chromium aberto fora da aplicação também trava o perfil
+            if 'ProcessSingleton' in str(e) or 'SingletonLock' in str(e):
+                raise RuntimeError(_profile_in_use_message(self.session_dir, 'outro Chromium')) from e
+            raise
+        self._crashed = False
+        self._context.on('close', lambda _: self._mark_crashed())
+
+        self._idle = asyncio.Queue()
+        self._logged_in = {}
+        pages = list(self._context.pages)
+        while len(pages) < self.size:
+            pages.append(await self._context.new_page())
+        for page in pages[:self.size]:
+            self._logged_in[page] = await load_whatsapp_web(page)
+            self._idle.put_nowait(page)
+        logger.info(f"Pool do WhatsApp Web iniciado com {self.size} página(s)")
+
+    def _mark_crashed(self):
+        if not self._crashed:
+            logger.warning("Navegador do WhatsApp Web foi encerrado; será relançado no próximo envio")
+        self._crashed = True
+
+    async def close(self):
+        """Fecha o navegador e encerra o Playwright."""
+        context, playwright = self._context, self._playwright
+        # Fechamento intencional: evita o aviso de queda no evento 'close'
+        self._crashed = True
+        self._context = None
+        self._playwright = None
+        try:
+            if context:
+                await context.close()
+        except Exception as e:
+            logger.error(f"Erro ao fechar o contexto do navegador: {str(e)}")
+        await cleanup(playwright, None)
+
+    async def ensure_started(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self.is_alive:
+                await self.close()
+                await self.start()
+
+    async def ensure_size(self, size):
+        """Abre páginas extras até o pool ter pelo menos size páginas."""
+        await self.ensure_started()
+        async with self._lock:
+            while self.size < size:
+                page = await self._context.new_page()
+                self._logged_in[page] = await load_whatsapp_web(page)
+                self._idle.put_nowait(page)
+                self.size += 1
+
+    async def _is_healthy(self, page):
+        if page.is_closed():
             return False
-        
-        # Aguarda o carregamento da interface de chat
-        await page.wait_for_selector('[data-testid="conversation-compose-box-input"]', timeout=MAX_WAIT_TIME)
-        
-        # Clica no botão de enviar
-        send_button = await page.wait_for_selector('[data-testid="compose-btn-send"]', timeout=10000)
-        if send_button:
-            await send_button.click()
-            logger.info(f"Mensagem enviada com sucesso para {phone_number}")
-            await asyncio.sleep(2)  # Pequena pausa para garantir que a mensagem foi enviada
-            await cleanup(playwright, browser)
+        try:
+            await asyncio.wait_for(page.evaluate('1'), HEALTH_CHECK_TIMEOUT)
             return True
-        else:
-            logger.error(f"Botão de enviar não encontrado para {phone_number}")
-            await cleanup(playwright, browser)
+        except Exception:
             return False
-            
+
+    async def _replace_page(self, page):
+        self._logged_in.pop(page, None)
+        try:
+            if not page.is_closed():
+                await page.close()
+        except Exception:
+            pass
+        new_page = await self._context.new_page()
+        self._logged_in[new_page] = await load_whatsapp_web(new_page)
+        return new_page
+
+    @contextlib.asynccontextmanager
+    async def page(self):
+        """
+        Empresta uma página saudável do pool.
+
+        Yields:
+            tuple: (page, logged_in) onde logged_in indica se a sessão do
+            WhatsApp Web está autenticada nessa página
+        """
+        await self.ensure_started()
+        while True:
+            idle = self._idle
+            page = await idle.get()
+            if idle is self._idle:
+                break
+            # O navegador foi relançado enquanto esperávamos: devolve a página
+            # antiga para acordar os demais e tenta de novo na fila nova
+            idle.put_nowait(page)
+            await self.ensure_started()
+
+        try:
+            if not await self._is_healthy(page):
+                if not self.is_alive:
+                    raise RuntimeError("Navegador do WhatsApp Web não está disponível")
+                logger.warning("Página do WhatsApp Web não respondeu; recriando")
+                page = await self._replace_page(page)
+            if not self._logged_in.get(page):
+                self._logged_in[page] = await load_whatsapp_web(page)
+            yield page, self._logged_in[page]
+        finally:
+            idle.put_nowait(page)
+
+
+# O pool vive em um event loop dedicado, em uma thread de fundo, porque os
+# objetos do Playwright ficam presos ao loop em que foram criados e as
+# funções síncronas abaixo são chamadas de threads diferentes
+_pool = None
+_pool_loop = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool_loop():
+    global _pool_loop
+    with _pool_lock:
+        if _pool_loop is None:
+            _pool_loop = asyncio.new_event_loop()
+            threading.Thread(target=_pool_loop.run_forever, name='whatsapp-browser-pool', daemon=True).start()
+        return _pool_loop
+
+
+def get_browser_pool():
+    """Retorna o pool de navegador do processo, criando-o na primeira chamada."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WhatsAppBrowserPool()
+        return _pool
+
+
+def _run_in_pool_loop(coro):
+    """Agenda a corrotina no loop do pool e retorna um concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_pool_loop())
+
+
+def _in_pool_loop():
+    try:
+        return asyncio.get_running_loop() is _pool_loop
+    except RuntimeError:
+        return False
+
+
+async def _send_on_page(page, phone_number, message):
+    """
+    Envia uma mensagem usando uma página já logada no WhatsApp Web.
+
+    Returns:
+        tuple: (sucesso, motivo da falha ou None)
+    """
+    started = time.perf_counter()
+    success = False
+    try:
+        success, reason = await _deliver_on_page(page, phone_number, message)
+        return success, reason
+    finally:
+        observe_send('whatsapp_web', time.perf_counter() - started, success)
+
+
+async def _deliver_on_page(page, phone_number, message):
+    """Abre o chat do número e clica em enviar; exceções do Playwright propagam."""
+    clean_phone = normalize_phone(phone_number)
+
+    # Validação básica do número
+    if not clean_phone:
+        logger.warning(f"Número de telefone inválido: {phone_number}")
+        return False, INVALID_PHONE_REASON
+
+    # Gera o URL direto para o chat
+    direct_chat_url = f"{WHATSAPP_WEB_URL}send?phone={clean_phone}&text={quote(message)}"
+
+    # Navega para o URL de chat direto com timeout aumentado
+    await page.goto(direct_chat_url, wait_until="networkidle", timeout=60000)
+
+    # Verifica se há um erro com o número de telefone (indicado pelo WhatsApp)
+    error_selector = 'div._9a59P'
+    error_element = await page.query_selector(error_selector)
+
+    if error_element:
+        error_text = await error_element.text_content()
+        logger.warning(f"Erro do WhatsApp para {phone_number}: {error_text}")
+        return False, error_text
+
+    # Aguarda o carregamento da interface de chat
+    await page.wait_for_selector('[data-testid="conversation-compose-box-input"]', timeout=MAX_WAIT_TIME)
+
+    # Clica no botão de enviar
+    send_button = await page.wait_for_selector('[data-testid="compose-btn-send"]', timeout=10000)
+    if send_button:
+        await send_button.click()
+        logger.info(f"Mensagem enviada com sucesso para {phone_number}")
+        await asyncio.sleep(2)  # Pequena pausa para garantir que a mensagem foi enviada
+        return True, None
+
+    logger.error(f"Botão de enviar não encontrado para {phone_number}")
+    return False, 'Botão de envio não encontrado'
+
+
+async def send_whatsapp_message(phone_number, message):
+    """Envia uma mensagem para um número específico no WhatsApp Web."""
+    if not _in_pool_loop():
+        # O navegador pertence ao loop do pool; executa lá e aguarda daqui
+        return await asyncio.wrap_future(_run_in_pool_loop(send_whatsapp_message(phone_number, message)))
+
+    try:
+        async with get_browser_pool().page() as (page, logged_in):
+            if not logged_in:
+                logger.error("Não foi possível carregar o WhatsApp Web. Verifique se você escaneou o QR code.")
+                return False
+            success, _ = await _send_on_page(page, phone_number, message)
+            return success
+
     except Exception as e:
         logger.error(f"Erro ao enviar mensagem via WhatsApp Web: {str(e)}")
-        try:
-            if playwright and browser:
-                await cleanup(playwright, browser)
-        except Exception as cleanup_error:
-            logger.error(f"Erro adicional durante cleanup: {str(cleanup_error)}")
         return False
 
 async def send_bulk_messages(recipients, message_template):
     """Envia mensagens em massa para vários destinatários.
-    
+
     Args:
         recipients (list): Lista de dicionários com 'phone' e 'name' dos destinatários
         message_template (str): Modelo de mensagem com placeholders como {nome}
-        
+
     Returns:
         dict: Resultado do envio com sucessos e falhas
     """
+    if not _in_pool_loop():
+        return await asyncio.wrap_future(_run_in_pool_loop(send_bulk_messages(recipients, message_template)))
+
     results = {
         'total': len(recipients),
         'success': 0,
@@ -188,118 +429,192 @@ async def send_bulk_messages(recipients, message_template):
         'failed_recipients': [],
         'error_message': None
     }
-    
-    playwright = None
-    browser = None
-    
+
     try:
-        # Inicializa o navegador
-        playwright, browser, context, page = await init_browser()
-        
-        # Carrega o WhatsApp Web
-        success = await load_whatsapp_web(page)
-        if not success:
-            error_msg = "Não foi possível carregar o WhatsApp Web. Verifique se você escaneou o QR code."
-            logger.error(error_msg)
-            results['error_message'] = error_msg
-            await cleanup(playwright, browser)
-            return results
-        
-        # Processa cada destinatário
-        for i, recipient in enumerate(recipients):
-            try:
-                # Personaliza a mensagem
-                personalized_message = message_template
-                if '{nome}' in message_template and 'name' in recipient and recipient['name']:
-                    personalized_message = message_template.replace('{nome}', recipient['name'])
-                
-                # Formata o número do telefone
-                phone = recipient['phone']
-                clean_phone = ''.join(c for c in phone if c.isdigit())
-                if not clean_phone.startswith('55'):
-                    clean_phone = '55' + clean_phone
-                
-                # Validação básica do número de telefone
-                if len(clean_phone) < 10:
-                    logger.warning(f"Número de telefone inválido: {phone}")
-                    results['failed'] += 1
-                    results['failed_recipients'].append({
-                        'phone': phone,
-                        'name': recipient.get('name', ''),
-                        'reason': 'Número de telefone inválido'
-                    })
-                    continue
-                
-                # Gera o URL direto para o chat
-                direct_chat_url = f"{WHATSAPP_WEB_URL}send?phone={clean_phone}&text={personalized_message}"
-                
-                # Navega para o URL de chat direto com timeout aumentado
-                await page.goto(direct_chat_url, wait_until="networkidle", timeout=90000)
-                
-                # Verifica se há um erro com o número de telefone (indicado pelo WhatsApp)
-                error_selector = 'div._9a59P'
-                error_element = await page.query_selector(error_selector)
-                
-                if error_element:
-                    error_text = await error_element.text_content()
-                    logger.warning(f"Erro do WhatsApp para {phone}: {error_text}")
-                    results['failed'] += 1
-                    results['failed_recipients'].append({
-                        'phone': phone,
-                        'name': recipient.get('name', ''),
-                        'reason': error_text
-                    })
-                    continue
-                
-                # Aguarda o carregamento da interface de chat
-                input_field = await page.wait_for_selector('[data-testid="conversation-compose-box-input"]', timeout=MAX_WAIT_TIME)
-                
-                # Verifica se há um botão de enviar
-                send_button = await page.query_selector('[data-testid="compose-btn-send"]')
-                if send_button:
-                    await send_button.click()
-                    logger.info(f"Mensagem enviada com sucesso para {phone}")
-                    results['success'] += 1
-                    
-                    # Intervalo de 5 segundos entre mensagens para evitar bloqueio
-                    # Mais tempo para envios mais confiáveis
-                    await asyncio.sleep(5)
-                else:
-                    logger.error(f"Botão de enviar não encontrado para {phone}")
+        async with get_browser_pool().page() as (page, logged_in):
+            if not logged_in:
+                error_msg = "Não foi possível carregar o WhatsApp Web. Verifique se você escaneou o QR code."
+                logger.error(error_msg)
+                results['error_message'] = error_msg
+                return results
+
+            # Processa cada destinatário
+            for i, recipient in enumerate(recipients):
+                try:
+                    # Personaliza a mensagem
+                    personalized_message = message_template
+                    if '{nome}' in message_template and 'name' in recipient and recipient['name']:
+                        personalized_message = message_template.replace('{nome}', recipient['name'])
+
+                    success, reason = await _send_on_page(page, recipient['phone'], personalized_message)
+                    if success:
+                        results['success'] += 1
+
+                        # Intervalo de 5 segundos entre mensagens para evitar bloqueio
+                        # Mais tempo para envios mais confiáveis
+                        await asyncio.sleep(5)
+                    else:
+                        results['failed'] += 1
+                        results['failed_recipients'].append({
+                            'phone': recipient['phone'],
+                            'name': recipient.get('name', ''),
+                            'reason': reason
+                        })
+
+                except Exception as e:
+                    error_msg = f"Erro ao enviar mensagem para {recipient['phone']}: {str(e)}"
+                    logger.error(error_msg)
                     results['failed'] += 1
                     results['failed_recipients'].append({
-                        'phone': phone,
+                        'phone': recipient.get('phone', 'desconhecido'),
                         'name': recipient.get('name', ''),
-                        'reason': 'Botão de envio não encontrado'
+                        'reason': str(e)
                     })
-                    
-            except Exception as e:
-                error_msg = f"Erro ao enviar mensagem para {recipient['phone']}: {str(e)}"
-                logger.error(error_msg)
-                results['failed'] += 1
-                results['failed_recipients'].append({
-                    'phone': recipient.get('phone', 'desconhecido'),
-                    'name': recipient.get('name', ''),
-                    'reason': str(e)
-                })
-        
-        # Encerra o navegador
-        await cleanup(playwright, browser)
+
         return results
-        
+
     except Exception as e:
         error_msg = f"Erro ao iniciar envio em massa: {str(e)}"
         logger.error(error_msg)
         results['error_message'] = error_msg
-        
-        try:
-            if playwright and browser:
-                await cleanup(playwright, browser)
-        except Exception as cleanup_error:
-            logger.error(f"Erro adicional durante cleanup: {str(cleanup_error)}")
-            
         return results
 
+def _personalize(message_template, recipient):
+    if '{nome}' in message_template and recipient.get('name'):
+        return message_template.replace('{nome}', recipient['name'])
+    return message_template
+
+
+async def send_bulk_messages_concurrent(recipients, message_template, tabs=None, rate_per_minute=None,
+                                        progress_callback=None):
+    """Envia mensagens em massa distribuindo os destinatários entre várias abas.
+
+    O ritmo total é controlado por um token bucket em vez de pausas fixas, e
+    cai automaticamente pela metade quando os erros do WhatsApp (div._9a59P)
+    ou exceções passam de 30% das últimas tentativas.
+
+    Args:
+        recipients (list): Lista de dicionários com 'phone' e 'name' dos destinatários
+        message_template (str): Modelo de mensagem com placeholders como {nome}
+        tabs (int): Número de abas em paralelo (padrão WHATSAPP_BULK_TABS)
+        rate_per_minute (float): Mensagens por minuto somando todas as abas
+        progress_callback (callable): Chamada após cada destinatário com um
+            dicionário de progresso ('done', 'total', 'success', 'failed',
+            'throughput_per_minute', 'rate_per_minute')
+
+    Returns:
+        dict: Mesmo formato de send_bulk_messages, mais 'recipients' com o
+        resultado de cada destinatário, 'elapsed_seconds',
+        'throughput_per_minute' e 'backoffs'
+    """
+    if not _in_pool_loop():
+        return await asyncio.wrap_future(_run_in_pool_loop(send_bulk_messages_concurrent(
+            recipients, message_template, tabs, rate_per_minute, progress_callback
+        )))
+
+    tabs = max(1, min(tabs or BULK_TABS, len(recipients) or 1))
+    rate = (rate_per_minute or BULK_RATE_PER_MINUTE) / 60.0
+    limiter = AdaptiveRateLimiter(rate, capacity=tabs)
+
+    results = {
+        'total': len(recipients),
+        'success': 0,
+        'failed': 0,
+        'failed_recipients': [],
+        'recipients': [None] * len(recipients),
+        'error_message': None,
+        'elapsed_seconds': 0.0,
+        'throughput_per_minute': 0.0,
+        'backoffs': 0,
+    }
+    started_at = time.monotonic()
+    queue = asyncio.Queue()
+    for index, recipient in enumerate(recipients):
+        queue.put_nowait((index, recipient))
+
+    def record(index, recipient, success, reason):
+        entry = {
+            'phone': recipient.get('phone', 'desconhecido'),
+            'name': recipient.get('name', ''),
+            'status': 'sent' if success else 'failed',
+            'reason': reason,
+        }
+        results['recipients'][index] = entry
+        if success:
+            results['success'] += 1
+        else:
+            results['failed'] += 1
+            results['failed_recipients'].append({
+                'phone': entry['phone'],
+                'name': entry['name'],
+                'reason': reason
+            })
+
+        # Número inválido é erro do dado, não sinal de bloqueio do WhatsApp
+        if reason != INVALID_PHONE_REASON and limiter.record(success):
+            logger.warning(f"Muitos erros no envio em massa; ritmo reduzido para {limiter.rate * 60:.1f} msg/min")
+
+        done = results['success'] + results['failed']
+        elapsed = time.monotonic() - started_at
+        results['elapsed_seconds'] = elapsed
+        results['throughput_per_minute'] = done / elapsed * 60 if elapsed > 0 else 0.0
+        results['backoffs'] = limiter.backoffs
+        if progress_callback:
+            try:
+                progress_callback({
+                    'done': done,
+                    'total': results['total'],
+                    'success': results['success'],
+                    'failed': results['failed'],
+                    'throughput_per_minute': results['throughput_per_minute'],
+                    'rate_per_minute': limiter.rate * 60,
+                })
+            except Exception as e:
+                logger.error(f"Erro no callback de progresso: {str(e)}")
+
+    async def worker():
+        async with pool.page() as (page, logged_in):
+            if not logged_in:
+                raise RuntimeError("Não foi possível carregar o WhatsApp Web. Verifique se você escaneou o QR code.")
+            while True:
+                try:
+                    index, recipient = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    await limiter.acquire_async()
+                    success, reason = await _send_on_page(
+                        page, recipient['phone'], _personalize(message_template, recipient)
+                    )
+                    record(index, recipient, success, reason)
+                except Exception as e:
+                    logger.error(f"Erro ao enviar mensagem para {recipient.get('phone')}: {str(e)}")
+                    record(index, recipient, False, str(e))
+
+    try:
+        pool = get_browser_pool()
+        await pool.ensure_size(tabs)
+        outcomes = await asyncio.gather(*(worker() for _ in range(tabs)), return_exceptions=True)
+        errors = [o for o in outcomes if isinstance(o, Exception)]
+        if errors and len(errors) == len(outcomes):
+            results['error_message'] = str(errors[0])
+            logger.error(f"Erro ao iniciar envio em massa: {results['error_message']}")
+    except Exception as e:
+        error_msg = f"Erro ao iniciar envio em massa: {str(e)}"
+        logger.error(error_msg)
+        results['error_message'] = error_msg
+
+    # Destinatários que nenhuma aba chegou a processar
+    for index, recipient in enumerate(recipients):
+        if results['recipients'][index] is None:
+            record(index, recipient, False, results['error_message'] or 'Não processado')
+
+    logger.info(
+        f"Envio em massa concluído: {results['success']}/{results['total']} enviados "
+        f"em {results['elapsed_seconds']:.1f}s ({results['throughput_per_minute']:.1f} msg/min)"
+    )
+    return results
+
 async def cleanup(playwright, browser):
     """Fecha o navegador e encerra o Playwright."""
     try:
@@ -310,12 +625,31 @@ async def cleanup(playwright, browser):
     except Exception as e:
         logger.error(f"Erro ao limpar recursos: {str(e)}")
 
+
+def shutdown_browser_pool(timeout=30):
+    """Fecha o navegador do pool, se houver um aberto."""
+    if _pool is None or _pool_loop is None:
+        return
+    try:
+        _run_in_pool_loop(_pool.close()).result(timeout)
+    except Exception as e:
+        logger.error(f"Erro ao encerrar o pool do WhatsApp Web: {str(e)}")
+
+atexit.register(shutdown_browser_pool)
+
 # Função auxiliar para execução síncrona
 def send_message_sync(phone_number, message):
     """Versão síncrona da função de envio de mensagem para compatibilidade com código existente."""
-    return asyncio.run(send_whatsapp_message(phone_number, message))
+    return _run_in_pool_loop(send_whatsapp_message(phone_number, message)).result()
 
 # Função auxiliar para envio em massa síncrono
 def send_bulk_messages_sync(recipients, message_template):
     """Versão síncrona da função de envio em massa para compatibilidade com código existente."""
-    return asyncio.run(send_bulk_messages(recipients, message_template))
+    return _run_in_pool_loop(send_bulk_messages(recipients, message_template)).result()
+
+def send_bulk_messages_concurrent_sync(recipients, message_template, tabs=None, rate_per_minute=None,
+                                       progress_callback=None):
+    """Versão síncrona de send_bulk_messages_concurrent."""
+    return _run_in_pool_loop(send_bulk_messages_concurrent(
+        recipients, message_template, tabs, rate_per_minute, progress_callback
+    )).result()
@@ -0,0 +1,34 @@
+"""
+Background worker: runs the scheduler jobs and, when MESSAGE_TRANSPORT is
+set, the outbox that delivers due messages. Serves no HTTP.
+
+    python worker.py
+
+Run one worker next to the web processes (gunicorn main:app). Several
+workers are safe for the database claims, but the 'whatsapp' transport
+needs a single process, since the browser profile can only be opened once.
+"""
+import logging
+import signal
+import threading
+
+from app import create_app
+from utils.scheduler import init_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    app = create_app()
+    init_scheduler(app)
+
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+    logger.info("Worker running; press Ctrl+C to stop")
+    stop.wait()
+
+
+if __name__ == '__main__':
+    main()